@@ -1,5 +1,5 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Body, FastAPI
 from fastapi.responses import ORJSONResponse
 from middleware import auth_middleware
 
@@ -22,6 +22,11 @@ async def user_info(uuid: str):
     return get_fake_user(uuid)
 
 
+@app.post('/auth/v1/user_info:batch')
+async def user_info_batch(uuids: list[str] = Body(...)):
+    return {uuid: get_fake_user(uuid) for uuid in dict.fromkeys(uuids)}
+
+
 @app.post('/auth/v1/user_group/{group}')
 async def user_group(group: str):
     return get_fake_group()
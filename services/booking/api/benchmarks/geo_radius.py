@@ -0,0 +1,163 @@
+"""
+Бенчмарк поиска объявлений в радиусе на синтетических данных.
+
+Создает отдельную БД рядом с settings.postgres.DB, заполняет ее --rows объявлениями вокруг городов
+справочника локального геокодера и замеряет запросы страницы GET /announcements с filter[lat], filter[lon]
+и filter[radius_km] - тот же SQL, что строит AnnounceSqlachemyRepository._multy_query. Для сравнения те же
+запросы выполняются без индексов (enable_indexscan, enable_bitmapscan = off).
+
+Запуск из services/booking/api:
+
+    python benchmarks/geo_radius.py --rows 1000000 --queries 200 --radius 10
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from core.config import settings  # noqa: E402
+from db.models.announcement import Base  # noqa: E402
+from db.uow import UnitOfWork  # noqa: E402
+from services.announcement import layer_payload  # noqa: E402
+from services.announcement.repositories.announce_repo import AnnounceSqlachemyRepository  # noqa: E402
+from services.announcement.repositories.geo_repo import _PLACES  # noqa: E402
+
+PAGE = 20
+# разброс точек вокруг центра города, градусы (~50 км по широте)
+SPREAD = 0.45
+
+SEED = """
+INSERT INTO announcements (
+    id, status, title, description, movie_id, author_id, sub_only, is_free, tickets_count,
+    seats_confirmed, event_time, event_location, created, modified, duration, lat, lon
+)
+SELECT
+    md5('announce' || i)::uuid,
+    (CASE WHEN i %% 10 = 0 THEN 'Alive' WHEN i %% 20 = 1 THEN 'Closed' WHEN i %% 20 = 2 THEN 'Created' ELSE 'Done' END)
+        ::eventstatus,
+    'title ' || i,
+    'description ' || i,
+    md5('movie' || (i %% 5000))::uuid,
+    md5('author' || (i %% 50000))::uuid,
+    i %% 3 = 0,
+    i %% 2 = 0,
+    1 + i %% 10,
+    0,
+    now() - interval '300 days' + (i %% 525600) * interval '1 minute' + i * interval '1 microsecond',
+    'location ' || i,
+    now(),
+    now(),
+    60,
+    centers.lat[1 + i %% array_length(centers.lat, 1)] + (random() - 0.5) * 2 * %(spread)s,
+    centers.lon[1 + i %% array_length(centers.lon, 1)] + (random() - 0.5) * 2 * %(spread)s
+FROM generate_series(%(first)s, %(last)s) AS i,
+    (SELECT %(lat)s::float8[] AS lat, %(lon)s::float8[] AS lon) AS centers
+"""
+
+BATCH = 100_000
+
+
+def _percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def _prepare(admin, name: str, rows: int):
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
+        conn.exec_driver_sql(f'CREATE DATABASE "{name}"')
+    engine = create_engine(admin.url.set(database=name))
+    centers = sorted(set(_PLACES.values()))
+    params = {'lat': [lat for lat, _ in centers], 'lon': [lon for _, lon in centers], 'spread': SPREAD}
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS cube')
+        conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS earthdistance')
+        Base.metadata.create_all(conn)
+    started = time.perf_counter()
+    for first in range(1, rows + 1, BATCH):
+        with engine.begin() as conn:
+            conn.exec_driver_sql(SEED, params | {'first': first, 'last': min(first + BATCH - 1, rows)})
+        print(f'seeded {min(first + BATCH - 1, rows)}/{rows}', file=sys.stderr)  # noqa: T201
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('VACUUM ANALYZE announcements')
+    print(f'seed: {rows} rows in {time.perf_counter() - started:.1f} s')  # noqa: T201
+    return engine
+
+
+def _statements(count: int, radius_km: float) -> list[str]:
+    repo = AnnounceSqlachemyRepository(UnitOfWork(None), cache=None)
+    centers = list(set(_PLACES.values()))
+    rnd = random.Random(0)
+    statements = []
+    for _ in range(count):
+        lat, lon = rnd.choice(centers)
+        query = layer_payload.APIMultyPayload(
+            lat=lat + rnd.uniform(-SPREAD, SPREAD) / 2,
+            lon=lon + rnd.uniform(-SPREAD, SPREAD) / 2,
+            radius_km=radius_km,
+            size=PAGE,
+        )
+        statement = repo._multy_query(query, None).limit(PAGE + 1)
+        compiled = statement.compile(dialect=postgresql.psycopg2.dialect(), compile_kwargs={'literal_binds': True})
+        statements.append(str(compiled))
+    return statements
+
+
+def _run(engine, statements: list[str], indexes: bool) -> list[float]:
+    timings = []
+    with engine.connect() as conn:
+        if not indexes:
+            conn.exec_driver_sql('SET enable_indexscan = off')
+            conn.exec_driver_sql('SET enable_bitmapscan = off')
+        conn.exec_driver_sql(statements[0]).fetchall()
+        for statement in statements:
+            started = time.perf_counter()
+            conn.exec_driver_sql(statement).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list[float]) -> None:
+    print(  # noqa: T201
+        f'{label:<12} n={len(timings)} p50={_percentile(timings, 50):.2f} ms p95={_percentile(timings, 95):.2f} ms '
+        f'p99={_percentile(timings, 99):.2f} ms max={max(timings):.2f} ms',
+    )
+
+
+def main(rows: int, queries: int, radius_km: float, baseline: int, keep: bool) -> None:
+    # путь запроса как в production: только активные будущие события
+    settings.debug.DEBUG = False
+    name = f'{settings.postgres.DB}_geo_bench'
+    admin = create_engine(settings.postgres.uri).execution_options(isolation_level='AUTOCOMMIT')
+    engine = _prepare(admin, name, rows)
+    try:
+        statements = _statements(queries, radius_km)
+        with engine.connect() as conn:
+            plan = conn.exec_driver_sql(f'EXPLAIN (ANALYZE, BUFFERS) {statements[0]}').scalars().all()
+        print('\n'.join(plan))  # noqa: T201
+        _report('gist', _run(engine, statements, indexes=True))
+        if baseline:
+            _report('no index', _run(engine, statements[:baseline], indexes=False))
+    finally:
+        engine.dispose()
+        if not keep:
+            with admin.connect() as conn:
+                conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
+        admin.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарк поиска объявлений в радиусе')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='число синтетических объявлений')
+    parser.add_argument('--queries', type=int, default=200, help='число замеряемых запросов')
+    parser.add_argument('--radius', type=float, default=10, help='радиус поиска, км')
+    parser.add_argument('--baseline', type=int, default=20, help='число запросов без индексов, 0 - не замерять')
+    parser.add_argument('--keep', action='store_true', help='не удалять БД бенчмарка')
+    args = parser.parse_args()
+    main(args.rows, args.queries, args.radius, args.baseline, args.keep)
@@ -1,13 +1,14 @@
 from datetime import datetime
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 
 import utils.exceptions as exc
 from api.v1.components import payload_announce, resp_announce
 from core.config import settings
 from services.announcement.service.announcement import AnnouncementService, get_announcement_service
 from utils import auth
+from utils.idempotency import Idempotency, fingerprint, get_idempotency
 
 router = APIRouter()
 auth_handler = auth.AuthHandler()
@@ -23,7 +24,9 @@ auth_handler = auth.AuthHandler()
 async def create(
     movie_id: str,
     payload: payload_announce.CreatePayload,
+    idempotency_key: str | None = Header(default=None, alias='Idempotency-Key', max_length=255),
     announcement_service: AnnouncementService = Depends(get_announcement_service),
+    idempotency: Idempotency = Depends(get_idempotency),
     _user: dict = Depends(auth_handler.auth_wrapper),
 ) -> resp_announce.DetailAnnouncementResponse:
     if settings.debug.DEBUG:
@@ -38,13 +41,29 @@ async def create(
             event_location='Fake location',
         )
     try:
+        if idempotency_key:
+            return await idempotency.run(
+                key=f'announcement:{_user.get("user_id")}:{idempotency_key}',
+                _fingerprint=fingerprint(movie_id, payload.dict()),
+                factory=lambda: announcement_service.create(
+                    author_id=_user.get('user_id'),
+                    movie_id=movie_id,
+                    new_announce=payload,
+                ),
+            )
         return await announcement_service.create(
             author_id=_user.get('user_id'),
             movie_id=movie_id,
             new_announce=payload,
         )
+    except (exc.IdempotencyConflictError, exc.IdempotencyKeyReuseError):
+        raise HTTPException(status_code=HTTPStatus.CONFLICT)
+    except exc.NotFoundError:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
     except exc.UniqueConstraintError:
         raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
+    except exc.UpstreamUnavailableError:
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
 
 
 @router.put(
@@ -73,6 +92,10 @@ async def update(
         raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
     except exc.NoAccessError:
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN)
+    except exc.DeadlineExceededError:
+        raise HTTPException(status_code=HTTPStatus.GATEWAY_TIMEOUT)
+    except exc.UpstreamUnavailableError:
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
 
 
 @router.get(
@@ -88,29 +111,61 @@ async def get_one(
     _user: dict = Depends(auth_handler.auth_wrapper),
 ) -> resp_announce.DetailAnnouncementResponse:
     try:
-        return await announcement_service.get_one(announce_id=announcement_id)
+        return Response(
+            content=await announcement_service.get_one_json(announce_id=announcement_id),
+            media_type='application/json',
+        )
     except exc.NotFoundError:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+    except exc.DeadlineExceededError:
+        raise HTTPException(status_code=HTTPStatus.GATEWAY_TIMEOUT)
 
 
 @router.get(
     '/announcements',
     summary='Получить список всех объявлений',
-    description='Получение списка объявлений, сервис идет за информацией в db',
+    description=(
+        'Получение списка объявлений, сервис идет за информацией в db. '
+        'Ближайшие события первыми, с filter[q] - полнотекстовый поиск по названию, описанию и месту, '
+        'самые релевантные первыми. С filter[lat] и filter[lon] - только события в радиусе filter[radius_km]. '
+        'Курсор следующей страницы возвращается в заголовке X-Next-Cursor'
+    ),
     response_model=list[resp_announce.AnnouncementResponse],
     response_description='Список объявлений по условию',
 )
 async def get_multy(
+    response: Response,
     _author: str | None = Query(default=None, alias='filter[author]'),
     _movie: str | None = Query(default=None, alias='filter[movie]'),
     _free: bool | None = Query(default=None, alias='filter[is_free]'),
     _sub: bool | None = Query(default=None, alias='filter[private]'),
     _ticket: int | None = Query(default=None, alias='filter[tickets]'),
     _date: datetime | None = Query(default=None, alias='filter[date]'),
+    _date_from: datetime | None = Query(default=None, alias='filter[date_from]'),
+    _date_to: datetime | None = Query(default=None, alias='filter[date_to]'),
     _location: str | None = Query(default=None, alias='filter[location]'),
+    _q: str | None = Query(default=None, alias='filter[q]', min_length=1, max_length=256),
+    _lat: float | None = Query(default=None, alias='filter[lat]', ge=-90, le=90),
+    _lon: float | None = Query(default=None, alias='filter[lon]', ge=-180, le=180),
+    _radius_km: float = Query(
+        default=settings.geo.DEFAULT_RADIUS_KM,
+        alias='filter[radius_km]',
+        gt=0,
+        le=settings.geo.MAX_RADIUS_KM,
+    ),
+    _size: int = Query(
+        default=settings.pagination.DEFAULT_SIZE,
+        alias='page[size]',
+        ge=1,
+        le=settings.pagination.MAX_SIZE,
+    ),
+    _cursor: str | None = Query(default=None, alias='page[cursor]'),
     announcement_service: AnnouncementService = Depends(get_announcement_service),
     _user: dict = Depends(auth_handler.auth_wrapper),
 ) -> list[resp_announce.AnnouncementResponse] | list:
+    # центр поиска задается только парой координат
+    if (_lat is None) != (_lon is None):
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
     query = payload_announce.MultyPayload(
         author=_author,
         movie=_movie,
@@ -118,9 +173,25 @@ async def get_multy(
         sub=_sub,
         ticket=_ticket,
         date=_date,
+        date_from=_date_from,
+        date_to=_date_to,
         location=_location,
+        q=_q,
+        lat=_lat,
+        lon=_lon,
+        radius_km=_radius_km,
+        size=_size,
+        cursor=_cursor,
     )
-    return await announcement_service.get_multy(query=query, user_id=_user.get('user_id'))
+    try:
+        page = await announcement_service.get_multy(query=query, user_id=_user.get('user_id'))
+    except exc.InvalidCursorError:
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
+    except exc.UpstreamUnavailableError:
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+    if page.next_cursor:
+        response.headers['X-Next-Cursor'] = page.next_cursor
+    return page.items
 
 
 @router.delete(
@@ -141,6 +212,8 @@ async def delete(
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
     except exc.NoAccessError:
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN)
+    except exc.UpstreamUnavailableError:
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
 
 
 @router.get(
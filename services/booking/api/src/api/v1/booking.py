@@ -1,12 +1,15 @@
 from datetime import datetime
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
 import utils.exceptions as exc
 from api.v1.components import payload_booking, resp_booking
+from core.config import settings
 from services.booking.service.booking import BookingService, get_booking_service
 from utils import auth
+from utils.idempotency import Idempotency, fingerprint, get_idempotency
 
 router = APIRouter()
 auth_handler = auth.AuthHandler()
@@ -21,15 +24,29 @@ auth_handler = auth.AuthHandler()
 )
 async def create(
     announcement_id: str,
+    idempotency_key: str | None = Header(default=None, alias='Idempotency-Key', max_length=255),
     booking_service: BookingService = Depends(get_booking_service),
+    idempotency: Idempotency = Depends(get_idempotency),
     _user: dict = Depends(auth_handler.auth_wrapper),
 ) -> resp_booking.DetailBookingResponse:
     try:
+        if idempotency_key:
+            return await idempotency.run(
+                key=f'booking:{_user.get("user_id")}:{idempotency_key}',
+                _fingerprint=fingerprint(announcement_id),
+                factory=lambda: booking_service.create(announce_id=announcement_id, user=_user),
+            )
         return await booking_service.create(announce_id=announcement_id, user=_user)
+    except (exc.IdempotencyConflictError, exc.IdempotencyKeyReuseError):
+        raise HTTPException(status_code=HTTPStatus.CONFLICT)
     except exc.UniqueConstraintError:
         raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
     except exc.NoAccessError:
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN)
+    except exc.CapacityExceededError:
+        raise HTTPException(status_code=HTTPStatus.TOO_MANY_REQUESTS)
+    except exc.DeadlineExceededError:
+        raise HTTPException(status_code=HTTPStatus.GATEWAY_TIMEOUT)
 
 
 @router.put(
@@ -57,7 +74,28 @@ async def update(
         raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
     except exc.NoAccessError:
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN)
-    return await booking_service.get_one(booking_id=booking_id, user=_user)
+    try:
+        return await booking_service.get_one(booking_id=booking_id, user=_user)
+    except exc.DeadlineExceededError:
+        raise HTTPException(status_code=HTTPStatus.GATEWAY_TIMEOUT)
+
+
+@router.put(
+    '/bookings',
+    summary='Изменить свой статус сразу в нескольких заявках',
+    description='Изменение записей в DB одной транзакцией, результат возвращается по каждой заявке',
+    response_model=list[resp_booking.BulkUpdateResponse],
+    response_description='Результат изменения по каждой заявке',
+)
+async def bulk_update(
+    payload: payload_booking.BulkUpdatePayload,
+    booking_service: BookingService = Depends(get_booking_service),
+    _user: dict = Depends(auth_handler.auth_wrapper),
+) -> list[resp_booking.BulkUpdateResponse]:
+    try:
+        return await booking_service.bulk_update(user=_user, items=payload.items)
+    except exc.NoAccessError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT)
 
 
 @router.get(
@@ -78,54 +116,105 @@ async def get_one(
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
     except exc.NoAccessError:
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN)
+    except exc.DeadlineExceededError:
+        raise HTTPException(status_code=HTTPStatus.GATEWAY_TIMEOUT)
 
 
 @router.get(
     '/bookings',
     summary='Получить список всех своих заявок',
-    description='Получение списка заявок, сервис идет за информацией в db',
+    description=(
+        'Получение списка заявок, сервис идет за информацией в db. '
+        'Курсор следующей страницы возвращается в заголовке X-Next-Cursor, '
+        'при stream=true заявки выгружаются целиком в формате NDJSON'
+    ),
     response_model=list[resp_booking.BookingResponse],
     response_description='Список объявлений по условию',
 )
 async def get_multy(
+    response: Response,
     _role: payload_booking.Role | None = Query(default=payload_booking.Role.author, alias='filter[self]'),
     _movie: str | None = Query(default=None, alias='filter[movie]'),
     _date: datetime | None = Query(default=None, alias='filter[date]'),
+    _size: int = Query(
+        default=settings.pagination.DEFAULT_SIZE,
+        alias='page[size]',
+        ge=1,
+        le=settings.pagination.MAX_SIZE,
+    ),
+    _cursor: str | None = Query(default=None, alias='page[cursor]'),
+    _stream: bool = Query(default=False, alias='stream'),
     booking_service: BookingService = Depends(get_booking_service),
     _user: dict = Depends(auth_handler.auth_wrapper),
-) -> list[resp_booking.BookingResponse]:
+) -> list[resp_booking.BookingResponse] | StreamingResponse:
     query = payload_booking.MultyPayload(
         role=_role,
         movie=_movie,
         date=_date,
+        size=_size,
+        cursor=_cursor,
     )
     try:
-        return await booking_service.get_multy(user=_user, query=query)
-    except exc.ValueMissingError:
+        if _stream:
+            return StreamingResponse(
+                booking_service.stream_multy(user=_user, query=query),
+                media_type='application/x-ndjson',
+            )
+        page = await booking_service.get_multy(user=_user, query=query)
+    except (exc.ValueMissingError, exc.InvalidCursorError):
         raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
+    if page.next_cursor:
+        response.headers['X-Next-Cursor'] = page.next_cursor
+    return page.items
 
 
 @router.get(
     '/_bookings',
     summary='Служебный метод. Получить список всех заявок',
-    description='Получение списка объявлений, сервис идет за информацией в db',
+    description=(
+        'Получение списка объявлений, сервис идет за информацией в db. '
+        'Курсор следующей страницы возвращается в заголовке X-Next-Cursor, '
+        'при stream=true заявки выгружаются целиком в формате NDJSON'
+    ),
     response_model=list[resp_booking.BookingResponse],
     response_description='Список объявлений по условию',
 )
 async def sudo_get_multy(
+    response: Response,
     _author: str | None = Query(default=None, alias='filter[author]'),
     _movie: str | None = Query(default=None, alias='filter[movie]'),
     _date: datetime | None = Query(default=None, alias='filter[date]'),
+    _size: int = Query(
+        default=settings.pagination.DEFAULT_SIZE,
+        alias='page[size]',
+        ge=1,
+        le=settings.pagination.MAX_SIZE,
+    ),
+    _cursor: str | None = Query(default=None, alias='page[cursor]'),
+    _stream: bool = Query(default=False, alias='stream'),
     booking_service: BookingService = Depends(get_booking_service),
     _user: dict = Depends(auth_handler.auth_wrapper),
-) -> list[resp_booking.BookingResponse]:
+) -> list[resp_booking.BookingResponse] | StreamingResponse:
     if _user.get('claims').get('is_super'):
         query = payload_booking.SudoMultyPayload(
             author=_author,
             movie=_movie,
             date=_date,
+            size=_size,
+            cursor=_cursor,
         )
-        return await booking_service.sudo_get_multy(user=_user, query=query)
+        try:
+            if _stream:
+                return StreamingResponse(
+                    booking_service.sudo_stream_multy(user=_user, query=query),
+                    media_type='application/x-ndjson',
+                )
+            page = await booking_service.sudo_get_multy(user=_user, query=query)
+        except exc.InvalidCursorError:
+            raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY)
+        if page.next_cursor:
+            response.headers['X-Next-Cursor'] = page.next_cursor
+        return page.items
     raise HTTPException(status_code=HTTPStatus.FORBIDDEN)
 
 
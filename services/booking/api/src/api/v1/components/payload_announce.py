@@ -43,4 +43,12 @@ class MultyPayload(BaseModel):
     sub: bool | None
     ticket: int | None
     date: datetime | None
+    date_from: datetime | None
+    date_to: datetime | None
     location: str | None
+    q: str | None
+    lat: float | None
+    lon: float | None
+    radius_km: float
+    size: int
+    cursor: str | None
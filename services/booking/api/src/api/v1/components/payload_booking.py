@@ -1,7 +1,10 @@
 from datetime import datetime
 from enum import Enum
+from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from core.config import settings
 
 
 class Role(str, Enum):
@@ -13,14 +16,27 @@ class UpdatePayload(BaseModel):
     my_status: bool
 
 
+class BulkUpdateItem(BaseModel):
+    booking_id: UUID
+    my_status: bool
+
+
+class BulkUpdatePayload(BaseModel):
+    items: list[BulkUpdateItem] = Field(min_items=1, max_items=settings.bulk.MAX_SIZE)
+
+
 class SudoMultyPayload(BaseModel):
     is_self: bool | None
     author: str | None
     movie: str | None
     date: datetime | None
+    size: int
+    cursor: str | None
 
 
 class MultyPayload(BaseModel):
     role: Role
     movie: str | None
     date: datetime | None
+    size: int
+    cursor: str | None
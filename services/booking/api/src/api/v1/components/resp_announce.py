@@ -8,8 +8,8 @@ from pydantic import BaseModel
 class BookingToDetailResponse(BaseModel):
     booking_id: str | UUID
     guest_id: str | UUID
-    guest_name: str
-    guest_rating: float
+    guest_name: str | None
+    guest_rating: float | None
     guest_status: bool
     author_status: bool | None
 
@@ -31,9 +31,13 @@ class AnnouncementResponse(BaseModel):
     sub_only: bool
     is_free: bool
     tickets_count: int
+    tickets_left: int
     event_time: datetime
     event_location: str
     duration: int
+    movie_title: str | None
+    author_name: str | None
+    author_rating: float | None
 
 
 class DetailAnnouncementResponse(BaseModel):
@@ -43,8 +47,8 @@ class DetailAnnouncementResponse(BaseModel):
     status: EventStatus
     title: str
     description: str
-    movie_title: str
-    author_name: str
+    movie_title: str | None
+    author_name: str | None
     sub_only: bool
     is_free: bool
     tickets_count: int
@@ -52,7 +56,7 @@ class DetailAnnouncementResponse(BaseModel):
     event_time: datetime
     event_location: str
     guest_list: list[BookingToDetailResponse]
-    author_rating: float
+    author_rating: float | None
     duration: int
 
 
@@ -60,6 +64,6 @@ class AnnouncementToReviewResponse(BaseModel):
     author_id: str | UUID
     guest_id: str | UUID
     announcement_id: str | UUID
-    author_name: str
-    guest_name: str
+    author_name: str | None
+    guest_name: str | None
     announcement_title: str
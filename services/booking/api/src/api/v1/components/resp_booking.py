@@ -6,8 +6,8 @@ from pydantic import BaseModel
 
 class BookingResponse(BaseModel):
     id: str | UUID
-    author_name: str
-    guest_name: str
+    author_name: str | None
+    guest_name: str | None
     author_status: bool | None
     guest_status: bool
 
@@ -15,11 +15,16 @@ class BookingResponse(BaseModel):
 class DetailBookingResponse(BaseModel):
     id: str | UUID
     announcement_id: str | UUID
-    movie_title: str
-    author_name: str
-    guest_name: str
+    movie_title: str | None
+    author_name: str | None
+    guest_name: str | None
     author_status: bool | None
     guest_status: bool
-    guest_rating: float
-    author_rating: float
+    guest_rating: float | None
+    author_rating: float | None
     event_time: datetime
+
+
+class BulkUpdateResponse(BaseModel):
+    booking_id: str | UUID
+    result: str
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends
+
+from db.redis import TieredCache, get_tiered_cache
+from utils import auth
+from utils.http_client import HttpClient, get_http_client
+
+router = APIRouter()
+auth_handler = auth.AuthHandler()
+
+
+@router.get(
+    '/stats/http',
+    summary='Статистика HTTP-клиента',
+    description='Пул соединений к другим сервисам: лимиты, занятые и свободные соединения, счетчики запросов',
+    response_description='Статистика пула',
+)
+async def http_stats(
+    http: HttpClient = Depends(get_http_client),
+    _user: dict = Depends(auth_handler.auth_wrapper),
+) -> dict:
+    return http.stats()
+
+
+@router.get(
+    '/stats/cache',
+    summary='Статистика кэша',
+    description='Попадания и промахи по уровням кэша пользователей, фильмов и рейтингов: L1 в процессе, L2 в Redis',
+    response_description='Статистика кэша',
+)
+async def cache_stats(
+    cache: TieredCache = Depends(get_tiered_cache),
+    _user: dict = Depends(auth_handler.auth_wrapper),
+) -> dict:
+    return cache.stats()
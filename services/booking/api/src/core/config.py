@@ -168,6 +168,144 @@ class RatingSettings(BaseConfig):
         env_prefix = 'REVIEW_API'
 
 
+class EnrichmentSettings(BaseConfig):
+    BUDGET_SEC: float = 2.0
+
+    class Config:
+        env_prefix = 'ENRICHMENT_'
+
+
+class PaginationSettings(BaseConfig):
+    DEFAULT_SIZE: int = 50
+    MAX_SIZE: int = 500
+    STREAM_CHUNK_SIZE: int = 500
+
+    class Config:
+        env_prefix = 'PAGINATION_'
+
+
+class AdmissionSettings(BaseConfig):
+    TOKEN_TTL_SEC: int = 60
+
+    class Config:
+        env_prefix = 'ADMISSION_'
+
+
+class BulkSettings(BaseConfig):
+    MAX_SIZE: int = 500
+
+    class Config:
+        env_prefix = 'BULK_'
+
+
+class IdempotencySettings(BaseConfig):
+    TTL_SEC: int = 86400
+    LOCK_TTL_SEC: int = 30
+    WAIT_SEC: float = 10.0
+    POLL_SEC: float = 0.1
+
+    class Config:
+        env_prefix = 'IDEMPOTENCY_'
+
+
+class DetailCacheSettings(BaseConfig):
+    TTL_SEC: int = 300
+
+    class Config:
+        env_prefix = 'DETAIL_CACHE_'
+
+
+class GeoSettings(BaseConfig):
+    DEFAULT_RADIUS_KM: float = 10.0
+    MAX_RADIUS_KM: float = 500.0
+
+    class Config:
+        env_prefix = 'GEO_'
+
+
+class FeedSettings(BaseConfig):
+    TTL_SEC: int = 30 * 86400
+
+    class Config:
+        env_prefix = 'FEED_'
+
+
+class OutboxSettings(BaseConfig):
+    BATCH_SIZE: int = 100
+    POLL_SEC: float = 1.0
+    RETRY_SEC: float = 5.0
+    MAX_RETRY_SEC: float = 600.0
+    REQUEST_TIMEOUT_SEC: float = 5.0
+    # строки пачки заняты релеем на время отправки, после падения релея их подберет другой
+    LEASE_SEC: float = 60.0
+    # после стольких неудачных попыток оповещение переносится в outbox_dead_letter
+    MAX_ATTEMPTS: int = 10
+
+    class Config:
+        env_prefix = 'OUTBOX_'
+
+
+class ListingSettings(BaseConfig):
+    # как давно обновлялись имя и рейтинг автора, чтобы проекция для списков считалась устаревшей
+    REFRESH_SEC: float = 15 * 60
+    BATCH_SIZE: int = 500
+    POLL_SEC: float = 5.0
+
+    class Config:
+        env_prefix = 'LISTING_'
+
+
+class HttpClientSettings(BaseConfig):
+    LIMIT: int = 100
+    LIMIT_PER_HOST: int = 20
+    KEEPALIVE_SEC: float = 30.0
+    DNS_TTL_SEC: int = 300
+    CONNECT_TIMEOUT_SEC: float = 1.0
+    TOTAL_TIMEOUT_SEC: float = 5.0
+    RETRIES: int = 2
+    RETRY_BACKOFF_SEC: float = 0.1
+
+    @property
+    def worst_case_sec(self) -> float:
+        # все попытки до таймаута плюс задержки между ними
+        backoff = sum(self.RETRY_BACKOFF_SEC * 2**attempt for attempt in range(self.RETRIES))
+        return (self.RETRIES + 1) * self.TOTAL_TIMEOUT_SEC + backoff
+
+    class Config:
+        env_prefix = 'HTTP_CLIENT_'
+
+
+class LocalCacheSettings(BaseConfig):
+    MAX_SIZE: int = 10000
+    TTL_SEC: float = 30.0
+    CHANNEL: str = 'cache:invalidate'
+    RESUBSCRIBE_SEC: float = 1.0
+
+    class Config:
+        env_prefix = 'LOCAL_CACHE_'
+
+
+class SingleFlightSettings(BaseConfig):
+    LOCK: bool = False
+    # не меньше худшего времени запроса http_client (3 * 5 + 0.3 с по умолчанию), см. SingleFlight._lock_ttl
+    LOCK_TTL_SEC: int = 20
+    WAIT_SEC: float = 2.0
+    POLL_SEC: float = 0.05
+
+    class Config:
+        env_prefix = 'SINGLE_FLIGHT_'
+
+
+class StaleCacheSettings(BaseConfig):
+    SOFT_TTL_SEC: int = 60
+    HARD_TTL_SEC: int = 60 * 60
+    NEGATIVE_TTL_SEC: int = 30
+    ERROR_TTL_SEC: int = 5
+
+    class Config:
+        env_prefix = 'STALE_CACHE_'
+
+
 class ProjectSettings(BaseConfig):
     PROJECT_NAME: str = 'Graduate_work'
     BASE_DIR = Path(__file__).parent.parent
@@ -184,6 +322,20 @@ class ProjectSettings(BaseConfig):
     redis: RedisSettings = RedisSettings()
     permission = PermissionSettings
     rating: RatingSettings = RatingSettings()
+    enrichment: EnrichmentSettings = EnrichmentSettings()
+    pagination: PaginationSettings = PaginationSettings()
+    admission: AdmissionSettings = AdmissionSettings()
+    bulk: BulkSettings = BulkSettings()
+    idempotency: IdempotencySettings = IdempotencySettings()
+    detail_cache: DetailCacheSettings = DetailCacheSettings()
+    geo: GeoSettings = GeoSettings()
+    feed: FeedSettings = FeedSettings()
+    outbox: OutboxSettings = OutboxSettings()
+    listing: ListingSettings = ListingSettings()
+    http_client: HttpClientSettings = HttpClientSettings()
+    local_cache: LocalCacheSettings = LocalCacheSettings()
+    single_flight: SingleFlightSettings = SingleFlightSettings()
+    stale_cache: StaleCacheSettings = StaleCacheSettings()
 
 
 settings = ProjectSettings()
@@ -0,0 +1,54 @@
+import inspect
+from functools import wraps
+from typing import Any, Callable, TypeVar
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+
+class Container:
+    """
+    Контейнер зависимостей приложения.
+
+    Singleton-провайдеры создают объект один раз на процесс: клиенты Redis и внешних API, репозитории
+    без состояния. Зависимости уровня запроса (сессия БД, UnitOfWork, SQL-репозитории и сервисы)
+    в контейнере не хранятся - их создает FastAPI на каждый запрос и закрывает по его завершении.
+    """
+
+    def __init__(self) -> None:
+        self._instances: dict[Callable, Any] = {}
+
+    def singleton(self, factory: Callable[[], T]) -> Callable[[], T]:
+        """
+        Декоратор singleton-провайдера.
+
+        :param factory: функция без аргументов, создающая объект
+        :return: провайдер, возвращающий один и тот же объект
+        """
+
+        @wraps(factory)
+        def provider() -> T:
+            if factory not in self._instances:
+                self._instances[factory] = factory()
+                logger.info(f'Container: init <{factory.__module__}.{factory.__name__}>')
+            return self._instances[factory]
+
+        return provider
+
+    async def shutdown(self) -> None:
+        """Закрытие singleton-объектов в порядке, обратном созданию."""
+        for factory, instance in reversed(list(self._instances.items())):
+            close = getattr(instance, 'close', None)
+            if close is None:
+                continue
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+            logger.info(f'Container: close <{factory.__module__}.{factory.__name__}>')
+        self._instances.clear()
+
+
+container = Container()
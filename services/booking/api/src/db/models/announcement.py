@@ -2,14 +2,40 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import TIMESTAMP, Boolean, Column, Enum, Integer, String, UniqueConstraint, inspect, MetaData
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import (
+    TIMESTAMP,
+    Boolean,
+    Column,
+    Computed,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    UniqueConstraint,
+    func,
+    inspect,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import declarative_base, deferred
 
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
 
+# Конфигурация russian стеммит кириллицу russian_stem, а латиницу - english_stem,
+# поэтому один вектор покрывает и русские, и английские тексты объявлений.
+SEARCH_CONFIG = 'russian'
+SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(event_location, '')), 'C')"
+)
+
+
 class EventStatus(enum.Enum):
     Created = 'Created'
     Alive = 'Alive'
@@ -19,7 +45,16 @@ class EventStatus(enum.Enum):
 
 class Announcement(Base):
     __tablename__ = 'announcements'
-    __table_args__ = (UniqueConstraint('author_id', 'event_time', name='_author_event_time'),)
+    __table_args__ = (
+        UniqueConstraint('author_id', 'event_time', name='_author_event_time'),
+        Index('ix_announcements_alive_event_time_id', 'event_time', 'id', postgresql_where=text("status = 'Alive'")),
+        Index('ix_announcements_author_id_event_time_id', 'author_id', 'event_time', 'id'),
+        Index('ix_announcements_movie_id_event_time_id', 'movie_id', 'event_time', 'id'),
+        Index('ix_announcements_search_vector', 'search_vector', postgresql_using='gin'),
+        # загрузка ближайших завершений и инкрементальный подхват изменений в watcher
+        Index('ix_announcements_status_event_time', 'status', 'event_time'),
+        Index('ix_announcements_modified', 'modified'),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     status = Column(Enum(EventStatus))
@@ -30,11 +65,32 @@ class Announcement(Base):
     sub_only = Column(Boolean, server_default='t', default=True)
     is_free = Column(Boolean, server_default='t', default=True)
     tickets_count = Column(Integer, default=1)
+    seats_confirmed = Column(Integer, nullable=False, server_default='0', default=0)
     event_time = Column(TIMESTAMP(timezone=True), nullable=False, unique=True)
     event_location = Column(String(4096), default='test_location')
     created = Column(TIMESTAMP(timezone=True), nullable=False, default=datetime.utcnow)
-    modified = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
+    modified = Column(TIMESTAMP(timezone=True), default=datetime.utcnow, onupdate=func.now())
     duration = Column(Integer, default=60)
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True)))
 
     def _asdict(self):
-        return {c.key: getattr(self, c.key) for c in inspect(self).mapper.column_attrs}
+        state = inspect(self)
+        return {c.key: getattr(self, c.key) for c in state.mapper.column_attrs if c.key not in state.unloaded}
+
+
+class AnnouncementListing(Base):
+    """Проекция для списков объявлений: данные других сервисов, которые показываются в карточке списка."""
+
+    __tablename__ = 'announcement_listing'
+
+    id = Column(UUID(as_uuid=True), ForeignKey('announcements.id', ondelete='CASCADE'), primary_key=True)
+    movie_title = Column(String(256))
+    author_name = Column(String(256))
+    author_rating = Column(Float)
+    modified = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+
+# GiST-индекс для поиска в радиусе (расширения cube и earthdistance)
+Index('ix_announcements_earth', func.ll_to_earth(Announcement.lat, Announcement.lon), postgresql_using='gist')
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import TIMESTAMP, Boolean, Column, ForeignKey, UniqueConstraint, inspect, MetaData
+from sqlalchemy import TIMESTAMP, Boolean, Column, ForeignKey, Index, UniqueConstraint, inspect, MetaData
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
@@ -15,6 +15,9 @@ class Booking(Base):
     __tablename__ = 'booking'
     __table_args__ = (
         UniqueConstraint('guest_id', 'event_time', name='_bk_guest_event_time'),
+        Index('ix_booking_created_id', 'created', 'id'),
+        Index('ix_booking_author_id_created_id', 'author_id', 'created', 'id'),
+        Index('ix_booking_guest_id_created_id', 'guest_id', 'created', 'id'),
     )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -0,0 +1,35 @@
+import uuid
+
+from sqlalchemy import TIMESTAMP, Column, Index, Integer, MetaData, Text, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import declarative_base
+
+metadata = MetaData()
+Base = declarative_base(metadata=metadata)
+
+
+class Outbox(Base):
+    """Оповещения, записанные в транзакции изменения и ожидающие отправки релеем."""
+
+    __tablename__ = 'outbox'
+    __table_args__ = (Index('ix_outbox_available_at', 'available_at'),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    event = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default='0', default=0)
+    available_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    created = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(Text)
+
+
+class OutboxDeadLetter(Base):
+    """Оповещения, которые релей не смог доставить за settings.outbox.MAX_ATTEMPTS попыток."""
+
+    __tablename__ = 'outbox_dead_letter'
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    event = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    created = Column(TIMESTAMP(timezone=True), nullable=False)
+    failed_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(Text)
@@ -3,7 +3,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from core.config import settings
-from db.models import announcement, booking
+from db.models import announcement, booking, outbox  # noqa: F401
 
 engine = create_async_engine(settings.postgres.a_uri, echo=True)
 Base = declarative_base()
@@ -1,11 +1,27 @@
+import asyncio
+import contextlib
+import time
 from abc import ABC, abstractmethod
-from functools import lru_cache
+from collections import OrderedDict
 from typing import Any
+from uuid import uuid4
 
 import orjson
+from core.config import settings
+from core.container import container
+from core.logger import get_logger
 from redis import asyncio as aioredis
+from redis.exceptions import RedisError
 
-from core.config import settings
+logger = get_logger(__name__)
+
+# KEYS[1] - ключ, ARGV[1] - ожидаемое значение: ключ удаляется, только если значение не изменилось.
+DELETE_IF_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
 
 class CacheProtocol(ABC):
@@ -17,10 +33,31 @@ class CacheProtocol(ABC):
     async def set(self, key: str, value: Any, exp: int) -> None:
         ...
 
+    @abstractmethod
+    async def set_nx(self, key: str, value: Any, exp: int) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def delete_if(self, key: str, value: Any) -> bool:
+        ...
+
+    @abstractmethod
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        ...
+
+    @abstractmethod
+    async def set_many(self, data: dict[str, Any], exp: int) -> None:
+        ...
+
 
 class RedisCache(CacheProtocol):
     def __init__(self) -> None:
-        self.session = aioredis.from_url(settings.redis.uri)
+        self.session = get_redis()
+        self._delete_if = self.session.register_script(DELETE_IF_SCRIPT)
 
     async def get(self, key: str) -> str:
         value = await self.session.get(key)
@@ -31,10 +68,202 @@ class RedisCache(CacheProtocol):
     async def set(self, key: str, value: Any, exp: int = settings.redis.EXPIRE_SEC) -> None:
         await self.session.set(key, orjson.dumps(value), ex=exp)
 
+    async def set_nx(self, key: str, value: Any, exp: int = settings.redis.EXPIRE_SEC) -> bool:
+        return bool(await self.session.set(key, orjson.dumps(value), ex=exp, nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self.session.delete(key)
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        return bool(await self._delete_if(keys=[key], args=[orjson.dumps(value)]))
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        if not keys:
+            return []
+        values = await self.session.mget(keys)
+        return [None if value is None else orjson.loads(value) for value in values]
+
+    async def set_many(self, data: dict[str, Any], exp: int = settings.redis.EXPIRE_SEC) -> None:
+        if not data:
+            return
+        async with self.session.pipeline(transaction=False) as pipe:
+            for key, value in data.items():
+                pipe.set(key, orjson.dumps(value), ex=exp)
+            await pipe.execute()
+
     async def close(self) -> None:
         await self.session.close()
 
 
-@lru_cache()
+class TieredCache(CacheProtocol):
+    """
+    Двухуровневый кэш: L1 в памяти процесса (LRU, ограничен по размеру и TTL), L2 - Redis.
+
+    Чтение идет в Redis только при промахе L1, значения в L1 хранятся уже декодированными.
+    Запись и удаление ключа меняют L2 и рассылают ключ по каналу pub/sub, остальные процессы
+    удаляют его из своего L1. Пока подписка не восстановлена после разрыва, L1 не используется,
+    поэтому устаревшее значение живет не дольше settings.local_cache.TTL_SEC.
+    """
+
+    def __init__(self, l2: RedisCache) -> None:
+        self.l2 = l2
+        self._l1: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._sender = uuid4().hex
+        # растет при каждой инвалидации: значение, прочитанное из L2 до нее, в L1 не попадает
+        self._epoch = 0
+        self._subscribed = False
+        self._listener: asyncio.Task | None = None
+        self._stats = dict.fromkeys(('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses', 'evictions', 'invalidations'), 0)
+
+    def _l1_get(self, key: str) -> tuple[bool, Any]:
+        if not self._subscribed:
+            return False, None
+        item = self._l1.get(key)
+        if item is None or item[0] < time.monotonic():
+            self._l1.pop(key, None)
+            self._stats['l1_misses'] += 1
+            return False, None
+        self._l1.move_to_end(key)
+        self._stats['l1_hits'] += 1
+        return True, item[1]
+
+    def _l1_set(self, key: str, value: Any) -> None:
+        if not self._subscribed or value is None:
+            return
+        self._l1[key] = (time.monotonic() + settings.local_cache.TTL_SEC, value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > settings.local_cache.MAX_SIZE:
+            self._l1.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _l2_count(self, values: list[Any]) -> None:
+        hits = sum(value is not None for value in values)
+        self._stats['l2_hits'] += hits
+        self._stats['l2_misses'] += len(values) - hits
+
+    def _invalidate(self, keys: list[str] | tuple[str, ...]) -> None:
+        self._epoch += 1
+        for key in keys:
+            self._l1.pop(key, None)
+
+    async def _publish(self, *keys: str) -> None:
+        self._invalidate(keys)
+        await self.l2.session.publish(
+            settings.local_cache.CHANNEL,
+            orjson.dumps({'sender': self._sender, 'keys': keys}),
+        )
+
+    async def get(self, key: str) -> Any:
+        found, value = self._l1_get(key)
+        if found:
+            return value
+        epoch = self._epoch
+        value = await self.l2.get(key)
+        self._l2_count([value])
+        if epoch == self._epoch:
+            self._l1_set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any, exp: int = settings.redis.EXPIRE_SEC) -> None:
+        await self.l2.set(key, value, exp=exp)
+        await self._publish(key)
+
+    async def set_nx(self, key: str, value: Any, exp: int = settings.redis.EXPIRE_SEC) -> bool:
+        acquired = await self.l2.set_nx(key, value, exp=exp)
+        if acquired:
+            await self._publish(key)
+        return acquired
+
+    async def delete(self, key: str) -> None:
+        await self.l2.delete(key)
+        await self._publish(key)
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        deleted = await self.l2.delete_if(key, value)
+        if deleted:
+            await self._publish(key)
+        return deleted
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        values = {}
+        for key in keys:
+            found, value = self._l1_get(key)
+            if found:
+                values[key] = value
+        misses = [key for key in keys if key not in values]
+        if misses:
+            epoch = self._epoch
+            fetched = await self.l2.get_many(misses)
+            self._l2_count(fetched)
+            for key, value in zip(misses, fetched):
+                values[key] = value
+                if epoch == self._epoch:
+                    self._l1_set(key, value)
+        return [values[key] for key in keys]
+
+    async def set_many(self, data: dict[str, Any], exp: int = settings.redis.EXPIRE_SEC) -> None:
+        if not data:
+            return
+        await self.l2.set_many(data, exp=exp)
+        await self._publish(*data)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.l2.session.pubsub()
+            try:
+                await pubsub.subscribe(settings.local_cache.CHANNEL)
+                self._subscribed = True
+                logger.info(f'TieredCache subscribed <{settings.local_cache.CHANNEL}>')
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    data = orjson.loads(message['data'])
+                    if data['sender'] == self._sender:
+                        continue
+                    self._invalidate(data['keys'])
+                    self._stats['invalidations'] += len(data['keys'])
+            except (RedisError, OSError, orjson.JSONDecodeError, KeyError) as ex:
+                # сообщения об инвалидации могли потеряться
+                logger.error(f'TieredCache subscription lost <{ex!r}>')
+            finally:
+                self._subscribed = False
+                self._epoch += 1
+                self._l1.clear()
+                await pubsub.close()
+            await asyncio.sleep(settings.local_cache.RESUBSCRIBE_SEC)
+
+    async def start(self) -> None:
+        """Подписка на канал инвалидации, вызывается при старте приложения."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Статистика по уровням кэша.
+
+        :return: попадания и промахи L1 и L2, вытеснения, инвалидации от других процессов, размер L1
+        """
+        return self._stats | {'l1_size': len(self._l1), 'l1_max_size': settings.local_cache.MAX_SIZE}
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+        logger.info(f'TieredCache closed: <{self.stats()}>')
+
+
+@container.singleton
+def get_redis() -> aioredis.Redis:
+    return aioredis.from_url(settings.redis.uri)
+
+
+@container.singleton
 def get_cache() -> CacheProtocol:
     return RedisCache()
+
+
+@container.singleton
+def get_tiered_cache() -> TieredCache:
+    return TieredCache(get_cache())
@@ -0,0 +1,105 @@
+from typing import Any, Mapping
+from uuid import UUID
+
+import sqlalchemy.exc as sqlalch_exc
+from fastapi import Depends
+
+import utils.exceptions as exc
+from core.logger import get_logger
+from db.pg_db import AsyncSession, get_session
+
+logger = get_logger(__name__)
+
+
+class UnitOfWork:
+    """
+    Единица работы в рамках одного запроса.
+
+    Хранит одну сессию БД и identity map загруженных строк по первичному ключу: повторное чтение
+    той же строки в запросе не идет в БД, а строки, возвращенные UPDATE/INSERT ... RETURNING,
+    заменяют закэшированные. Репозитории не коммитят сами - транзакция фиксируется один раз
+    при выходе из внешнего `async with uow`, при ошибке откатывается.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self._rows: dict[tuple[str, str], dict[str, Any]] = {}
+        self._depth = 0
+
+    @staticmethod
+    def _key(model: Any, pk: str | UUID) -> tuple[str, str]:
+        return model.__tablename__, str(pk)
+
+    async def get(self, model: Any, pk: str | UUID) -> dict[str, Any] | None:
+        """
+        Получение строки по первичному ключу, в БД идем только при первом обращении.
+
+        :param model: модель sqlalchemy
+        :param pk: первичный ключ
+        :return: значения колонок или None, если строки нет
+        """
+        key = self._key(model, pk)
+        if key not in self._rows:
+            data = await self.session.get(model, pk)
+            if data is None:
+                return None
+            self._rows[key] = data._asdict()
+        return self._rows[key]
+
+    def remember(self, model: Any, row: Mapping[str, Any]) -> dict[str, Any]:
+        """
+        Положить в identity map строку, возвращенную RETURNING.
+
+        :param model: модель sqlalchemy
+        :param row: строка результата, лишние колонки отбрасываются, отсутствующие (вычисляемые) пропускаются
+        :return: значения колонок модели
+        """
+        data = {column.key: row[column.key] for column in model.__table__.c if column.key in row}
+        self._rows[self._key(model, data['id'])] = data
+        return data
+
+    def refresh(self, model: Any, pk: str | UUID, **values: Any) -> None:
+        """
+        Обновить часть колонок закэшированной строки, если она уже загружена.
+
+        :param model: модель sqlalchemy
+        :param pk: первичный ключ
+        :param values: новые значения колонок
+        """
+        data = self._rows.get(self._key(model, pk))
+        if data is not None:
+            data.update(values)
+
+    def forget(self, model: Any, pk: str | UUID) -> None:
+        self._rows.pop(self._key(model, pk), None)
+
+    async def commit(self) -> None:
+        """
+        :raises UniqueConstraintError: если отложенная проверка ограничений не прошла
+        """
+        try:
+            await self.session.commit()
+        except sqlalch_exc.IntegrityError as ex:
+            await self.rollback()
+            logger.info('UniqueConstraintError on commit')
+            raise exc.UniqueConstraintError from ex
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+        self._rows.clear()
+
+    async def __aenter__(self) -> 'UnitOfWork':
+        self._depth += 1
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        self._depth -= 1
+        if exc_type is not None:
+            await self.rollback()
+        elif self._depth == 0:
+            await self.commit()
+
+
+# Dependency
+def get_uow(db_session: AsyncSession = Depends(get_session)) -> UnitOfWork:
+    return UnitOfWork(db_session)
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import signal
+from datetime import timedelta
+
+from core.config import settings
+from core.container import container
+from core.logger import get_logger
+from db.models.announcement import Announcement, AnnouncementListing
+from db.pg_db import async_session, engine
+from db.redis import get_cache
+from db.uow import UnitOfWork
+from services.announcement import layer_models
+from services.announcement.repositories.announce_repo import AnnounceSqlachemyRepository
+from services.announcement.repositories.movie_repo import get_movie_repo
+from services.announcement.repositories.rating_repo import get_rating_repo
+from services.announcement.repositories.user_repo import get_user_repo
+from sqlalchemy import Interval, func, literal, select, update
+from utils.batch_poller import BatchPoller
+from utils.http_client import get_http_client
+
+logger = get_logger(__name__)
+
+LISTING = AnnouncementListing.__table__
+
+
+class ListingRefresher(BatchPoller):
+    """
+    Заполнение и обновление проекции announcement_listing вне запросов API.
+
+    Списки объявлений читают проекцию одним SELECT и не ходят в другие сервисы. Имя и рейтинг автора
+    меняются в auth и ugc без событий для этого сервиса, поэтому строки, обновленные раньше
+    чем REFRESH_SEC назад, перечитываются пачками через пакетные запросы к сервисам.
+    Строку пачки занимает сдвиг modified (без блокировок на время запросов), поэтому процессов
+    может быть несколько. Строки, которые не удалось дополнить, повторяются через REFRESH_SEC.
+    Проекции для объявлений, созданных до ее появления, добавляет миграция с modified в прошлом.
+    """
+
+    name = 'Listing refresher'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.user_repo = get_user_repo()
+        self.rating_repo = get_rating_repo()
+        self.movie_repo = get_movie_repo()
+
+    async def _claim(self) -> list:
+        """
+        Служебный метод. Занять пачку устаревших строк проекции.
+
+        :return: строки (id, author_id, movie_id)
+        """
+        # завершенные события в списки не попадают, их проекция не обновляется
+        stale = (
+            select(LISTING.c.id)
+            .join(Announcement, Announcement.id == LISTING.c.id)
+            .where(
+                LISTING.c.modified < func.now() - literal(timedelta(seconds=settings.listing.REFRESH_SEC), Interval),
+                Announcement.status != layer_models.EventStatus.Done.value,
+            )
+            .order_by(LISTING.c.modified)
+            .limit(settings.listing.BATCH_SIZE)
+            .with_for_update(of=LISTING, skip_locked=True)
+        )
+        async with async_session() as db, db.begin():
+            _res = await db.execute(
+                update(LISTING).where(LISTING.c.id.in_(stale)).values(modified=func.now()).returning(LISTING.c.id),
+            )
+            ids = [row.id for row in _res.all()]
+            if not ids:
+                return []
+            _res = await db.execute(
+                select(Announcement.id, Announcement.author_id, Announcement.movie_id).where(Announcement.id.in_(ids)),
+            )
+            return _res.all()
+
+    async def refresh_batch(self) -> int:
+        """
+        Обновить одну пачку строк проекции.
+
+        :return: число обработанных строк
+        """
+        rows = await self._claim()
+        if not rows:
+            return 0
+        author_ids = list({str(row.author_id) for row in rows})
+        movie_ids = list({str(row.movie_id) for row in rows})
+        users, ratings, movies = await asyncio.gather(
+            self.user_repo.get_many(author_ids),
+            self.rating_repo.get_many(author_ids),
+            self.movie_repo.get_many(movie_ids),
+        )
+        items = []
+        for row in rows:
+            _user, _rating, _movie = (
+                users.get(str(row.author_id)),
+                ratings.get(str(row.author_id)),
+                movies.get(str(row.movie_id)),
+            )
+            items.append(
+                layer_models.ListingProjection(
+                    id=row.id,
+                    movie_title=_movie.movie_title if _movie else None,
+                    author_name=_user.user_name if _user else None,
+                    author_rating=_rating.user_rating if _rating else None,
+                ),
+            )
+        async with async_session() as db:
+            uow = UnitOfWork(db)
+            async with uow:
+                await AnnounceSqlachemyRepository(uow, get_cache()).save_listing(items)
+        unresolved = sum(item.author_name is None or item.movie_title is None for item in items)
+        logger.info(f'Listing refresher: refreshed <{len(items)}>, unresolved <{unresolved}>')
+        return len(rows)
+
+    async def run(self, once: bool = False) -> None:
+        """
+        :param once: обработать все устаревшие строки и завершиться (разовое заполнение)
+        """
+        await get_http_client().start()
+        logger.info('Listing refresher started')
+        await self.poll(self.refresh_batch, settings.listing.BATCH_SIZE, settings.listing.POLL_SEC, once=once)
+
+
+async def main(once: bool) -> None:
+    refresher = ListingRefresher()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, refresher.stop)
+    try:
+        await refresher.run(once=once)
+    finally:
+        await container.shutdown()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Заполнение и обновление проекции announcement_listing')
+    parser.add_argument('--once', action='store_true', help='обработать устаревшие строки и завершиться')
+    asyncio.run(main(parser.parse_args().once))
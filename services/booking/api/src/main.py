@@ -4,12 +4,15 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
-from api.v1 import announcement, booking
+from api.v1 import announcement, booking, stats
 from core.config import settings
+from core.container import container
 from core.logger import LOGGING
-from db.pg_db import init_models
+from db.pg_db import engine
+from db.redis import get_tiered_cache
 from middleware.auth import auth_middleware
 from middleware.logger import logging_middleware
+from utils.http_client import get_http_client
 from utils.sentry import init_sentry
 
 if settings.logging.SENTRY_DSN:
@@ -26,7 +29,19 @@ app = FastAPI(
 logging_middleware(app=app)
 if not settings.debug.DEBUG:
     auth_middleware(app=app)
-    
+
+
+@app.on_event('startup')
+async def startup() -> None:
+    await get_http_client().start()
+    await get_tiered_cache().start()
+
+
+@app.on_event('shutdown')
+async def shutdown() -> None:
+    await container.shutdown()
+    await engine.dispose()
+
 
 app.include_router(
     announcement.router,
@@ -38,6 +53,11 @@ app.include_router(
     prefix=settings.fastapi.API_PREFIX,
     tags=['booking'],
 )
+app.include_router(
+    stats.router,
+    prefix=settings.fastapi.API_PREFIX,
+    tags=['stats'],
+)
 
 if __name__ == '__main__':
     uvicorn.run(
@@ -6,6 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 from db.models.booking import Base as Books
 from db.models.announcement import Base as Announcements
+from db.models.outbox import Base as Outbox
 from core.config import settings
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -22,7 +23,7 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-target_metadata = [Announcements.metadata, Books.metadata]
+target_metadata = [Announcements.metadata, Books.metadata, Outbox.metadata]
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
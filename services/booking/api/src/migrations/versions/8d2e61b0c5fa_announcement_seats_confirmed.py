@@ -0,0 +1,33 @@
+"""announcement seats_confirmed
+
+Revision ID: 8d2e61b0c5fa
+Revises: 3c1f2a9d7e41
+Create Date: 2023-06-07 18:02:45.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e61b0c5fa'
+down_revision = '3c1f2a9d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('announcements', sa.Column('seats_confirmed', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE announcements AS a
+        SET seats_confirmed = (
+            SELECT count(*) FROM booking AS b
+            WHERE b.announcement_id = a.id AND b.author_status AND b.guest_status
+        )
+        """,
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('announcements', 'seats_confirmed')
@@ -0,0 +1,32 @@
+"""announcement listing backfill
+
+Revision ID: a3f5c1e8b274
+Revises: 6e2a8c4f1d93
+Create Date: 2023-06-23 14:37:05.911482
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f5c1e8b274'
+down_revision = '6e2a8c4f1d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_announcement_listing_modified', 'announcement_listing', ['modified'], unique=False)
+    # пустые строки проекции для объявлений, созданных до ее появления: modified в прошлом,
+    # поэтому listing_refresher заполнит их первыми
+    op.execute(
+        """
+        INSERT INTO announcement_listing (id, modified)
+        SELECT id, 'epoch'::timestamptz FROM announcements
+        ON CONFLICT (id) DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_announcement_listing_modified', table_name='announcement_listing')
@@ -0,0 +1,170 @@
+import asyncio
+import signal
+import time
+from datetime import timedelta
+from uuid import UUID
+
+import aiohttp
+from core.config import settings
+from core.logger import get_logger
+from db.models.outbox import Outbox, OutboxDeadLetter
+from db.pg_db import async_session, engine
+from sqlalchemy import Interval, bindparam, delete, func, insert, literal, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement
+from utils.batch_poller import BatchPoller
+from utils.http_client import HttpClient
+
+logger = get_logger(__name__)
+
+OUTBOX = Outbox.__table__
+DEAD_LETTER_FIELDS = [OUTBOX.c.id, OUTBOX.c.event, OUTBOX.c.attempts, OUTBOX.c.created, OUTBOX.c.last_error]
+
+
+class OutboxRelay(BatchPoller):
+    """
+    Доставка оповещений из таблицы outbox в API оповещений (at-least-once).
+
+    Пачка строк занимается короткой транзакцией: FOR UPDATE SKIP LOCKED, счетчик попыток
+    увеличивается, available_at сдвигается на LEASE_SEC (аренда), коммит. Отправка идет без открытой
+    транзакции и блокировок, после нее второй короткой транзакцией отправленные строки удаляются,
+    неотправленные откладываются с экспоненциальной задержкой. Если релей упадет во время отправки,
+    строки снова станут доступны после окончания аренды, получатель отличает повторы по notification_id.
+    Оповещения, не доставленные за MAX_ATTEMPTS попыток, переносятся в outbox_dead_letter.
+    """
+
+    name = 'Outbox relay'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.endpoint = f'{settings.nptific.uri}send'
+        self.http = HttpClient()
+        self._timeout = aiohttp.ClientTimeout(total=settings.outbox.REQUEST_TIMEOUT_SEC)
+
+    async def _post(self, event: dict) -> None:
+        # повторы выполняет сам outbox с экспоненциальной задержкой
+        await self.http.post(self.endpoint, json=event, retries=0, timeout=self._timeout)
+
+    @staticmethod
+    async def _bury(db: AsyncSession, *criteria: ColumnElement) -> int:
+        """
+        Служебный метод. Перенести строки в outbox_dead_letter одним запросом (DELETE ... RETURNING в CTE).
+
+        :param db: сессия с открытой транзакцией
+        :param criteria: условие отбора строк outbox
+        :return: число перенесенных строк
+        """
+        moved = (
+            delete(OUTBOX)
+            .where(OUTBOX.c.id.in_(select(OUTBOX.c.id).where(*criteria).with_for_update(skip_locked=True)))
+            .returning(*DEAD_LETTER_FIELDS)
+            .cte('moved')
+        )
+        _res = await db.execute(
+            insert(OutboxDeadLetter.__table__)
+            .from_select([column.key for column in DEAD_LETTER_FIELDS], select(moved))
+            .returning(OutboxDeadLetter.id),
+        )
+        buried = len(_res.all())
+        if buried:
+            logger.error(f'Outbox relay: <{buried}> notifications moved to outbox_dead_letter')
+        return buried
+
+    async def _claim(self) -> list[Row]:
+        """
+        Служебный метод. Занять пачку готовых к отправке строк.
+
+        :return: строки (id, event, attempts), attempts уже учитывает текущую попытку
+        """
+        lease = literal(timedelta(seconds=settings.outbox.LEASE_SEC), Interval)
+        ready = (
+            select(OUTBOX.c.id)
+            .where(OUTBOX.c.available_at <= func.now())
+            .order_by(OUTBOX.c.available_at)
+            .limit(settings.outbox.BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        async with async_session() as db, db.begin():
+            # исчерпавшие попытки, в том числе после падения релея во время аренды
+            await self._bury(
+                db,
+                OUTBOX.c.attempts >= settings.outbox.MAX_ATTEMPTS,
+                OUTBOX.c.available_at <= func.now(),
+            )
+            _res = await db.execute(
+                update(OUTBOX)
+                .where(OUTBOX.c.id.in_(ready))
+                .values(attempts=OUTBOX.c.attempts + 1, available_at=func.now() + lease)
+                .returning(OUTBOX.c.id, OUTBOX.c.event, OUTBOX.c.attempts),
+            )
+            return _res.all()
+
+    async def _settle(self, sent: list[UUID], failed: list[tuple[Row, Exception]]) -> None:
+        """
+        Служебный метод. Удалить отправленные строки, отложить или похоронить неотправленные.
+
+        :param sent: id отправленных строк
+        :param failed: неотправленные строки и ошибки
+        """
+        retry = literal(timedelta(seconds=settings.outbox.RETRY_SEC), Interval) * func.power(2, OUTBOX.c.attempts - 1)
+        max_retry = literal(timedelta(seconds=settings.outbox.MAX_RETRY_SEC), Interval)
+        async with async_session() as db, db.begin():
+            if sent:
+                await db.execute(delete(OUTBOX).where(OUTBOX.c.id.in_(sent)))
+            if failed:
+                await db.execute(
+                    update(OUTBOX)
+                    .where(OUTBOX.c.id == bindparam('_id'))
+                    .values(available_at=func.now() + func.least(retry, max_retry), last_error=bindparam('_error')),
+                    [{'_id': row.id, '_error': repr(ex)[:1000]} for row, ex in failed],
+                )
+                exhausted = [row.id for row, _ in failed if row.attempts >= settings.outbox.MAX_ATTEMPTS]
+                if exhausted:
+                    await self._bury(db, OUTBOX.c.id.in_(exhausted))
+
+    async def relay_batch(self) -> int:
+        """
+        Отправить одну пачку оповещений.
+
+        :return: число обработанных строк
+        """
+        rows = await self._claim()
+        if not rows:
+            return 0
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._post(row.event) for row in rows), return_exceptions=True)
+        sent = [row.id for row, result in zip(rows, results) if not isinstance(result, Exception)]
+        failed = [(row, result) for row, result in zip(rows, results) if isinstance(result, Exception)]
+        await self._settle(sent, failed)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f'Outbox relay: sent <{len(sent)}>, failed <{len(failed)}> '
+            f'in <{elapsed:.3f}> s, <{len(rows) / elapsed:.0f}> msg/s',
+        )
+        return len(rows)
+
+    async def run(self) -> None:
+        await self.http.start()
+        logger.info(f'Outbox relay started <{self.endpoint}>')
+        await self.poll(self.relay_batch, settings.outbox.BATCH_SIZE, settings.outbox.POLL_SEC)
+
+    async def close(self) -> None:
+        await self.http.close()
+
+
+async def main() -> None:
+    relay = OutboxRelay()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, relay.stop)
+    try:
+        await relay.run()
+    finally:
+        await relay.close()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -18,8 +18,8 @@ class UserToResponse(BaseModel):
 class BookingToDetailResponse(BaseModel):
     booking_id: str | UUID
     guest_id: str | UUID
-    guest_name: str
-    guest_rating: float
+    guest_name: str | None
+    guest_rating: float | None
     guest_status: bool
     author_status: bool | None
 
@@ -30,6 +30,11 @@ class MovieToResponse(BaseModel):
     duration: int
 
 
+class Coordinates(BaseModel):
+    lat: float
+    lon: float
+
+
 class EventStatus(str, Enum):
     Created = 'Created'
     Alive = 'Alive'
@@ -40,16 +45,38 @@ class EventStatus(str, Enum):
         return f'{self.value}'
 
 
+# объявление остается в лентах подписчиков, пока оно Alive или Closed: между ними статус переключает
+# сервис заявок при изменении числа мест, в обход AnnouncementService; в выдачу ленты попадают только Alive
+FEED_STATUSES = (EventStatus.Alive.value, EventStatus.Closed.value)
+
+
 class AnnouncementResponse(BaseModel):
     id: str | UUID
     title: str
     author_id: str | UUID
+    movie_id: str | UUID
     sub_only: bool
     is_free: bool
     tickets_count: int
+    tickets_left: int
     event_time: datetime
     event_location: str
     duration: int
+    movie_title: str | None
+    author_name: str | None
+    author_rating: float | None
+
+
+class ListingProjection(BaseModel):
+    id: str | UUID
+    movie_title: str | None
+    author_name: str | None
+    author_rating: float | None
+
+
+class AnnouncementPage(BaseModel):
+    items: list[AnnouncementResponse]
+    next_cursor: str | None
 
 
 class DetailAnnouncementResponse(BaseModel):
@@ -59,8 +86,8 @@ class DetailAnnouncementResponse(BaseModel):
     status: EventStatus
     title: str
     description: str
-    movie_title: str
-    author_name: str
+    movie_title: str | None
+    author_name: str | None
     sub_only: bool
     is_free: bool
     tickets_count: int
@@ -68,7 +95,7 @@ class DetailAnnouncementResponse(BaseModel):
     event_time: datetime
     event_location: str
     guest_list: list[BookingToDetailResponse]
-    author_rating: float
+    author_rating: float | None
     duration: int
 
 
@@ -84,6 +111,7 @@ class PGAnnouncement(BaseModel):
     sub_only: bool
     is_free: bool
     tickets_count: int
+    seats_confirmed: int = 0
     event_time: datetime
     event_location: str
     duration: int
@@ -106,6 +134,6 @@ class AnnouncementToReviewResponse(BaseModel):
     author_id: str | UUID
     guest_id: str | UUID
     announcement_id: str | UUID
-    author_name: str
-    guest_name: str
+    author_name: str | None
+    guest_name: str | None
     announcement_title: str
@@ -37,6 +37,8 @@ class PGCreatePayload(BaseModel):
     event_time: datetime
     event_location: str
     duration: int
+    lat: float | None
+    lon: float | None
 
 
 class APIUpdatePayload(BaseModel):
@@ -57,7 +59,15 @@ class APIMultyPayload(BaseModel):
     sub: bool | None
     ticket: int | None
     date: datetime | None
+    date_from: datetime | None
+    date_to: datetime | None
     location: str | None
+    q: str | None
+    lat: float | None
+    lon: float | None
+    radius_km: float
+    size: int
+    cursor: str | None
 
 
 class NewAnnounce(BaseModel):
@@ -1,7 +1,10 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Awaitable, Callable
 from uuid import UUID
 
 from services.announcement import layer_models, layer_payload
+from utils.dataloader import DataLoader
 
 
 class AnnouncementRepositoryProtocol(ABC):
@@ -16,8 +19,23 @@ class AnnouncementRepositoryProtocol(ABC):
     async def get_multy(
         self,
         query: layer_payload.APIMultyPayload,
-        user: layer_models.UserToResponse,
-    ) -> list[layer_models.AnnouncementResponse]:
+        user: layer_models.UserToResponse | None,
+    ) -> layer_models.AnnouncementPage:
+        """
+        :raises InvalidCursorError
+        """
+        ...
+
+    @abstractmethod
+    async def get_many(self, announce_ids: list[str | UUID]) -> list[layer_models.AnnouncementResponse]:
+        ...
+
+    @abstractmethod
+    async def get_feed_items(self, author_ids: list[str | UUID]) -> list[tuple[str | UUID, datetime]]:
+        ...
+
+    @abstractmethod
+    async def save_listing(self, items: list[layer_models.ListingProjection]) -> None:
         ...
 
     @abstractmethod
@@ -26,6 +44,7 @@ class AnnouncementRepositoryProtocol(ABC):
         new_announce: layer_payload.PGCreatePayload,
         movie: layer_models.MovieToResponse,
         author_id: str | UUID,
+        coordinates: layer_models.Coordinates | None = None,
     ) -> str | UUID:
         """
         :raises UniqueConstraintError
@@ -37,6 +56,7 @@ class AnnouncementRepositoryProtocol(ABC):
         self,
         announce_id: str | UUID,
         update_announce: layer_payload.APIUpdatePayload,
+        coordinates: layer_models.Coordinates | None = None,
     ) -> None:
         """
         :raises NotFoundError:
@@ -57,20 +77,26 @@ class AnnouncementRepositoryProtocol(ABC):
 
 class UserRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_by_id(self, user_id: str | UUID) -> layer_models.UserToResponse:
+    async def get_by_id(self, user_id: str | UUID, strict: bool = False) -> layer_models.UserToResponse | None:
         """
-        :raises NotFoundError
+        :return: None - если объект не найден (или, без strict, сервис недоступен и данных в кэше нет)
+        :raises UpstreamUnavailableError: если strict, сервис недоступен и данных в кэше нет
         """
         ...
 
-
-class BookingRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_by_id(self, announce_id: str | UUID) -> list[layer_models.BookingToDetailResponse]:
+    async def get_many(self, user_ids: list[str | UUID]) -> dict[str, layer_models.UserToResponse]:
         ...
 
+
+class BookingRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_confirmed_list(self, announce_id: str | UUID) -> list[layer_models.BookingToDetailResponse]:
+    async def get_by_id(
+        self,
+        announce_id: str | UUID,
+        users: DataLoader | None = None,
+        ratings: DataLoader | None = None,
+    ) -> list[layer_models.BookingToDetailResponse]:
         ...
 
     @abstractmethod
@@ -80,13 +106,65 @@ class BookingRepositoryProtocol(ABC):
 
 class RatingRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse:
+    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse | None:
+        ...
+
+    @abstractmethod
+    async def get_many(self, user_ids: list[str | UUID]) -> dict[str, layer_models.RatingToResponse]:
         ...
 
 
 class MovieRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_by_id(self, movie_id: str | UUID) -> layer_models.MovieToResponse:
+    async def get_by_id(self, movie_id: str | UUID, strict: bool = False) -> layer_models.MovieToResponse | None:
+        """
+        :return: None - если объект не найден (или, без strict, сервис недоступен и данных в кэше нет)
+        :raises UpstreamUnavailableError: если strict, сервис недоступен и данных в кэше нет
+        """
+        ...
+
+    @abstractmethod
+    async def get_many(self, movie_ids: list[str | UUID]) -> dict[str, layer_models.MovieToResponse]:
+        ...
+
+
+class GeoRepositoryProtocol(ABC):
+    @abstractmethod
+    async def geocode(self, location: str) -> layer_models.Coordinates | None:
+        ...
+
+
+class FeedRepositoryProtocol(ABC):
+    @abstractmethod
+    async def push(self, subscribers: list[str | UUID], announce_id: str | UUID, event_time: datetime) -> None:
+        ...
+
+    @abstractmethod
+    async def remove(self, subscribers: list[str | UUID], announce_id: str | UUID) -> None:
+        ...
+
+    @abstractmethod
+    async def is_built(self, user_id: str | UUID, subs: list[str | UUID]) -> bool:
+        """
+        :return: True, если лента собрана по тем же подпискам
+        """
+        ...
+
+    @abstractmethod
+    async def rebuild(
+        self,
+        user_id: str | UUID,
+        subs: list[str | UUID],
+        load: Callable[[], Awaitable[list[tuple[str | UUID, datetime]]]],
+    ) -> None:
+        ...
+
+    @abstractmethod
+    async def page(self, user_id: str | UUID, size: int, cursor: str | None) -> tuple[list[str], str | None]:
+        """
+        :return: id объявлений страницы и курсор следующей
+        :raises InvalidCursorError
+        """
         ...
 
 
@@ -94,3 +172,7 @@ class NotificRepositoryProtocol(ABC):
     @abstractmethod
     async def send(self, event_type: layer_payload.EventType, payload: layer_payload.context) -> None:
         ...
+
+    @abstractmethod
+    async def send_many(self, event_type: layer_payload.EventType, payloads: list[layer_payload.context]) -> None:
+        ...
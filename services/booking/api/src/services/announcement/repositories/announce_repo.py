@@ -1,26 +1,35 @@
-from functools import lru_cache
+from datetime import datetime
 from typing import Any
 from uuid import UUID, uuid4
 
 import sqlalchemy.exc as sqlalch_exc
 from fastapi import Depends
-from sqlalchemy import insert, select, update
+from sqlalchemy import Float, cast, delete, func, insert, literal_column, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql import ColumnElement, Select
 
 import utils.exceptions as exc
 from core.config import settings
 from core.logger import get_logger
-from db.models.announcement import Announcement
-from db.pg_db import AsyncSession, get_session
+from db.models.announcement import SEARCH_CONFIG, Announcement, AnnouncementListing
 from db.redis import CacheProtocol, get_cache
+from db.uow import UnitOfWork, get_uow
 from services.announcement import layer_models, layer_payload
 from services.announcement.repositories import _protocols
+from utils.pagination import decode_cursor, encode_cursor
 
 logger = get_logger(__name__)
 
+# поисковый вектор не нужен ни одному ответу, RETURNING его не читает
+RETURNING = [column for column in Announcement.__table__.c if column.computed is None]
+LISTING_FIELDS = ('movie_title', 'author_name', 'author_rating')
+LISTING = [getattr(AnnouncementListing, field) for field in LISTING_FIELDS]
+
 
 class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
-    def __init__(self, db_session: AsyncSession, cache: CacheProtocol) -> None:
-        self.db = db_session
+    def __init__(self, uow: UnitOfWork, cache: CacheProtocol) -> None:
+        self.uow = uow
+        self.db = uow.session
         self.redis = cache
         logger.info('AnnounceSqlachemyRepository init ...')
 
@@ -39,11 +48,11 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
         :raises NotFoundError: если указаная запись не была найдена в базе
         """
         try:
-            data = await self.db.get(Announcement, announce_id)
+            data = await self.uow.get(Announcement, announce_id)
             if data is None:
                 logger.info(f'[-] Not found <{announce_id}>')
                 raise exc.NotFoundError
-            return data
+            return layer_models.PGAnnouncement(**{**data, 'status': data['status'].value})
         except exc.NotFoundError:
             raise
 
@@ -52,6 +61,7 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
         new_announce: layer_payload.PGCreatePayload,
         movie: layer_models.MovieToResponse,
         author_id: str | UUID,
+        coordinates: layer_models.Coordinates | None = None,
     ) -> str | UUID:
         """
         Создание новой записи в БД.
@@ -59,6 +69,7 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
         :param author_id: id автора
         :param movie: информация о фильме
         :param new_announce: данные для создания объявления
+        :param coordinates: координаты места проведения, если адрес удалось геокодировать
         :return announce_id: id объявления
         :raises UniqueConstraintError: если запист уже существует в базе
         """
@@ -69,11 +80,12 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
             author_id=author_id,
             duration=movie.duration,
             **new_announce.dict(),
+            **(coordinates.dict() if coordinates else {}),
         ).dict()
-        query = insert(Announcement).values(**values)
+        query = insert(Announcement.__table__).values(**values).returning(*RETURNING)
         try:
-            await self.db.execute(query)
-            await self.db.commit()
+            _res = await self.db.execute(query)
+            self.uow.remember(Announcement, _res.one()._mapping)
             logger.info(f'Create announcement <{_id}>')
 
             return _id
@@ -81,66 +93,217 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
             logger.info(f'UniqueConstraintError announcement <{_id}>')
             raise exc.UniqueConstraintError from ex
 
-    async def get_multy(
-        self,
-        query: layer_payload.APIMultyPayload,
-        user: layer_models.UserToResponse,
-    ) -> list[layer_models.AnnouncementResponse | None]:
+    async def get_many(self, announce_ids: list[str | UUID]) -> list[layer_models.AnnouncementResponse]:
         """
-        Получение объявлений по условию.
+        Получение объявлений по списку id в порядке (event_time, id).
 
-        :param user: информация о пользователе
-        :param query: данные для фильтрации запроса к БД
+        :param announce_ids: id объявлений, отсутствующие и неактуальные пропускаются
         :return: список объявлений
         """
-        _query = select(Announcement)
+        if not announce_ids:
+            return []
+        query = self._listing_select().where(Announcement.id.in_(announce_ids))
+        if not settings.debug.DEBUG:
+            query = query.where(Announcement.status == layer_models.EventStatus.Alive.value)
+        _res = await self.db.execute(query.order_by(Announcement.event_time, Announcement.id))
+        return [self._to_response(data, *listing) for data, *listing in _res.all()]
+
+    async def get_feed_items(self, author_ids: list[str | UUID]) -> list[tuple[str | UUID, datetime]]:
+        """
+        Будущие объявления авторов для сборки ленты подписчика.
 
+        :param author_ids: id авторов, на которых подписан пользователь
+        :return: пары (id, event_time) объявлений в статусах layer_models.FEED_STATUSES
+        """
+        if not author_ids:
+            return []
+        query = select(Announcement.id, Announcement.event_time).where(
+            Announcement.author_id.in_(author_ids),
+            Announcement.event_time >= func.now(),
+        )
         if not settings.debug.DEBUG:
-            _query = _query.filter(Announcement.status == layer_models.EventStatus.Alive.value)
+            query = query.where(Announcement.status.in_(layer_models.FEED_STATUSES))
+        _res = await self.db.execute(query)
+        return [(row.id, row.event_time) for row in _res.all()]
+
+    @staticmethod
+    def _listing_select(*columns: ColumnElement) -> Select:
+        """Служебный метод. Объявления вместе с проекцией для списков, одним запросом по первичному ключу."""
+        return select(Announcement, *columns, *LISTING).outerjoin(
+            AnnouncementListing,
+            AnnouncementListing.id == Announcement.id,
+        )
+
+    @staticmethod
+    def _to_response(
+        data: Announcement,
+        movie_title: str | None,
+        author_name: str | None,
+        author_rating: float | None,
+    ) -> layer_models.AnnouncementResponse:
+        return layer_models.AnnouncementResponse(
+            **data._asdict(),
+            tickets_left=max(data.tickets_count - data.seats_confirmed, 0),
+            movie_title=movie_title,
+            author_name=author_name,
+            author_rating=author_rating,
+        )
+
+    async def save_listing(self, items: list[layer_models.ListingProjection]) -> None:
+        """
+        Записать проекцию для списков объявлений.
+
+        :param items: данные проекции, поле None оставляет записанное ранее значение
+        """
+        if not items:
+            return
+        table = AnnouncementListing.__table__
+        query = pg_insert(table)
+        query = query.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={
+                **{column: func.coalesce(query.excluded[column], table.c[column]) for column in LISTING_FIELDS},
+                'modified': func.now(),
+            },
+        )
+        await self.db.execute(query, [item.dict() for item in items])
+        logger.info(f'Save announcement listing <{len(items)}>')
+
+    def _multy_query(self, query: layer_payload.APIMultyPayload, user: layer_models.UserToResponse | None) -> Select:
+        """
+        Служебный метод. Запрос страницы объявлений: (объявление, ключ сортировки, *проекция для списков).
+
+        С filter[q] - полнотекстовый поиск, самые релевантные первыми, иначе - ближайшие события первыми.
+        """
+        if query.q:
+            ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), query.q)
+            rank = cast(func.ts_rank_cd(Announcement.search_vector, ts_query), Float)
+            _query = self._listing_select(rank.label('sort_key')).where(Announcement.search_vector.op('@@')(ts_query))
+        else:
+            _query = self._listing_select(Announcement.event_time.label('sort_key'))
+
+        if not settings.debug.DEBUG:
+            _query = _query.where(Announcement.status == layer_models.EventStatus.Alive.value)
 
         if query.sub:
-            _sub = user.subs
-            _query = _query.where(Announcement.author_id.in_(_sub))
+            _query = _query.where(Announcement.author_id.in_(user.subs))
         if query.author:
-            _query = _query.filter(Announcement.author_id == query.author)
+            _query = _query.where(Announcement.author_id == query.author)
         if query.movie:
-            _query = _query.filter(Announcement.movie_id == query.movie)
-        if query.free:
-            _query = _query.filter(Announcement.is_free is query.free)
+            _query = _query.where(Announcement.movie_id == query.movie)
+        if query.free is not None:
+            _query = _query.where(Announcement.is_free == query.free)
         if query.ticket:
-            _query = _query.filter(Announcement.tickets_count == query.ticket)
+            _query = _query.where(Announcement.tickets_count == query.ticket)
         if query.date:
-            _query = _query.filter(Announcement.event_time == query.date)
+            _query = _query.where(Announcement.event_time == query.date)
+        if query.date_from:
+            _query = _query.where(Announcement.event_time >= query.date_from)
+        if query.date_to:
+            _query = _query.where(Announcement.event_time < query.date_to)
         if query.location:
-            _query = _query.filter(Announcement.event_location == query.location)
+            _query = _query.where(Announcement.event_location == query.location)
+        if query.lat is not None and query.lon is not None:
+            # earth_box отбирает кандидатов по GiST-индексу, earth_distance отсекает углы куба
+            center = func.ll_to_earth(query.lat, query.lon)
+            point = func.ll_to_earth(Announcement.lat, Announcement.lon)
+            radius = query.radius_km * 1000
+            _query = _query.where(
+                func.earth_box(center, radius).op('@>')(point),
+                func.earth_distance(center, point) <= radius,
+            )
+
+        if query.q:
+            return self._rank_keyset(_query, rank, query.cursor)
+        return self._keyset(_query, query.cursor)
+
+    @staticmethod
+    def _keyset(_query: Select, cursor: str | None) -> Select:
+        """
+        Служебный метод. Сортировка по (event_time, id) и начало выборки после курсора.
 
-        _res = await self.db.execute(_query)
-        scalar_result = [data._asdict() for data in _res.scalars().all()]
+        :param _query: запрос с фильтрами
+        :param cursor: курсор последней записи предыдущей страницы
+        :return: запрос
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        if cursor:
+            event_time, announce_id = decode_cursor(cursor, datetime, UUID)
+            _query = _query.where(tuple_(Announcement.event_time, Announcement.id) > tuple_(event_time, announce_id))
+        return _query.order_by(Announcement.event_time, Announcement.id)
+
+    @staticmethod
+    def _rank_keyset(_query: Select, rank: ColumnElement, cursor: str | None) -> Select:
+        """
+        Служебный метод. Сортировка по (релевантность, id) по убыванию и начало выборки после курсора.
 
-        if len(scalar_result) == 0:
+        :param _query: запрос с фильтрами
+        :param rank: выражение релевантности
+        :param cursor: курсор последней записи предыдущей страницы
+        :return: запрос
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        if cursor:
+            last_rank, announce_id = decode_cursor(cursor, float, UUID)
+            _query = _query.where(tuple_(rank, Announcement.id) < tuple_(last_rank, announce_id))
+        return _query.order_by(rank.desc(), Announcement.id.desc())
+
+    async def get_multy(
+        self,
+        query: layer_payload.APIMultyPayload,
+        user: layer_models.UserToResponse | None,
+    ) -> layer_models.AnnouncementPage:
+        """
+        Получение одной страницы объявлений по условию, ближайшие события первыми.
+
+        :param user: информация о пользователе, нужна только для фильтра по подпискам
+        :param query: данные для фильтрации запроса к БД
+        :return: страница объявлений и курсор следующей страницы
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        _res = await self.db.execute(self._multy_query(query, user).limit(query.size + 1))
+        rows = _res.all()
+
+        next_cursor = None
+        if len(rows) > query.size:
+            rows = rows[: query.size]
+            last, sort_key, *_ = rows[-1]
+            next_cursor = encode_cursor(sort_key, last.id)
+        if len(rows) == 0:
             logger.info(f'[-] Not found <{query}>')
-            return []
-        return [layer_models.AnnouncementResponse(**data) for data in scalar_result]
+        return layer_models.AnnouncementPage(
+            items=[self._to_response(data, *listing) for data, _, *listing in rows],
+            next_cursor=next_cursor,
+        )
 
     async def update(
         self,
         announce_id: str | UUID,
         update_announce: layer_payload.APIUpdatePayload,
+        coordinates: layer_models.Coordinates | None = None,
     ) -> None:
         """
         Изменить данные в объявлении.
 
         :param announce_id: id объявления
         :param update_announce: данные для изменения объявления
+        :param coordinates: координаты нового места проведения, при смене адреса без них координаты сбрасываются
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises UniqueConstraintError: если запист уже существует в базе
         """
+        values = update_announce.dict(exclude_none=True)
+        if update_announce.event_location is not None:
+            values.update(coordinates.dict() if coordinates else {'lat': None, 'lon': None})
         query = (
-            update(Announcement).where(Announcement.id == announce_id).values(update_announce.dict(exclude_none=True))
+            update(Announcement.__table__).where(Announcement.id == announce_id).values(values).returning(*RETURNING)
         )
         try:
-            await self.db.execute(query)
-            await self.db.commit()
+            _res = await self.db.execute(query)
+            row = _res.one_or_none()
+            if row is None:
+                logger.info(f'[-] Not found <{announce_id}>')
+                raise exc.NotFoundError
+            self.uow.remember(Announcement, row._mapping)
             logger.info(f'Update announcement <{announce_id}>')
         except sqlalch_exc.IntegrityError as ex:
             logger.info(f'UniqueConstraintError announcement <{announce_id}>')
@@ -153,15 +316,16 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
         :param announce_id: id объявления
         :raises NotFoundError: если указаная запись не была найдена в базе
         """
-        _data: Announcement = await self.db.get(Announcement, announce_id)
-        await self.db.delete(_data)
-        await self.db.commit()
+        _res = await self.db.execute(delete(Announcement).where(Announcement.id == announce_id))
+        if _res.rowcount == 0:
+            logger.info(f'[-] Not found <{announce_id}>')
+            raise exc.NotFoundError
+        self.uow.forget(Announcement, announce_id)
         logger.info(f'Delete announcement <{announce_id}>')
 
 
-@lru_cache()
 def get_announcement_repo(
-    db_session: AsyncSession = Depends(get_session),
+    uow: UnitOfWork = Depends(get_uow),
 ) -> _protocols.AnnouncementRepositoryProtocol:
     cache: CacheProtocol = get_cache()
-    return AnnounceSqlachemyRepository(db_session, cache)
+    return AnnounceSqlachemyRepository(uow, cache)
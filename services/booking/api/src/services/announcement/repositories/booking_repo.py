@@ -1,4 +1,4 @@
-from functools import lru_cache
+import asyncio
 from typing import Any
 from uuid import UUID
 
@@ -7,10 +7,11 @@ from sqlalchemy import select
 
 from core.logger import get_logger
 from db.models.booking import Booking
-from db.pg_db import AsyncSession, get_session
 from db.redis import CacheProtocol, get_cache
+from db.uow import UnitOfWork, get_uow
 from services.announcement import layer_models
 from services.announcement.repositories import _protocols, rating_repo, user_repo
+from utils.dataloader import DataLoader
 
 logger = get_logger(__name__)
 
@@ -36,15 +37,21 @@ class BookingMockRepository(_protocols.BookingRepositoryProtocol):
             author_status=True,
         )
 
-    async def get_by_id(self, announce_id: str | UUID) -> list[layer_models.BookingToDetailResponse]:
+    async def get_by_id(
+        self,
+        announce_id: str | UUID,
+        users: DataLoader | None = None,
+        ratings: DataLoader | None = None,
+    ) -> list[layer_models.BookingToDetailResponse]:
         return [await self._fake_boking() for _ in range(5)]
 
 
 class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
-    def __init__(self, db_session: AsyncSession, cache: CacheProtocol) -> None:
+    def __init__(self, uow: UnitOfWork, cache: CacheProtocol) -> None:
         self.user_repo = user_repo.get_user_repo()
         self.rating_repo = rating_repo.get_rating_repo()
-        self.db = db_session
+        self.uow = uow
+        self.db = uow.session
         self.redis = cache
         logger.info('BookingSqlachemyRepository init ...')
         ...
@@ -55,72 +62,87 @@ class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
     async def _set_to_cache(self, key: str, data: Any) -> None:
         await self.redis.set(key, data)
 
-    async def _get_booking_resp(self, data: dict) -> layer_models.BookingToDetailResponse:
+    async def _get_booking_resp(
+        self,
+        data: dict,
+        users: DataLoader,
+        ratings: DataLoader,
+    ) -> layer_models.BookingToDetailResponse:
         """
         Служебный метод. Возвращает данные для layer_models.DetailBookingResponse.
 
         :param data: layer_models.PGBookin.dict()
-        :param user: информация о пользователе
+        :param users: загрузчик пользователей, общий для всей выборки
+        :param ratings: загрузчик рейтингов, общий для всей выборки
         :return: данные для layer_models.DetailBookingResponse
         """
 
         _booking = layer_models.PGBooking(**data)
 
-        _guest = await self.user_repo.get_by_id(_booking.guest_id)
+        _guest, _guest_rating = await asyncio.gather(
+            users.load(_booking.guest_id),
+            ratings.load(_booking.guest_id),
+        )
         logger.info(f'Get user <{_booking.guest_id}>: <{_guest}>')
 
-        _guest_rating = await self.rating_repo.get_by_id(_booking.guest_id)
-
         return layer_models.BookingToDetailResponse(
             booking_id=_booking.id,
             guest_id=_booking.guest_id,
-            guest_name=_guest.user_name,
-            guest_rating=_guest_rating.user_rating,
+            guest_name=_guest.user_name if _guest else None,
+            guest_rating=_guest_rating.user_rating if _guest_rating else None,
             guest_status=_booking.guest_status,
             author_status=_booking.author_status,
         )
 
-    async def get_by_id(self, announce_id: str | UUID) -> list[layer_models.BookingToDetailResponse]:
+    async def _get_booking_resp_list(
+        self,
+        scalar_result: list[dict],
+        users: DataLoader | None = None,
+        ratings: DataLoader | None = None,
+    ) -> list[layer_models.BookingToDetailResponse]:
         """
-        Возвращает данные для layer_models.DetailBookingResponse.
+        Служебный метод. Подготавливает список гостей, пользователи и рейтинги запрашиваются пачками.
 
-        :param announce_id: lid объявления
+        :param scalar_result: список layer_models.PGBooking.dict()
+        :param users: загрузчик пользователей вызывающей стороны, по умолчанию создается новый
+        :param ratings: загрузчик рейтингов вызывающей стороны, по умолчанию создается новый
         :return: список данных для layer_models.DetailBookingResponse
         """
-        _query = select(Booking).filter(Booking.announcement_id == announce_id)
-        _res = await self.db.execute(_query)
-        scalar_result = [data._asdict() for data in _res.scalars().all()]
-
-        if len(scalar_result) == 0:
-            return []
-        return [await self._get_booking_resp(data) for data in scalar_result]
+        users = users or DataLoader(self.user_repo.get_many)
+        ratings = ratings or DataLoader(self.rating_repo.get_many)
+        return list(
+            await asyncio.gather(*(self._get_booking_resp(data, users, ratings) for data in scalar_result)),
+        )
 
-    async def get_confirmed_list(self, announce_id: str | UUID) -> list[layer_models.BookingToDetailResponse]:
-        """Получение подтвержденных заявок.
+    async def get_by_id(
+        self,
+        announce_id: str | UUID,
+        users: DataLoader | None = None,
+        ratings: DataLoader | None = None,
+    ) -> list[layer_models.BookingToDetailResponse]:
+        """
+        Возвращает данные для layer_models.DetailBookingResponse.
 
-        :param announce_id: id объявления
-        :return список подтвержденных заявок
+        :param announce_id: lid объявления
+        :param users: общий загрузчик пользователей
+        :param ratings: общий загрузчик рейтингов
+        :return: список данных для layer_models.DetailBookingResponse
         """
-        _query = (
-            select(Booking)
-            .where(Booking.announcement_id == announce_id)
-            .filter(Booking.author_status, Booking.guest_status)
-        )
+        _query = select(Booking).filter(Booking.announcement_id == announce_id)
         _res = await self.db.execute(_query)
         scalar_result = [data._asdict() for data in _res.scalars().all()]
 
         if len(scalar_result) == 0:
             return []
-        return [await self._get_booking_resp(data) for data in scalar_result]
+        return await self._get_booking_resp_list(scalar_result, users, ratings)
 
     async def get_guest_id(self, booking_id: str | UUID) -> str | UUID:
-        data: layer_models.PGBooking = await self.db.get(Booking, booking_id)
-        return data.guest_id
+        data = await self.uow.get(Booking, booking_id)
+        return data.get('guest_id')
 
 
-@lru_cache()
 def get_booking_repo(
-    db_session: AsyncSession = Depends(get_session),
+    uow: UnitOfWork = Depends(get_uow),
 ) -> _protocols.BookingRepositoryProtocol:
     cache: CacheProtocol = get_cache()
-    return BookingSqlachemyRepository(db_session, cache)
+    return BookingSqlachemyRepository(uow, cache)
@@ -0,0 +1,130 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from redis import asyncio as aioredis
+
+from core.config import settings
+from core.container import container
+from core.logger import get_logger
+from db.redis import get_redis
+from services.announcement.repositories import _protocols
+from utils.pagination import decode_cursor, encode_cursor
+
+logger = get_logger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _score(event_time: datetime) -> int:
+    # микросекунды от эпохи точно представимы в double, поэтому курсор не теряет точность
+    return (event_time - EPOCH) // timedelta(microseconds=1)
+
+
+class FeedRedisRepository(_protocols.FeedRepositoryProtocol):
+    """
+    Лента подписчика: sorted set feed:{user_id}, элементы - id объявлений, score - event_time.
+
+    Заполняется при записи (объявление стало Alive или Closed), поэтому чтение ленты - диапазон по score
+    без списка подписок в запросе к БД. Порядок и курсор совпадают с обычной выдачей
+    (event_time, id), event_time объявлений уникален.
+
+    Рядом хранится feed_subs:{user_id} - отпечаток списка подписок, по которому лента собрана из БД.
+    Пока отпечатка нет или подписки изменились, ленту нужно пересобрать (rebuild), иначе в ней
+    не будет объявлений, опубликованных до первой записи в ленту или до подписки на автора.
+    """
+
+    def __init__(self, redis: aioredis.Redis) -> None:
+        self.redis = redis
+
+        logger.info('FeedRedisRepository init ...')
+
+    @staticmethod
+    def _key(user_id: str | UUID) -> str:
+        return f'feed:{user_id}'
+
+    @staticmethod
+    def _subs_key(user_id: str | UUID) -> str:
+        return f'feed_subs:{user_id}'
+
+    @staticmethod
+    def _digest(subs: list[str | UUID]) -> str:
+        return hashlib.sha256(','.join(sorted(str(sub) for sub in subs)).encode()).hexdigest()
+
+    async def is_built(self, user_id: str | UUID, subs: list[str | UUID]) -> bool:
+        digest = await self.redis.get(self._subs_key(user_id))
+        return digest is not None and digest.decode() == self._digest(subs)
+
+    async def rebuild(
+        self,
+        user_id: str | UUID,
+        subs: list[str | UUID],
+        load: Callable[[], Awaitable[list[tuple[str | UUID, datetime]]]],
+    ) -> None:
+        """
+        Собрать ленту из БД.
+
+        Лента очищается до чтения из БД: объявления, добавленные push во время сборки, остаются в ленте,
+        а все зафиксированные до чтения - попадают в выборку.
+
+        :param user_id: id подписчика
+        :param subs: подписки, по которым собирается лента
+        :param load: выборка (id, event_time) актуальных объявлений авторов из subs
+        """
+        key, subs_key = self._key(user_id), self._subs_key(user_id)
+        await self.redis.delete(key, subs_key)
+        items = await load()
+        expired = _score(datetime.now(timezone.utc))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if items:
+                pipe.zadd(key, {str(announce_id): _score(event_time) for announce_id, event_time in items})
+                pipe.zremrangebyscore(key, '-inf', f'({expired}')
+                pipe.expire(key, settings.feed.TTL_SEC)
+            pipe.set(subs_key, self._digest(subs), ex=settings.feed.TTL_SEC)
+            await pipe.execute()
+        logger.info(f'Rebuild feed <{user_id}>: <{len(items)}> announcements of <{len(subs)}> authors')
+
+    async def push(self, subscribers: list[str | UUID], announce_id: str | UUID, event_time: datetime) -> None:
+        if not subscribers:
+            return
+        expired = _score(datetime.now(timezone.utc))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in subscribers:
+                key = self._key(user_id)
+                pipe.zadd(key, {str(announce_id): _score(event_time)})
+                pipe.zremrangebyscore(key, '-inf', f'({expired}')
+                pipe.expire(key, settings.feed.TTL_SEC)
+            await pipe.execute()
+        logger.info(f'Push announcement <{announce_id}> to <{len(subscribers)}> feeds')
+
+    async def remove(self, subscribers: list[str | UUID], announce_id: str | UUID) -> None:
+        if not subscribers:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in subscribers:
+                pipe.zrem(self._key(user_id), str(announce_id))
+            await pipe.execute()
+        logger.info(f'Remove announcement <{announce_id}> from <{len(subscribers)}> feeds')
+
+    async def page(self, user_id: str | UUID, size: int, cursor: str | None) -> tuple[list[str], str | None]:
+        """
+        :raises InvalidCursorError
+        """
+        start = '-inf'
+        if cursor:
+            event_time, _ = decode_cursor(cursor, datetime, UUID)
+            start = f'({_score(event_time)}'
+        rows = await self.redis.zrangebyscore(self._key(user_id), start, '+inf', start=0, num=size + 1, withscores=True)
+
+        next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            member, score = rows[-1]
+            next_cursor = encode_cursor(EPOCH + timedelta(microseconds=int(score)), member.decode())
+        return [member.decode() for member, _ in rows], next_cursor
+
+
+@container.singleton
+def get_feed_repo() -> _protocols.FeedRepositoryProtocol:
+    return FeedRedisRepository(get_redis())
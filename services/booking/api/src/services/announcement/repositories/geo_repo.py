@@ -0,0 +1,58 @@
+import re
+
+from core.container import container
+from core.logger import get_logger
+from services.announcement import layer_models
+from services.announcement.repositories import _protocols
+
+logger = get_logger(__name__)
+
+# "55.7558, 37.6173" в любом месте строки, дробная часть обязательна, чтобы не путать с номером дома
+_COORDINATES = re.compile(r'(-?\d{1,2}\.\d+)\s*[,;]\s*(-?\d{1,3}\.\d+)')
+
+# Справочник городов локального геокодера: (широта, долгота) центра
+_PLACES: dict[str, tuple[float, float]] = {
+    'москва': (55.7558, 37.6173),
+    'moscow': (55.7558, 37.6173),
+    'санкт-петербург': (59.9343, 30.3351),
+    'петербург': (59.9343, 30.3351),
+    'saint petersburg': (59.9343, 30.3351),
+    'новосибирск': (55.0084, 82.9357),
+    'екатеринбург': (56.8389, 60.6057),
+    'казань': (55.7887, 49.1221),
+    'нижний новгород': (56.2965, 43.9361),
+    'самара': (53.1959, 50.1002),
+    'ростов-на-дону': (47.2357, 39.7015),
+    'краснодар': (45.0355, 38.9753),
+    'сочи': (43.5855, 39.7231),
+}
+
+
+class GeoLocalRepository(_protocols.GeoRepositoryProtocol):
+    """
+    Локальная замена внешнего геокодера.
+
+    Понимает координаты, записанные в адресе ("55.75, 37.61"), и города из справочника.
+    Для подключения настоящего геокодера достаточно реализовать GeoRepositoryProtocol
+    и вернуть его из get_geo_repo.
+    """
+
+    def __init__(self) -> None:
+        logger.info('GeoLocalRepository init ...')
+
+    async def geocode(self, location: str) -> layer_models.Coordinates | None:
+        if match := _COORDINATES.search(location):
+            lat, lon = float(match.group(1)), float(match.group(2))
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                return layer_models.Coordinates(lat=lat, lon=lon)
+        _location = location.lower()
+        for place, (lat, lon) in _PLACES.items():
+            if place in _location:
+                return layer_models.Coordinates(lat=lat, lon=lon)
+        logger.info(f'[-] Not geocoded <{location}>')
+        return None
+
+
+@container.singleton
+def get_geo_repo() -> _protocols.GeoRepositoryProtocol:
+    return GeoLocalRepository()
@@ -1,81 +1,87 @@
+import asyncio
 import random
-from functools import lru_cache
-from typing import Any
 from uuid import UUID
 
-import aiohttp
-from aiohttp.client_exceptions import ClientError
-
 from core.config import settings
+from core.container import container
 from core.logger import get_logger
-from db.redis import CacheProtocol, get_cache
+from db.redis import get_cache, get_tiered_cache
 from services.announcement.repositories import _protocols
 from services.booking import layer_models
-from utils.auth import _headers
+from utils.http_client import HttpClient, get_http_client
+from utils.single_flight import SingleFlight
+from utils.swr import StaleWhileRevalidate
 
 logger = get_logger(__name__)
 
 
 class RatingMockRepository(_protocols.RatingRepositoryProtocol):
-    def __init__(self, cache: CacheProtocol) -> None:
-        self.redis = cache
+    def __init__(self, cache: StaleWhileRevalidate) -> None:
+        self.cache = cache
         logger.info('RatingMockRepository init ...')
 
-    async def _get_from_cache(self, key: str) -> Any:
-        return await self.redis.get(key)
+    async def _fetch(self, user_id: str) -> dict:
+        return layer_models.RatingToResponse(
+            user_rating=round(random.uniform(0.0, 10.0), 1),
+        ).dict()
 
-    async def _set_to_cache(self, key: str, data: Any) -> None:
-        await self.redis.set(key, data)
+    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse | None:
+        return await _get_by_id(self, user_id)
 
-    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse:
-        if _cache := await self._get_from_cache(f'rating:{user_id}'):
-            logger.info('RatingToResponse from cache')
-            return layer_models.RatingToResponse(**_cache)
-        data = layer_models.RatingToResponse(
-            user_rating=round(random.uniform(0.0, 10.0), 1),
-        )
-        await self._set_to_cache(f'rating:{user_id}', data.dict())
-        logger.info('RatingToResponse set to cache')
-        return data
+    async def get_many(self, user_ids: list[str | UUID]) -> dict[str, layer_models.RatingToResponse]:
+        return await _get_many(self, user_ids)
 
 
 class RatingAPIRepository(_protocols.RatingRepositoryProtocol):
-    def __init__(self, cache: CacheProtocol) -> None:
-        self.redis = cache
+    def __init__(self, cache: StaleWhileRevalidate, http: HttpClient) -> None:
+        self.cache = cache
         self.rating_endpoint = settings.rating.uri  # TODO
-        self._headers = _headers()
+        self.http = http
         logger.info('RatingMockRepository init ...')
 
-    async def _get_from_cache(self, key: str) -> Any:
-        return await self.redis.get(key)
-
-    async def _set_to_cache(self, key: str, data: Any) -> None:
-        await self.redis.set(key, data)
-
-    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse:
-        if _cache := await self._get_from_cache(f'rating:{user_id}'):
-            logger.info('RatingToResponse from cache')
-            return layer_models.RatingToResponse(**_cache)
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f'{self.rating_endpoint}{user_id}',
-                    headers=self._headers,
-                ) as resp:
-                    _rating = await resp.json()
-                    logger.debug(f'Get rating <{user_id}>: <{_rating}>')
-
-        except ClientError as ex:
-            logger.debug(f'Except <{ex}>')
-            return None
-        data = layer_models.RatingToResponse(user_rating=_rating['score_average'])
-        await self._set_to_cache(f'rating:{user_id}', data.dict())
-        logger.info('RatingToResponse set to cache')
-        return data
-
-
-@lru_cache()
+    async def _fetch(self, user_id: str) -> dict:
+        _rating = await self.http.post(f'{self.rating_endpoint}{user_id}')
+        logger.debug(f'Get rating <{user_id}>: <{_rating}>')
+        return layer_models.RatingToResponse(user_rating=_rating['score_average']).dict()
+
+    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse | None:
+        return await _get_by_id(self, user_id)
+
+    async def get_many(self, user_ids: list[str | UUID]) -> dict[str, layer_models.RatingToResponse]:
+        return await _get_many(self, user_ids)
+
+
+async def _get_by_id(
+    repo: RatingMockRepository | RatingAPIRepository,
+    user_id: str | UUID,
+) -> layer_models.RatingToResponse | None:
+    data = await repo.cache.get(str(user_id), repo._fetch)
+    return layer_models.RatingToResponse(**data) if data else None
+
+
+async def _get_many(
+    repo: RatingMockRepository | RatingAPIRepository,
+    user_ids: list[str | UUID],
+) -> dict[str, layer_models.RatingToResponse]:
+    """
+    Получение рейтингов пачкой: один MGET в Redis и запросы к сервису только для промахов.
+
+    :param repo: репозиторий рейтингов
+    :param user_ids: список id пользователей
+    :return: словарь id -> рейтинг, ненайденные рейтинги отсутствуют
+    """
+
+    async def _fetch_many(misses: list[str]) -> dict[str, dict]:
+        # у сервиса рейтингов нет пакетного запроса
+        fetched = await asyncio.gather(*(repo._fetch(user_id) for user_id in misses))
+        return dict(zip(misses, fetched))
+
+    data = await repo.cache.get_many([str(user_id) for user_id in user_ids], _fetch_many)
+    return {user_id: layer_models.RatingToResponse(**value) for user_id, value in data.items()}
+
+
+@container.singleton
 def get_rating_repo() -> _protocols.RatingRepositoryProtocol:
-    cache: CacheProtocol = get_cache()
+    cache = StaleWhileRevalidate(get_tiered_cache(), SingleFlight(get_cache(), 'rating'), 'rating')
     return RatingMockRepository(cache)
-    return RatingAPIRepository(cache)
+    return RatingAPIRepository(cache, get_http_client())
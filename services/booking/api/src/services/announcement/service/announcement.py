@@ -1,8 +1,9 @@
+import asyncio
 from datetime import datetime
-from functools import lru_cache
 from typing import Any
 from uuid import UUID
 
+import orjson
 import pytz
 from fastapi import Depends
 
@@ -10,16 +11,22 @@ import utils.exceptions as exc
 from core.config import settings
 from core.logger import get_logger
 from db.redis import CacheProtocol, get_cache
+from db.uow import UnitOfWork, get_uow
 from services.announcement import layer_models, layer_payload
 from services.announcement.repositories import (
     _protocols,
     announce_repo,
     booking_repo,
+    feed_repo,
+    geo_repo,
     movie_repo,
     notific_repo,
     rating_repo,
     user_repo,
 )
+from utils.dataloader import DataLoader
+from utils.detail_cache import DetailCache, get_detail_cache
+from utils.enrichment import Enrichment
 
 logger = get_logger(__name__)
 utc = pytz.UTC
@@ -34,6 +41,10 @@ class AnnouncementService:
         rating_repo: _protocols.RatingRepositoryProtocol,
         booking_repo: _protocols.BookingRepositoryProtocol,
         notific_repo: _protocols.NotificRepositoryProtocol,
+        geo_repo: _protocols.GeoRepositoryProtocol,
+        feed_repo: _protocols.FeedRepositoryProtocol,
+        uow: UnitOfWork,
+        detail_cache: DetailCache,
         cache: CacheProtocol,
     ):
         self.repo = repo
@@ -42,6 +53,10 @@ class AnnouncementService:
         self.rating_repo = rating_repo
         self.booking_repo = booking_repo
         self.notific_repo = notific_repo
+        self.geo_repo = geo_repo
+        self.feed_repo = feed_repo
+        self.uow = uow
+        self.detail_cache = detail_cache
         self.redis = cache
         logger.info('AnnouncementService init ...')
 
@@ -85,31 +100,34 @@ class AnnouncementService:
         :param announce_id: id объявления
         :return: подробная информация о событии
         :raises NotFoundError: если указаная запись не была найдена в базе
+        :raises DeadlineExceededError: если не уложились в бюджет времени на обогащение
         """
         try:
             _announce: layer_models.PGAnnouncement = await self.repo.get_by_id(announce_id)
         except exc.NotFoundError:
             raise
 
-        _user = await self.user_repo.get_by_id(_announce.author_id)
-        logger.info(f'Get user <{announce_id}>: <{_user}>')
-
-        _movie = await self.movie_repo.get_by_id(_announce.movie_id)
-        logger.info(f'Get movie <{_announce.movie_id}>: <{_movie}>')
-
-        _rating = await self.rating_repo.get_by_id(_announce.author_id)
-        logger.info(f'Get author_rating <{_announce.author_id}>: <{_rating}>')
-
-        _guests = await self.booking_repo.get_by_id(announce_id=announce_id)
-        logger.info(f'Get guest_list <{announce_id}>: <{_guests}>')
-        if not _guests:
-            _guests = []
-
-        _confirmed_list = await self.booking_repo.get_confirmed_list(announce_id=announce_id)
+        # список гостей запрашивается один раз, пользователи и рейтинги автора и гостей - пачками.
+        # Запрос в БД в графе один: AsyncSession не допускает конкурентных запросов.
+        users = DataLoader(self.user_repo.get_many)
+        ratings = DataLoader(self.rating_repo.get_many)
+        enrichment = Enrichment()
+        try:
+            _user, _movie, _rating, _guests = await enrichment.gather(
+                enrichment.load(f'user:{_announce.author_id}', lambda: users.load(_announce.author_id)),
+                enrichment.load(f'movie:{_announce.movie_id}', lambda: self.movie_repo.get_by_id(_announce.movie_id)),
+                enrichment.load(f'rating:{_announce.author_id}', lambda: ratings.load(_announce.author_id)),
+                enrichment.load(
+                    f'guests:{announce_id}',
+                    lambda: self.booking_repo.get_by_id(announce_id=announce_id, users=users, ratings=ratings),
+                ),
+            )
+        except exc.DeadlineExceededError:
+            raise
+        logger.info(f'Get announcement details <{announce_id}>: <{_user}>, <{_movie}>, <{len(_guests)}> guests')
 
-        _tickets_left = _announce.tickets_count - len(_confirmed_list)
-        if _tickets_left < 0:
-            _tickets_left = 0
+        # подтвержденные места считаются в БД вместе с изменением заявок
+        _tickets_left = max(_announce.tickets_count - _announce.seats_confirmed, 0)
 
         return layer_models.DetailAnnouncementResponse(
             id=_announce.id,
@@ -124,13 +142,36 @@ class AnnouncementService:
             tickets_left=_tickets_left,
             event_time=_announce.event_time,
             event_location=_announce.event_location,
-            author_name=_user.user_name,
+            author_name=_user.user_name if _user else None,
             guest_list=_guests,
-            author_rating=_rating.user_rating,
-            movie_title=_movie.movie_title,
-            duration=_movie.duration,
+            author_rating=_rating.user_rating if _rating else None,
+            movie_title=_movie.movie_title if _movie else None,
+            duration=_movie.duration if _movie else _announce.duration,
         )
 
+    async def get_one_json(self, announce_id: str | UUID) -> bytes:
+        """
+        Полная информация Announcement в виде готового JSON-документа.
+
+        Документ берется из кэша, если записан для текущей версии объявления, иначе собирается
+        через get_one и записывается в кэш для версии, прочитанной до сборки.
+
+        :param announce_id: id объявления
+        :return: DetailAnnouncementResponse, сериализованный orjson
+        :raises NotFoundError: если указаная запись не была найдена в базе
+        :raises DeadlineExceededError: если не уложились в бюджет времени на обогащение
+        """
+        version, doc = await self.detail_cache.get(announce_id)
+        if doc is not None:
+            return doc
+        try:
+            _announce: layer_models.DetailAnnouncementResponse = await self.get_one(announce_id)
+        except (exc.NotFoundError, exc.DeadlineExceededError):
+            raise
+        doc = orjson.dumps(_announce.dict())
+        await self.detail_cache.set(announce_id, version, doc)
+        return doc
+
     async def create(
         self,
         author_id: str | UUID,
@@ -145,21 +186,51 @@ class AnnouncementService:
         :param new_announce: данные из API для создания объявления
         :return: подробная информация о событии
         :raises UniqueConstraintError: если запист уже существует в базе
+        :raises NotFoundError: если фильм или автор не найдены
+        :raises UpstreamUnavailableError: если сервис пользователей или фильмов недоступен, а в кэше нет данных
         """
         try:
-            _movie = await self.movie_repo.get_by_id(movie_id)
+            # данные других сервисов запрашиваем до транзакции, оповещения и проекция фиксируются тем же коммитом
+            _movie, _coordinates, _author, _rating = await asyncio.gather(
+                self.movie_repo.get_by_id(movie_id, strict=True),
+                self.geo_repo.geocode(new_announce.event_location),
+                self.user_repo.get_by_id(author_id, strict=True),
+                self.rating_repo.get_by_id(author_id),
+            )
             logger.info(f'Get movie <{movie_id}>: <{_movie}>')
-            _id = await self.repo.create(new_announce=new_announce, movie=_movie, author_id=author_id)
+            if _movie is None or _author is None:
+                raise exc.NotFoundError
+            subs = []
+            if new_announce.status.value == layer_payload.EventStatus.Alive.value:
+                subs = _author.subs
+            async with self.uow:
+                _id = await self.repo.create(
+                    new_announce=new_announce,
+                    movie=_movie,
+                    author_id=author_id,
+                    coordinates=_coordinates,
+                )
+                await self.repo.save_listing(
+                    [
+                        layer_models.ListingProjection(
+                            id=_id,
+                            movie_title=_movie.movie_title,
+                            author_name=_author.user_name,
+                            author_rating=_rating.user_rating if _rating else None,
+                        ),
+                    ],
+                )
+                await self.notific_repo.send_many(
+                    layer_payload.EventType.announce_new,
+                    [layer_payload.NewAnnounce(new_announce_id=_id, user_id=sub) for sub in subs],
+                )
             logger.info(f'[+] Create announcement <{_id}>')
-        except exc.UniqueConstraintError:
+        except (exc.UniqueConstraintError, exc.NotFoundError):
             raise
         announce = await self.get_one(_id)
-        # оповещаем подписчиков о новом событии
-        if announce.status.value == layer_payload.EventStatus.Alive.value:
-            _user = await self.user_repo.get_by_id(author_id)
-            for sub in _user.subs:
-                payload = layer_payload.NewAnnounce(new_announce_id=_id, user_id=sub)
-                await self.notific_repo.send(layer_payload.EventType.announce_new, payload)
+        # добавляем в ленты подписчиков
+        if announce.status.value in layer_models.FEED_STATUSES:
+            await self.feed_repo.push(_author.subs, _id, announce.event_time)
         return announce
 
     async def update(
@@ -177,6 +248,7 @@ class AnnouncementService:
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises UniqueConstraintError: если запист уже существует в базе
         :raises NoAccessError: Если у пользователя нет прав на изменение объявления
+        :raises UpstreamUnavailableError: если сервис пользователей недоступен, а в кэше нет данных
         """
         if not settings.debug.DEBUG:  # noqa: SIM102
             # Событе не может быть Alive, если event_time истек
@@ -200,33 +272,58 @@ class AnnouncementService:
         # Только автор и sudo могут вносить изменения
         if not await self._check_permissions(announce_id=announce_id, user=user):
             raise exc.NoAccessError
-        # обновляем объявление
-        try:
-            await self.repo.update(announce_id=announce_id, update_announce=payload)
-        except exc.UniqueConstraintError:
-            raise
-        # оповещаем гостей об изменениях
+        # новый адрес геокодируем до открытия транзакции
+        _coordinates = None
+        if payload.event_location is not None:
+            _coordinates = await self.geo_repo.geocode(payload.event_location)
+        # получателей оповещений собираем до транзакции: гости объявления и подписчики автора
         announce = await self.get_one(announce_id)
-        notific_list = []
-        if announce.guest_list:
-            for guest in announce.guest_list:
-                if guest.author_status is False:
-                    continue
-                guest_id = await self.booking_repo.get_by_id(guest.booking_id)
-                _payload = layer_payload.PutAnnounce(
-                    put_announce_id=announce_id,
-                    user_id=str(guest_id),
+        notific_list = {str(guest.guest_id) for guest in announce.guest_list if guest.author_status is not False}
+        _author, _rating = await asyncio.gather(
+            self.user_repo.get_by_id(_announce.author_id, strict=True),
+            self.rating_repo.get_by_id(_announce.author_id),
+        )
+        # удаленного в auth автора некому показывать в ленте и оповещать нечего
+        subs = _author.subs if _author else []
+        is_alive = payload.status.value == layer_models.EventStatus.Alive.value
+        # обновляем объявление, оповещения фиксируются тем же коммитом
+        try:
+            async with self.uow:
+                await self.repo.update(announce_id=announce_id, update_announce=payload, coordinates=_coordinates)
+                # строка после UPDATE ... RETURNING уже в identity map
+                _updated: layer_models.PGAnnouncement = await self.repo.get_by_id(announce_id)
+                # фильм у объявления не меняется, обновляем данные автора
+                await self.repo.save_listing(
+                    [
+                        layer_models.ListingProjection(
+                            id=announce_id,
+                            author_name=_author.user_name if _author else None,
+                            author_rating=_rating.user_rating if _rating else None,
+                        ),
+                    ],
+                )
+                await self.notific_repo.send_many(
+                    layer_payload.EventType.announce_put,
+                    [layer_payload.PutAnnounce(put_announce_id=announce_id, user_id=guest) for guest in notific_list],
                 )
-                await self.notific_repo.send(layer_payload.EventType.announce_put, _payload)
-                notific_list.append(guest_id)
-        # оповещаем подписчиков о новом событии
-        if payload.status.value == layer_models.EventStatus.Alive.value:
-            _user = await self.user_repo.get_by_id(user.get('user_id'))
-            for sub in _user.subs:
-                if sub in notific_list:
-                    continue
-                payload = layer_payload.NewAnnounce(new_announce_id=announce_id, user_id=sub)
-                await self.notific_repo.send(layer_payload.EventType.announce_new, payload)
+                # оповещаем подписчиков о новом событии
+                if is_alive:
+                    await self.notific_repo.send_many(
+                        layer_payload.EventType.announce_new,
+                        [
+                            layer_payload.NewAnnounce(new_announce_id=announce_id, user_id=sub)
+                            for sub in subs
+                            if str(sub) not in notific_list
+                        ],
+                    )
+        except (exc.UniqueConstraintError, exc.NotFoundError):
+            raise
+        await self.detail_cache.invalidate(announce_id)
+        # актуализируем ленты подписчиков по статусу после изменения
+        if _updated.status in layer_models.FEED_STATUSES:
+            await self.feed_repo.push(subs, announce_id, _updated.event_time)
+        else:
+            await self.feed_repo.remove(subs, announce_id)
 
     async def delete(
         self,
@@ -240,29 +337,36 @@ class AnnouncementService:
         :param user: информация о пользователе
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises NoAccessError: Если у пользователя нет прав на изменение объявления
+        :raises UpstreamUnavailableError: если сервис пользователей недоступен, а в кэше нет данных
         """
         # Проверяем, что запись есть в БД
         try:
-            await self.repo.get_by_id(announce_id)
+            _pg_announce: layer_models.PGAnnouncement = await self.repo.get_by_id(announce_id)
         except exc.NotFoundError:
             raise
         _announce: layer_models.DetailAnnouncementResponse = await self.get_one(announce_id)
         # Только автор и sudo могут вносить изменения
         if await self._check_permissions(announce_id=announce_id, user=user):
-            await self.repo.delete(announce_id=announce_id)
-            # оповещае гостей об удалении объявления
-            if _announce.guest_list:
-                for guest in _announce.guest_list:
-                    if guest.author_status is False:
-                        continue
-                    guest_id = await self.booking_repo.get_by_id(guest.booking_id)
-                    _payload = layer_payload.DeleteAnnounce(
-                        delete_announce_id=str(_announce.id),
-                        author_name=_announce.author_name,
-                        announce_title=_announce.title,
-                        user_id=str(guest_id),
-                    )
-                    await self.notific_repo.send(layer_payload.EventType.announce_delete, _payload)
+            _author = await self.user_repo.get_by_id(_pg_announce.author_id, strict=True)
+            # объявление и оповещения гостей об удалении фиксируются одним коммитом
+            async with self.uow:
+                await self.repo.delete(announce_id=announce_id)
+                await self.notific_repo.send_many(
+                    layer_payload.EventType.announce_delete,
+                    [
+                        layer_payload.DeleteAnnounce(
+                            delete_announce_id=str(_announce.id),
+                            author_name=_announce.author_name,
+                            announce_title=_announce.title,
+                            user_id=str(guest.guest_id),
+                        )
+                        for guest in _announce.guest_list
+                        if guest.author_status is not False
+                    ],
+                )
+            await self.detail_cache.invalidate(announce_id)
+            if _author is not None:
+                await self.feed_repo.remove(_author.subs, announce_id)
             return
         raise exc.NoAccessError
 
@@ -270,18 +374,67 @@ class AnnouncementService:
         self,
         query: layer_payload.APIMultyPayload,
         user_id: str | UUID,
-    ) -> list[layer_models.AnnouncementResponse]:
+    ) -> layer_models.AnnouncementPage:
         """
-        Получение списка объявлений.
+        Получение страницы объявлений.
 
         :param user_id: id пользователя
         :param query: данные для поиска
-        :return: список объявлений
+        :return: страница объявлений и курсор следующей
+        :raises InvalidCursorError: если курсор поврежден
+        :raises UpstreamUnavailableError: если сервис пользователей недоступен, а в кэше нет данных
         """
-        _user: layer_models.UserToResponse = await self.user_repo.get_by_id(user_id)
-        logger.info(f'Get user <{user_id}>: <{_user}>')
+        # подписки пользователя нужны только для фильтра filter[private]
+        _user = None
+        if query.sub:
+            _user: layer_models.UserToResponse = await self.user_repo.get_by_id(user_id, strict=True)
+            logger.info(f'Get user <{user_id}>: <{_user}>')
+            if _user is None:
+                # пользователя нет в auth - подписок нет
+                return layer_models.AnnouncementPage(items=[], next_cursor=None)
+            # лента подписок без других фильтров читается из Redis, список подписок в запрос не попадает
+            if not query.dict(exclude={'sub', 'size', 'cursor', 'radius_km'}, exclude_none=True):
+                try:
+                    return await self._feed_page(_user, query)
+                except exc.InvalidCursorError:
+                    raise
+        try:
+            return await self.repo.get_multy(query=query, user=_user)
+        except exc.InvalidCursorError:
+            raise
 
-        return await self.repo.get_multy(query=query, user=_user)
+    async def _feed_page(
+        self,
+        user: layer_models.UserToResponse,
+        query: layer_payload.APIMultyPayload,
+    ) -> layer_models.AnnouncementPage:
+        """
+        Служебный метод. Страница ленты подписок.
+
+        Лента собирается из БД при первом чтении и после изменения подписок. В ленте остаются
+        объявления в статусе Closed, в выдачу они не попадают, поэтому страница дочитывается до size.
+
+        :param user: пользователь с подписками
+        :param query: размер страницы и курсор
+        :return: страница объявлений и курсор следующей
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        if not await self.feed_repo.is_built(user.user_id, user.subs):
+            await self.feed_repo.rebuild(user.user_id, user.subs, lambda: self.repo.get_feed_items(user.subs))
+        items, next_cursor = [], query.cursor
+        while True:
+            try:
+                announce_ids, next_cursor = await self.feed_repo.page(
+                    user.user_id,
+                    query.size - len(items),
+                    next_cursor,
+                )
+            except exc.InvalidCursorError:
+                raise
+            items += await self.repo.get_many(announce_ids)
+            if len(items) >= query.size or next_cursor is None:
+                break
+        return layer_models.AnnouncementPage(items=items, next_cursor=next_cursor)
 
     async def get_to_review(
         self,
@@ -301,12 +454,11 @@ class AnnouncementService:
             guest_id=guest_id,
             announcement_id=announce_id,
             announcement_title=_announce.title,
-            author_name=_author.user_name,
-            guest_name=_guest.user_name,
+            author_name=_author.user_name if _author else None,
+            guest_name=_guest.user_name if _guest else None,
         )
 
 
-@lru_cache()
 def get_announcement_service(
     repo: _protocols.AnnouncementRepositoryProtocol = Depends(announce_repo.get_announcement_repo),
     user_repo: _protocols.UserRepositoryProtocol = Depends(user_repo.get_user_repo),
@@ -314,6 +466,22 @@ def get_announcement_service(
     rating_repo: _protocols.RatingRepositoryProtocol = Depends(rating_repo.get_rating_repo),
     booking_repo: _protocols.BookingRepositoryProtocol = Depends(booking_repo.get_booking_repo),
     notific_repo: _protocols.NotificRepositoryProtocol = Depends(notific_repo.get_notific_repo),
+    geo_repo: _protocols.GeoRepositoryProtocol = Depends(geo_repo.get_geo_repo),
+    feed_repo: _protocols.FeedRepositoryProtocol = Depends(feed_repo.get_feed_repo),
+    uow: UnitOfWork = Depends(get_uow),
+    detail_cache: DetailCache = Depends(get_detail_cache),
     cache: CacheProtocol = Depends(get_cache),
 ) -> AnnouncementService:
-    return AnnouncementService(repo, user_repo, movie_repo, rating_repo, booking_repo, notific_repo, cache)
+    return AnnouncementService(
+        repo,
+        user_repo,
+        movie_repo,
+        rating_repo,
+        booking_repo,
+        notific_repo,
+        geo_repo,
+        feed_repo,
+        uow,
+        detail_cache,
+        cache,
+    )
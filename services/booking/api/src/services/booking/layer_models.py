@@ -38,26 +38,32 @@ class AnnounceToResponse(BaseModel):
     movie_id: str | UUID
     event_time: datetime
     tickets_count: int
+    seats_confirmed: int = 0
 
 
 class BookingResponse(BaseModel):
     id: str | UUID
-    author_name: str
-    guest_name: str
+    author_name: str | None
+    guest_name: str | None
     author_status: bool | None
     guest_status: bool
 
 
+class BookingPage(BaseModel):
+    items: list[BookingResponse]
+    next_cursor: str | None
+
+
 class DetailBookingResponse(BaseModel):
     id: str | UUID
     announcement_id: str | UUID
-    movie_title: str
-    author_name: str
-    guest_name: str
+    movie_title: str | None
+    author_name: str | None
+    guest_name: str | None
     author_status: bool | None = None
     guest_status: bool = True
-    guest_rating: float
-    author_rating: float
+    guest_rating: float | None
+    author_rating: float | None
     event_time: datetime
 
 
@@ -72,3 +78,32 @@ class PGBooking(BaseModel):
     author_status: bool | None
     guest_status: bool | None
     event_time: datetime
+
+
+class UpdatedBooking(PGBooking):
+    prev_author_status: bool | None
+    prev_guest_status: bool | None
+
+    @property
+    def was_confirmed(self) -> bool:
+        return bool(self.prev_author_status and self.prev_guest_status)
+
+    @property
+    def is_confirmed(self) -> bool:
+        return bool(self.author_status and self.guest_status)
+
+    @property
+    def is_changed(self) -> bool:
+        return (self.author_status, self.guest_status) != (self.prev_author_status, self.prev_guest_status)
+
+
+class BulkStatus(str, Enum):
+    updated = 'updated'
+    unchanged = 'unchanged'
+    not_found = 'not_found'
+    forbidden = 'forbidden'
+
+
+class BulkUpdateResult(BaseModel):
+    booking_id: str | UUID
+    result: BulkStatus
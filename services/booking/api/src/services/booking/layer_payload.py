@@ -18,17 +18,26 @@ class APIUpdatePayload(BaseModel):
     my_status: bool
 
 
+class APIBulkUpdateItem(BaseModel):
+    booking_id: str | UUID
+    my_status: bool
+
+
 class SudoAPIMultyPayload(BaseModel):
     is_self: bool | None
     author: str | None
     movie: str | None
     date: datetime | None
+    size: int
+    cursor: str | None
 
 
 class APIMultyPayload(BaseModel):
     role: Role
     movie: str | None
     date: datetime | None
+    size: int
+    cursor: str | None
 
 
 class EventStatus(str, Enum):
@@ -60,7 +69,7 @@ class PGCreatePayload(BaseModel):
 
 class DeleteBooking(BaseModel):
     del_booking_announce_id: str | UUID
-    guest_name: str
+    guest_name: str | None
     user_id: str | UUID
 
 
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 from uuid import UUID
 
 from services.booking import layer_models, layer_payload
@@ -17,9 +18,32 @@ class BookingRepositoryProtocol(ABC):
         self,
         query: layer_payload.APIMultyPayload,
         user_id: str | UUID,
-    ) -> list[layer_models.BookingResponse]:
+    ) -> layer_models.BookingPage:
         """
         :raises ValueMissingError
+        :raises InvalidCursorError
+        """
+        ...
+
+    @abstractmethod
+    def stream_multy(self, query: layer_payload.APIMultyPayload, user_id: str | UUID) -> AsyncIterator[bytes]:
+        """
+        :raises ValueMissingError
+        :raises InvalidCursorError
+        """
+        ...
+
+    @abstractmethod
+    async def sudo_get_multy(self, query: layer_payload.SudoAPIMultyPayload) -> layer_models.BookingPage:
+        """
+        :raises InvalidCursorError
+        """
+        ...
+
+    @abstractmethod
+    def sudo_stream_multy(self, query: layer_payload.SudoAPIMultyPayload) -> AsyncIterator[bytes]:
+        """
+        :raises InvalidCursorError
         """
         ...
 
@@ -28,7 +52,7 @@ class BookingRepositoryProtocol(ABC):
         self,
         announce: layer_payload.AnnounceToCreate,
         user_id: str | UUID,
-    ) -> str | UUID:
+    ) -> layer_models.PGBooking:
         """
         :raises UniqueConstraintError
         """
@@ -40,43 +64,77 @@ class BookingRepositoryProtocol(ABC):
         user_id: str | UUID,
         booking_id: str | UUID,
         new_status: layer_payload.APIUpdatePayload,
-    ) -> None:
+        announce_statuses: list[str] | None = None,
+    ) -> layer_models.UpdatedBooking:
         """
         :raises NotFoundError:
         :raises UniqueConstraintError:
+        :raises NoAccessError:
         """
         ...
 
+    @abstractmethod
+    async def bulk_update(
+        self,
+        user_id: str | UUID,
+        statuses: dict[str, bool],
+        announce_statuses: list[str] | None = None,
+    ) -> list[layer_models.UpdatedBooking]:
+        ...
+
+    @abstractmethod
+    async def existing_ids(self, booking_ids: list[str | UUID]) -> set[str]:
+        ...
+
     @abstractmethod
     async def delete(
         self,
         booking_id: str | UUID,
-    ) -> None:
+        user_id: str | UUID,
+        is_super: bool,
+    ) -> layer_models.PGBooking:
         """
         :raises NotFoundError
+        :raises NoAccessError
         """
         ...
 
+
+class UserRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_confirmed_list(self, announce_id: str | UUID) -> list[layer_models.PGBooking]:
+    async def get_by_id(self, user_id: str | UUID, strict: bool = False) -> layer_models.UserToResponse | None:
+        """
+        :return: None - если объект не найден (или, без strict, сервис недоступен и данных в кэше нет)
+        :raises UpstreamUnavailableError: если strict, сервис недоступен и данных в кэше нет
+        """
         ...
 
-
-class UserRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_by_id(self, user_id: str | UUID) -> layer_models.UserToResponse:
+    async def get_many(self, user_ids: list[str | UUID]) -> dict[str, layer_models.UserToResponse]:
         ...
 
 
 class RatingRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse:
+    async def get_by_id(self, user_id: str | UUID) -> layer_models.RatingToResponse | None:
+        ...
+
+    @abstractmethod
+    async def get_many(self, user_ids: list[str | UUID]) -> dict[str, layer_models.RatingToResponse]:
         ...
 
 
 class MovieRepositoryProtocol(ABC):
     @abstractmethod
-    async def get_by_id(self, movie_id: str | UUID) -> layer_models.MovieToResponse:
+    async def get_by_id(self, movie_id: str | UUID, strict: bool = False) -> layer_models.MovieToResponse | None:
+        """
+        :return: None - если объект не найден (или, без strict, сервис недоступен и данных в кэше нет)
+        :raises UpstreamUnavailableError: если strict, сервис недоступен и данных в кэше нет
+        """
+        ...
+
+    @abstractmethod
+    async def get_many(self, movie_ids: list[str | UUID]) -> dict[str, layer_models.MovieToResponse]:
         ...
 
 
@@ -89,15 +147,28 @@ class AnnouncementRepositoryProtocol(ABC):
         ...
 
     @abstractmethod
-    async def set_alive_status(self, announce_id: str | UUID) -> None:
+    async def move_seats(self, announce_id: str | UUID, delta: int) -> None:
+        """
+        :raises NoAccessError
+        """
         ...
 
+
+class NotificRepositoryProtocol(ABC):
     @abstractmethod
-    async def set_closed_status(self, announce_id: str | UUID) -> None:
+    async def send(self, event_type: layer_payload.EventType, payload: layer_payload.context) -> None:
         ...
 
+    @abstractmethod
+    async def send_many(self, event_type: layer_payload.EventType, payloads: list[layer_payload.context]) -> None:
+        ...
 
-class NotificRepositoryProtocol(ABC):
+
+class AdmissionRepositoryProtocol(ABC):
     @abstractmethod
-    async def send(self, event_type: layer_payload.EventType, payload: layer_payload.context) -> None:
+    async def acquire(self, announce_id: str | UUID, user_id: str | UUID, capacity: int) -> bool:
+        ...
+
+    @abstractmethod
+    async def release(self, announce_id: str | UUID, user_id: str | UUID) -> None:
         ...
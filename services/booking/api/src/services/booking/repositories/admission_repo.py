@@ -0,0 +1,70 @@
+from uuid import UUID
+
+from redis import asyncio as aioredis
+
+from core.config import settings
+from core.container import container
+from core.logger import get_logger
+from db.redis import get_redis
+from services.booking.repositories import _protocols
+
+logger = get_logger(__name__)
+
+# KEYS[1] - sorted set токенов объявления: member - id гостя, score - время истечения токена.
+# ARGV[1] - число свободных мест, ARGV[2] - время жизни токена в секундах, ARGV[3] - id гостя.
+ACQUIRE_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local ttl = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if not redis.call('ZSCORE', KEYS[1], ARGV[3]) and redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+redis.call('EXPIRE', KEYS[1], ttl)
+return 1
+"""
+
+
+class SeatAdmissionRedisRepository(_protocols.AdmissionRepositoryProtocol):
+    def __init__(self, redis: aioredis.Redis) -> None:
+        self.redis = redis
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+        logger.info('SeatAdmissionRedisRepository init ...')
+
+    @staticmethod
+    def _key(announce_id: str | UUID) -> str:
+        return f'seat_tokens:{announce_id}'
+
+    async def acquire(self, announce_id: str | UUID, user_id: str | UUID, capacity: int) -> bool:
+        """
+        Выдать гостю токен на место в объявлении.
+
+        Токены живут settings.admission.TOKEN_TTL_SEC, одновременно выдается не больше capacity токенов.
+        Повторный запрос того же гостя продлевает его токен.
+
+        :param announce_id: id объявления
+        :param user_id: id гостя
+        :param capacity: число свободных мест
+        :return: True, если токен выдан
+        """
+        granted = await self._acquire(
+            keys=[self._key(announce_id)],
+            args=[max(capacity, 0), settings.admission.TOKEN_TTL_SEC, str(user_id)],
+        )
+        if not granted:
+            logger.info(f'[-] Seat token denied <{announce_id}>: <{user_id}>')
+        return bool(granted)
+
+    async def release(self, announce_id: str | UUID, user_id: str | UUID) -> None:
+        """
+        Вернуть токен, если заявка не была создана.
+
+        :param announce_id: id объявления
+        :param user_id: id гостя
+        """
+        await self.redis.zrem(self._key(announce_id), str(user_id))
+
+
+@container.singleton
+def get_admission_repo() -> _protocols.AdmissionRepositoryProtocol:
+    return SeatAdmissionRedisRepository(get_redis())
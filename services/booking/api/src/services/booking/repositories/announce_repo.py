@@ -1,15 +1,14 @@
-from functools import lru_cache
 from typing import Any
 from uuid import UUID
 
 from fastapi import Depends
-from sqlalchemy import update
+from sqlalchemy import and_, case, literal, update
 
 import utils.exceptions as exc
 from core.logger import get_logger
-from db.models.announcement import Announcement
-from db.pg_db import AsyncSession, get_session
+from db.models.announcement import Announcement, EventStatus
 from db.redis import CacheProtocol, get_cache
+from db.uow import UnitOfWork, get_uow
 from services.booking import layer_models
 from services.booking.repositories import _protocols
 
@@ -17,8 +16,9 @@ logger = get_logger(__name__)
 
 
 class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
-    def __init__(self, db_session: AsyncSession, cache: CacheProtocol) -> None:
-        self.db = db_session
+    def __init__(self, uow: UnitOfWork, cache: CacheProtocol) -> None:
+        self.uow = uow
+        self.db = uow.session
         self.redis = cache
         logger.info('AnnounceSqlachemyRepository init ...')
 
@@ -36,11 +36,10 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
         :return: данные для layer_models.DetailBookingResponse
         :raises NotFoundError: если указаная запись не была найдена в базе
         """
-        _data = await self.db.get(Announcement, announce_id)
+        _data = await self.uow.get(Announcement, announce_id)
         if _data is None:
             logger.info(f'[-] Not found <{announce_id}>')
             raise exc.NotFoundError
-        _data = _data._asdict()
 
         return layer_models.AnnounceToResponse(
             status=_data.get('status').value,
@@ -49,32 +48,53 @@ class AnnounceSqlachemyRepository(_protocols.AnnouncementRepositoryProtocol):
             event_time=_data.get('event_time'),
             movie_id=_data.get('movie_id'),
             tickets_count=_data.get('tickets_count'),
+            seats_confirmed=_data.get('seats_confirmed'),
         )
 
-    async def set_alive_status(self, announce_id: str | UUID) -> None:
-        query = (
-            update(Announcement)
-            .where(Announcement.id == announce_id)
-            .values({'status': layer_models.EventStatus.Alive})
-        )
-        await self.db.execute(query)
-        await self.db.commit()
-        logger.info(f'Update announcement <{announce_id}>')
+    async def move_seats(self, announce_id: str | UUID, delta: int) -> None:
+        """
+        Изменение счетчика подтвержденных мест одним условным UPDATE.
 
-    async def set_closed_status(self, announce_id: str | UUID) -> None:
+        Статус объявления переключается в том же запросе: Alive -> Closed, когда места закончились,
+        и Closed -> Alive, когда место освободилось. Строка объявления блокируется до конца транзакции,
+        поэтому конкурентные подтверждения не могут занять больше мест, чем есть.
+
+        :param announce_id: id объявления
+        :param delta: +1 при подтверждении заявки, -1 при отмене
+        :raises NoAccessError: если свободных мест не осталось
+        """
+        seats = Announcement.seats_confirmed + delta
+        status_type = Announcement.__table__.c.status.type
+        status = case(
+            (
+                and_(Announcement.status == EventStatus.Alive, seats >= Announcement.tickets_count),
+                literal(EventStatus.Closed, status_type),
+            ),
+            (
+                and_(Announcement.status == EventStatus.Closed, seats < Announcement.tickets_count),
+                literal(EventStatus.Alive, status_type),
+            ),
+            else_=Announcement.status,
+        )
+        query = update(Announcement).where(Announcement.id == announce_id)
+        if delta > 0:
+            query = query.where(seats <= Announcement.tickets_count)
         query = (
-            update(Announcement)
-            .where(Announcement.id == announce_id)
-            .values({'status': layer_models.EventStatus.Closed})
+            query.values(seats_confirmed=seats, status=status)
+            .returning(Announcement.seats_confirmed, Announcement.status)
+            .execution_options(synchronize_session=False)
         )
-        await self.db.execute(query)
-        await self.db.commit()
-        logger.info(f'Update announcement <{announce_id}>')
+        _res = await self.db.execute(query)
+        row = _res.one_or_none()
+        if row is None:
+            logger.info(f'[-] No seats left <{announce_id}>')
+            raise exc.NoAccessError
+        self.uow.refresh(Announcement, announce_id, seats_confirmed=row.seats_confirmed, status=row.status)
+        logger.info(f'Seats confirmed <{announce_id}>: <{row.seats_confirmed}>, status <{row.status}>')
 
 
-@lru_cache()
 def get_announcement_repo(
-    db_session: AsyncSession = Depends(get_session),
+    uow: UnitOfWork = Depends(get_uow),
 ) -> _protocols.AnnouncementRepositoryProtocol:
     cache: CacheProtocol = get_cache()
-    return AnnounceSqlachemyRepository(db_session, cache)
+    return AnnounceSqlachemyRepository(uow, cache)
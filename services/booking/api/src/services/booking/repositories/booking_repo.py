@@ -1,27 +1,37 @@
-from functools import lru_cache
-from typing import Any
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator
 from uuid import UUID, uuid4
 
+import orjson
 import sqlalchemy.exc as sqlalch_exc
 from fastapi import Depends
-from sqlalchemy import insert, select, update
+from sqlalchemy import Boolean, any_, case, cast, exists, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.sql import Select
 
 import utils.exceptions as exc
+from core.config import settings
 from core.logger import get_logger
+from db.models.announcement import Announcement
 from db.models.booking import Booking
-from db.pg_db import AsyncSession, get_session
 from db.redis import CacheProtocol, get_cache
+from db.uow import UnitOfWork, get_uow
 from services.booking import layer_models, layer_payload
 from services.booking.repositories import _protocols, rating_repo, user_repo
+from utils.dataloader import DataLoader
+from utils.pagination import decode_cursor, encode_cursor
 
 logger = get_logger(__name__)
 
 
 class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
-    def __init__(self, db_session: AsyncSession, cache: CacheProtocol) -> None:
+    def __init__(self, uow: UnitOfWork, cache: CacheProtocol) -> None:
         self.user_repo = user_repo.get_user_repo()
         self.rating_repo = rating_repo.get_rating_repo()
-        self.db = db_session
+        self.uow = uow
+        self.db = uow.session
         self.redis = cache
         logger.info('BookingSqlachemyRepository init ...')
 
@@ -31,46 +41,36 @@ class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
     async def _set_to_cache(self, key: str, data: Any) -> None:
         await self.redis.set(key, data)
 
-    async def _get_booking_resp(self, data: dict) -> layer_models.BookingResponse:
+    async def _get_booking_resp(self, data: dict, users: DataLoader) -> layer_models.BookingResponse:
         """
         Служебный метод. Подготавливает данные и возвращает BookingResponse.
 
         :param data: layer_models.PGBooking.dict()
+        :param users: загрузчик пользователей, общий для всей выборки
         :return: BookingResponse
         """
         _booking = layer_models.PGBooking(**data)
 
-        _author = await self.user_repo.get_by_id(_booking.author_id)
-        logger.info(f'Get user <{_booking.author_id}>: <{_author}>')
-
-        _guest = await self.user_repo.get_by_id(_booking.guest_id)
-        logger.info(f'Get user <{_booking.guest_id}>: <{_guest}>')
+        _author, _guest = await users.load_many([_booking.author_id, _booking.guest_id])
+        logger.info(f'Get users <{_booking.author_id}>, <{_booking.guest_id}>: <{_author}>, <{_guest}>')
 
         return layer_models.BookingResponse(
             id=_booking.id,
-            author_name=_author.user_name,
-            guest_name=_guest.user_name,
+            author_name=_author.user_name if _author else None,
+            guest_name=_guest.user_name if _guest else None,
             author_status=_booking.author_status,
             guest_status=_booking.guest_status,
         )
 
-    async def get_confirmed_list(self, announce_id: str | UUID) -> list[layer_models.PGBooking]:
-        """Получение подтвержденных заявок.
-
-        :param announce_id: id объявления
-        :return список подтвержденных заявок
+    async def _get_booking_resp_list(self, scalar_result: list[dict]) -> list[layer_models.BookingResponse]:
         """
-        _query = (
-            select(Booking)
-            .where(Booking.announcement_id == announce_id)
-            .filter(Booking.author_status, Booking.guest_status)
-        )
-        _res = await self.db.execute(_query)
-        scalar_result = [data._asdict() for data in _res.scalars().all()]
+        Служебный метод. Подготавливает список BookingResponse, пользователи запрашиваются одной пачкой.
 
-        if len(scalar_result) == 0:
-            return []
-        return [layer_models.PGBooking(**data) for data in scalar_result]
+        :param scalar_result: список layer_models.PGBooking.dict()
+        :return: список BookingResponse
+        """
+        users = DataLoader(self.user_repo.get_many)
+        return list(await asyncio.gather(*(self._get_booking_resp(data, users) for data in scalar_result)))
 
     async def get_by_id(self, booking_id: str | UUID) -> layer_models.PGBooking:
         """Получение полной информации о Booking.
@@ -79,18 +79,18 @@ class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
         :return: layer_models.PGBooking
         :raises NotFoundError: если указаная запись не была найдена в базе
         """
-        data = await self.db.get(Booking, booking_id)
+        data = await self.uow.get(Booking, booking_id)
         if data is None:
             logger.info(f'[-] Not found <{booking_id}>')
             raise exc.NotFoundError
-        return layer_models.PGBooking(**data._asdict())
+        return layer_models.PGBooking(**data)
 
-    async def create(self, announce: layer_payload.AnnounceToCreate, user_id: str | UUID) -> str | UUID:
-        """Создание новой записи в БД.
+    async def create(self, announce: layer_payload.AnnounceToCreate, user_id: str | UUID) -> layer_models.PGBooking:
+        """Создание новой записи в БД одним INSERT ... RETURNING.
 
         :param announce: layer_payload.AnnounceToCreate
         :param user_id: id гостя
-        :return booking_id: id заявки
+        :return: layer_models.PGBooking
         :raises UniqueConstraintError: если запист уже существует в базе
         """
         booking_id = str(uuid4())
@@ -102,26 +102,18 @@ class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
             guest_id=user_id,
             event_time=announce.event_time,
         )
-        query = insert(Booking).values(**values.dict())
+        query = insert(Booking.__table__).values(**values.dict()).returning(*Booking.__table__.c)
         try:
-            await self.db.execute(query)
-            await self.db.commit()
+            _res = await self.db.execute(query)
+            data = self.uow.remember(Booking, _res.one()._mapping)
             logger.info(f'Create booking <{booking_id}>')
 
-            return booking_id
+            return layer_models.PGBooking(**data)
         except sqlalch_exc.IntegrityError as ex:
             logger.info(f'UniqueConstraintError booking <{booking_id}>')
             raise exc.UniqueConstraintError from ex
 
-    async def sudo_get_multy(
-        self,
-        query: layer_payload.SudoAPIMultyPayload,
-    ) -> list[layer_models.BookingResponse]:
-        """Служебный метод. Получение заявок по условию.
-
-        :param query: данные для фильтрации запроса к БД
-        :return: список заявок
-        """
+    def _sudo_multy_query(self, query: layer_payload.SudoAPIMultyPayload) -> Select:
         _query = select(Booking)
         if query.author:
             _query = _query.filter(Booking.author_id == query.author)
@@ -129,26 +121,9 @@ class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
             _query = _query.filter(Booking.movie_id == query.movie)
         if query.date:
             _query = _query.filter(Booking.event_time == query.date)
+        return self._keyset(_query, query.cursor)
 
-        _res = await self.db.execute(_query)
-        scalar_result = [data._asdict() for data in _res.scalars().all()]
-
-        if len(scalar_result) == 0:
-            logger.info(f'[-] Not found <{query}>')
-            return []
-        return [await self._get_booking_resp(data) for data in scalar_result]
-
-    async def get_multy(
-        self,
-        query: layer_payload.APIMultyPayload,
-        user_id: str | UUID,
-    ) -> list[layer_models.BookingResponse]:
-        """Получение заявок по условию.
-
-        :param user_id: id пользователя
-        :param query: данные для фильтрации запроса к БД
-        :return: список заявок
-        """
+    def _multy_query(self, query: layer_payload.APIMultyPayload, user_id: str | UUID) -> Select:
         _query = select(Booking)
         if query.role.value == layer_payload.Role.guest.value:
             _query = _query.where(Booking.guest_id == user_id)
@@ -162,67 +137,276 @@ class BookingSqlachemyRepository(_protocols.BookingRepositoryProtocol):
 
         if query.date:
             _query = _query.filter(Booking.event_time == query.date)
+        return self._keyset(_query, query.cursor)
 
-        _res = await self.db.execute(_query)
-        scalar_result = [data._asdict() for data in _res.scalars().all()]
+    @staticmethod
+    def _keyset(_query: Select, cursor: str | None) -> Select:
+        """
+        Служебный метод. Сортировка по (created, id) и начало выборки после курсора.
 
-        if len(scalar_result) == 0:
+        :param _query: запрос с фильтрами
+        :param cursor: курсор последней записи предыдущей страницы
+        :return: запрос
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        if cursor:
+            created, booking_id = decode_cursor(cursor, datetime, UUID)
+            _query = _query.where(tuple_(Booking.created, Booking.id) > tuple_(created, booking_id))
+        return _query.order_by(Booking.created, Booking.id)
+
+    async def _get_page(self, _query: Select, size: int) -> layer_models.BookingPage:
+        """
+        Служебный метод. Получение одной страницы заявок.
+
+        :param _query: запрос с фильтрами и сортировкой
+        :param size: размер страницы
+        :return: страница заявок и курсор следующей страницы
+        """
+        _res = await self.db.execute(_query.limit(size + 1))
+        rows: list[Booking] = _res.scalars().all()
+
+        next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_cursor = encode_cursor(rows[-1].created, rows[-1].id)
+        return layer_models.BookingPage(
+            items=await self._get_booking_resp_list([data._asdict() for data in rows]),
+            next_cursor=next_cursor,
+        )
+
+    async def _stream(self, _query: Select) -> AsyncIterator[bytes]:
+        """
+        Служебный метод. Выгрузка заявок в NDJSON через серверный курсор.
+
+        Строки читаются пачками по settings.pagination.STREAM_CHUNK_SIZE, пользователи
+        запрашиваются одной пачкой на каждую пачку строк.
+
+        :param _query: запрос с фильтрами и сортировкой
+        :return: пачки строк NDJSON
+        """
+        chunk_size = settings.pagination.STREAM_CHUNK_SIZE
+        _res = await self.db.stream_scalars(_query.execution_options(yield_per=chunk_size))
+        async for partition in _res.partitions(chunk_size):
+            items = await self._get_booking_resp_list([data._asdict() for data in partition])
+            yield b''.join(orjson.dumps(item.dict()) + b'\n' for item in items)
+
+    async def sudo_get_multy(
+        self,
+        query: layer_payload.SudoAPIMultyPayload,
+    ) -> layer_models.BookingPage:
+        """Служебный метод. Получение заявок по условию.
+
+        :param query: данные для фильтрации запроса к БД
+        :return: страница заявок
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        page = await self._get_page(self._sudo_multy_query(query), query.size)
+        if not page.items:
             logger.info(f'[-] Not found <{query}>')
-            return []
-        return [await self._get_booking_resp(data) for data in scalar_result]
+        return page
+
+    def sudo_stream_multy(self, query: layer_payload.SudoAPIMultyPayload) -> AsyncIterator[bytes]:
+        """Служебный метод. Выгрузка заявок по условию в NDJSON.
 
-    async def delete(self, booking_id: str | UUID) -> None:
+        :param query: данные для фильтрации запроса к БД
+        :return: пачки строк NDJSON
+        :raises InvalidCursorError: если курсор поврежден
         """
-        Удаление записи из БД.
+        return self._stream(self._sudo_multy_query(query))
 
-        :param announce_id: id заявки
+    async def get_multy(
+        self,
+        query: layer_payload.APIMultyPayload,
+        user_id: str | UUID,
+    ) -> layer_models.BookingPage:
+        """Получение заявок по условию.
+
+        :param user_id: id пользователя
+        :param query: данные для фильтрации запроса к БД
+        :return: страница заявок
+        :raises ValueMissingError: если не указана роль пользователя
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        page = await self._get_page(self._multy_query(query, user_id), query.size)
+        if not page.items:
+            logger.info(f'[-] Not found <{query}>')
+        return page
+
+    def stream_multy(self, query: layer_payload.APIMultyPayload, user_id: str | UUID) -> AsyncIterator[bytes]:
+        """Выгрузка заявок по условию в NDJSON.
+
+        :param user_id: id пользователя
+        :param query: данные для фильтрации запроса к БД
+        :return: пачки строк NDJSON
+        :raises ValueMissingError: если не указана роль пользователя
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        return self._stream(self._multy_query(query, user_id))
+
+    async def _raise_missing(self, booking_id: str | UUID) -> None:
+        """
+        Служебный метод. Условный запрос не вернул строку: отличаем отсутствие заявки от отказа в доступе.
+
+        Выполняется только на неуспешном пути.
+
+        :param booking_id: id заявки
+        :raises NotFoundError: если указаная запись не была найдена в базе
+        :raises NoAccessError: если заявка есть, но условие запроса не выполнено
+        """
+        if await self.uow.get(Booking, booking_id) is None:
+            logger.info(f'[-] Not found <{booking_id}>')
+            raise exc.NotFoundError
+        logger.info(f'[-] Permission denied <{booking_id}>')
+        raise exc.NoAccessError
+
+    async def delete(self, booking_id: str | UUID, user_id: str | UUID, is_super: bool) -> layer_models.PGBooking:
+        """
+        Удаление записи из БД одним DELETE ... RETURNING, удалить заявку могут только гость и sudo.
+
+        :param booking_id: id заявки
+        :param user_id: id пользователя
+        :param is_super: пользователь - sudo
+        :return: удаленная заявка
         :raises NotFoundError: если указаная запись не была найдена в базе
+        :raises NoAccessError: если у пользователя нет прав на удаление заявки
         """
-        _data: Booking = await self.db.get(Booking, booking_id)
-        await self.db.delete(_data)
-        await self.db.commit()
+        table = Booking.__table__
+        query = table.delete().where(table.c.id == booking_id)
+        if not is_super:
+            query = query.where(table.c.guest_id == user_id)
+        _res = await self.db.execute(query.returning(*table.c))
+        row = _res.one_or_none()
+        if row is None:
+            await self._raise_missing(booking_id)
+        self.uow.forget(Booking, booking_id)
         logger.info(f'Delete booking <{booking_id}>')
 
+        return layer_models.PGBooking(**row._mapping)
+
     async def update(
         self,
         user_id: str | UUID,
         booking_id: str | UUID,
         new_status: layer_payload.APIUpdatePayload,
-    ) -> None:
+        announce_statuses: list[str] | None = None,
+    ) -> layer_models.UpdatedBooking:
         """
-        Изменить статус в заявке.
+        Изменить свой статус в заявке одним UPDATE ... RETURNING.
 
+        Права пользователя и статус объявления проверяются в WHERE, прежние статусы берутся
+        из заблокированной той же командой строки.
+
+        :param user_id: id автора или гостя заявки
         :param booking_id: id заявки
         :param new_status: новый статус
+        :param announce_statuses: допустимые статусы объявления, None - без проверки
+        :return: заявка с прежними и новыми статусами
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises UniqueConstraintError: если запист уже существует в базе
+        :raises NoAccessError: если у пользователя нет прав на изменение заявки
         """
-        query = update(Booking).where(Booking.id == booking_id)
-        booking: layer_models.PGBooking = await self.get_by_id(booking_id)
-        if user_id == str(booking.author_id):
-            if new_status.my_status == booking.author_status:
-                return
-            query = query.values(
-                {'author_status': new_status.my_status},
+        table = Booking.__table__
+        old = select(table.c.id, table.c.author_status, table.c.guest_status).where(table.c.id == booking_id)
+        old = old.with_for_update().subquery('old')
+        query = (
+            update(table)
+            .where(table.c.id == old.c.id)
+            .where(or_(table.c.author_id == user_id, table.c.guest_id == user_id))
+            .values(
+                author_status=case((table.c.author_id == user_id, new_status.my_status), else_=table.c.author_status),
+                guest_status=case((table.c.guest_id == user_id, new_status.my_status), else_=table.c.guest_status),
+            )
+            .returning(
+                *table.c,
+                old.c.author_status.label('prev_author_status'),
+                old.c.guest_status.label('prev_guest_status'),
             )
-        elif user_id == str(booking.guest_id):
-            if new_status.my_status == booking.guest_status:
-                return
-            query = query.values(
-                {'guest_status': new_status.my_status},
+        )
+        if announce_statuses:
+            query = query.where(
+                exists().where(Announcement.id == table.c.announcement_id, Announcement.status.in_(announce_statuses)),
             )
         try:
-            await self.db.execute(query)
-            await self.db.commit()
-            logger.info(f'Update booking <{booking_id}>')
+            _res = await self.db.execute(query)
         except sqlalch_exc.IntegrityError as ex:
             logger.info(f'UniqueConstraintError booking <{booking_id}>')
             raise exc.UniqueConstraintError from ex
+        row = _res.one_or_none()
+        if row is None:
+            await self._raise_missing(booking_id)
+        self.uow.remember(Booking, row._mapping)
+        logger.info(f'Update booking <{booking_id}>')
+
+        return layer_models.UpdatedBooking(**row._mapping)
+
+    async def bulk_update(
+        self,
+        user_id: str | UUID,
+        statuses: dict[str, bool],
+        announce_statuses: list[str] | None = None,
+    ) -> list[layer_models.UpdatedBooking]:
+        """
+        Изменить свой статус сразу в нескольких заявках одним UPDATE ... FROM unnest(...) RETURNING.
+
+        Новые статусы передаются двумя типизированными массивами, поэтому число параметров запроса
+        не зависит от размера пачки. Строки блокируются в порядке id, чтобы встречные пачки
+        не приводили к взаимной блокировке. Заявки, в которых пользователь не автор и не гость,
+        или объявление не в допустимом статусе, в результат не попадают.
+
+        :param user_id: id автора или гостя заявок
+        :param statuses: новый статус по id заявки
+        :param announce_statuses: допустимые статусы объявления, None - без проверки
+        :return: измененные заявки с прежними и новыми статусами
+        """
+        table = Booking.__table__
+        ids = cast([UUID(str(booking_id)) for booking_id in statuses], ARRAY(PG_UUID(as_uuid=True)))
+        new = (
+            func.unnest(ids, cast(list(statuses.values()), ARRAY(Boolean)))
+            .table_valued('id', 'status')
+            .render_derived(name='new')
+        )
+        old = select(table.c.id, table.c.author_status, table.c.guest_status).where(table.c.id == any_(ids))
+        old = old.order_by(table.c.id).with_for_update().subquery('old')
+        query = (
+            update(table)
+            .where(table.c.id == new.c.id, table.c.id == old.c.id)
+            .where(or_(table.c.author_id == user_id, table.c.guest_id == user_id))
+            .values(
+                author_status=case((table.c.author_id == user_id, new.c.status), else_=table.c.author_status),
+                guest_status=case((table.c.guest_id == user_id, new.c.status), else_=table.c.guest_status),
+            )
+            .returning(
+                *table.c,
+                old.c.author_status.label('prev_author_status'),
+                old.c.guest_status.label('prev_guest_status'),
+            )
+        )
+        if announce_statuses:
+            query = query.where(
+                exists().where(Announcement.id == table.c.announcement_id, Announcement.status.in_(announce_statuses)),
+            )
+        _res = await self.db.execute(query)
+        rows = _res.all()
+        for row in rows:
+            self.uow.remember(Booking, row._mapping)
+        logger.info(f'Bulk update bookings: <{len(rows)}> of <{len(statuses)}>')
+
+        return [layer_models.UpdatedBooking(**row._mapping) for row in rows]
+
+    async def existing_ids(self, booking_ids: list[str | UUID]) -> set[str]:
+        """
+        Какие из заявок есть в БД.
+
+        :param booking_ids: id заявок
+        :return: id найденных заявок
+        """
+        ids = cast([UUID(str(booking_id)) for booking_id in booking_ids], ARRAY(PG_UUID(as_uuid=True)))
+        _res = await self.db.execute(select(Booking.id).where(Booking.id == any_(ids)))
+        return {str(booking_id) for booking_id in _res.scalars().all()}
 
 
-@lru_cache()
 def get_booking_repo(
-    db_session: AsyncSession = Depends(get_session),
+    uow: UnitOfWork = Depends(get_uow),
 ) -> _protocols.BookingRepositoryProtocol:
     cache: CacheProtocol = get_cache()
-    return BookingSqlachemyRepository(db_session, cache)
+    return BookingSqlachemyRepository(uow, cache)
@@ -1,64 +1,63 @@
-from functools import lru_cache
-from typing import Any
 from uuid import UUID
 
-import aiohttp
-from aiohttp.client_exceptions import ClientError
-
 from core.config import settings
+from core.container import container
 from core.logger import get_logger
-from db.redis import CacheProtocol, get_cache
+from db.redis import get_cache, get_tiered_cache
 from services.booking import layer_models
 from services.booking.repositories import _protocols
-from utils.auth import _headers
+from utils.http_client import HttpClient, get_http_client
+from utils.single_flight import SingleFlight
+from utils.swr import StaleWhileRevalidate
 
 logger = get_logger(__name__)
 
 
 class MovieMockRepository(_protocols.MovieRepositoryProtocol):
-    def __init__(self, cache: CacheProtocol) -> None:
+    def __init__(self, cache: StaleWhileRevalidate, http: HttpClient) -> None:
         self.movie_endpoint = f'{settings.movie_api.uri}movie/'
-        self._headers = _headers()
-        self.redis = cache
+        self.movie_batch_endpoint = f'{settings.movie_api.uri}movie:batch'
+        self.http = http
+        self.cache = cache
 
         logger.info('MovieMockRepository init ...')
 
-    async def _get_from_cache(self, key: str) -> Any:
-        return await self.redis.get(key)
+    @staticmethod
+    def _to_response(movie_id: str, _movie: dict) -> dict:
+        _duration = _movie.get('duration')
+        if settings.debug.DEBUG:
+            _duration = 0
+        return layer_models.MovieToResponse(
+            movie_id=movie_id,
+            movie_title=_movie.get('title'),
+            duration=_duration,
+        ).dict()
 
-    async def _set_to_cache(self, key: str, data: Any) -> None:
-        await self.redis.set(key, data)
+    async def _fetch(self, movie_id: str) -> dict:
+        _movie = await self.http.post(f'{self.movie_endpoint}{movie_id}')
+        logger.debug(f'Get movie <{movie_id}>: <{_movie}>')
+        return self._to_response(movie_id, _movie)
 
-    async def get_by_id(self, movie_id: str | UUID) -> layer_models.MovieToResponse:
-        if _cache := await self._get_from_cache(f'movie:{movie_id}'):
-            logger.info('MovieToResponse from cache')
-            return layer_models.MovieToResponse(**_cache)
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f'{self.movie_endpoint}{movie_id}',
-                    headers=self._headers,
-                ) as resp:
-                    _movie = await resp.json()
-                    logger.debug(f'Get movie <{movie_id}>: <{_movie}>')
-                    _duration = _movie.get('duration')
-                    if settings.debug.DEBUG:
-                        _duration = 0
+    async def _fetch_many(self, movie_ids: list[str]) -> dict[str, dict]:
+        _movies = await self.http.post(self.movie_batch_endpoint, json=movie_ids)
+        return {movie_id: self._to_response(movie_id, _movie) for movie_id, _movie in _movies.items()}
 
-        except ClientError as ex:  # noqa: F841
-            logger.debug(f'Except <{ex}>')
-            return None
-        data = layer_models.MovieToResponse(
-            movie_id=str(movie_id),
-            movie_title=_movie.get('title'),
-            duration=_duration,
-        )
-        await self._set_to_cache(f'movie:{movie_id}', data.dict())
-        logger.info('MovieToResponse set to cache')
-        return data
+    async def get_by_id(self, movie_id: str | UUID, strict: bool = False) -> layer_models.MovieToResponse | None:
+        data = await self.cache.get(str(movie_id), self._fetch, strict=strict)
+        return layer_models.MovieToResponse(**data) if data else None
+
+    async def get_many(self, movie_ids: list[str | UUID]) -> dict[str, layer_models.MovieToResponse]:
+        """
+        Получение фильмов пачкой: один MGET в Redis и один пакетный запрос к сервису для промахов.
+
+        :param movie_ids: список id фильмов
+        :return: словарь id -> фильм, ненайденные фильмы отсутствуют
+        """
+        data = await self.cache.get_many([str(movie_id) for movie_id in movie_ids], self._fetch_many)
+        return {movie_id: layer_models.MovieToResponse(**value) for movie_id, value in data.items()}
 
 
-@lru_cache()
+@container.singleton
 def get_movie_repo() -> _protocols.MovieRepositoryProtocol:
-    cache: CacheProtocol = get_cache()
-    return MovieMockRepository(cache)
+    cache = StaleWhileRevalidate(get_tiered_cache(), SingleFlight(get_cache(), 'movie'), 'movie')
+    return MovieMockRepository(cache, get_http_client())
@@ -1,28 +1,32 @@
 from datetime import datetime
-from functools import lru_cache
 from uuid import uuid4
 
-import aiohttp
+import orjson
+from fastapi import Depends
+from sqlalchemy import insert
 
-from core.config import settings
 from core.logger import get_logger
-from db.redis import CacheProtocol, get_cache
+from db.models.outbox import Outbox
+from db.uow import UnitOfWork, get_uow
 from services.booking import layer_payload
 from services.booking.repositories import _protocols
-from utils.auth import _headers
 
 logger = get_logger(__name__)
 
 
-class NotificApiRepository(_protocols.NotificRepositoryProtocol):
-    def __init__(self, cache: CacheProtocol) -> None:
-        self.notific_endpoint = f'{settings.nptific.uri}send'
-        self._headers = _headers()
-        self.redis = cache
+class NotificOutboxRepository(_protocols.NotificRepositoryProtocol):
+    """
+    Оповещения записываются в таблицу outbox в транзакции текущего UnitOfWork, в API оповещений
+    их доставляет релей (outbox_relay.py). Оповещение не теряется при падении процесса после
+    коммита и не задерживает ответ на запрос.
+    """
 
-        logger.info('NotificApiRepository init ...')
+    def __init__(self, uow: UnitOfWork) -> None:
+        self.uow = uow
+        self.db = uow.session
 
-    async def send(self, event_type: layer_payload.EventType, payload: layer_payload.context) -> None:
+    @staticmethod
+    def _event(event_type: layer_payload.EventType, payload: layer_payload.context) -> dict:
         event = layer_payload.NotificEvent(
             notification_id=str(uuid4()),
             source_name='Booking service',
@@ -30,17 +34,17 @@ class NotificApiRepository(_protocols.NotificRepositoryProtocol):
             context=payload.dict(),
             created_at=datetime.now(),
         ).dict()
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.notific_endpoint,
-                headers=self._headers,
-                json=event,
-            ) as resp:
-                logger.info(f'Send notific <{self.notific_endpoint}>')
-                logger.info(f'Send notific resp.status: <{resp.status}>')
-
-
-@lru_cache()
-def get_notific_repo() -> _protocols.NotificRepositoryProtocol:
-    cache: CacheProtocol = get_cache()
-    return NotificApiRepository(cache)
+        return {'id': uuid4(), 'event': orjson.loads(orjson.dumps(event, default=str))}
+
+    async def send(self, event_type: layer_payload.EventType, payload: layer_payload.context) -> None:
+        await self.send_many(event_type, [payload])
+
+    async def send_many(self, event_type: layer_payload.EventType, payloads: list[layer_payload.context]) -> None:
+        if not payloads:
+            return
+        await self.db.execute(insert(Outbox.__table__), [self._event(event_type, payload) for payload in payloads])
+        logger.info(f'Outbox <{event_type.value}>: <{len(payloads)}>')
+
+
+def get_notific_repo(uow: UnitOfWork = Depends(get_uow)) -> _protocols.NotificRepositoryProtocol:
+    return NotificOutboxRepository(uow)
@@ -1,68 +1,73 @@
-from functools import lru_cache
-from typing import Any
+import asyncio
 from uuid import UUID
 
-import aiohttp
-from aiohttp.client_exceptions import ClientError
-
 from core.config import settings
+from core.container import container
 from core.logger import get_logger
-from db.redis import CacheProtocol, get_cache
+from db.redis import get_cache, get_tiered_cache
 from services.booking import layer_models
 from services.booking.repositories import _protocols
-from utils.auth import _headers
+from utils.http_client import HttpClient, get_http_client
+from utils.single_flight import SingleFlight
+from utils.swr import StaleWhileRevalidate
 
 logger = get_logger(__name__)
 
 
 class UserMockRepository(_protocols.UserRepositoryProtocol):
-    def __init__(self, cache: CacheProtocol) -> None:
+    def __init__(self, cache: StaleWhileRevalidate, http: HttpClient) -> None:
         self.auth_endpoint = f'{settings.auth.uri}user_info/'
         self.ugc_endpoint = f'{settings.ugc.uri}subscribers/'
-        self._headers = _headers()
-        self.redis = cache
+        self.auth_batch_endpoint = f'{settings.auth.uri}user_info:batch'
+        self.ugc_batch_endpoint = f'{settings.ugc.uri}subscribers:batch'
+        self.http = http
+        self.cache = cache
 
         logger.info('UserMockRepository init ...')
 
-    async def _get_from_cache(self, key: str) -> Any:
-        return await self.redis.get(key)
-
-    async def _set_to_cache(self, key: str, data: Any) -> None:
-        await self.redis.set(key, data)
-
-    async def get_by_id(self, user_id: str | UUID) -> layer_models.UserToResponse:
-        if _cache := await self._get_from_cache(f'user:{user_id}'):
-            logger.info('MovieToResponse from cache')
-            return layer_models.UserToResponse(**_cache)
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f'{self.auth_endpoint}{user_id}',
-                    headers=self._headers,
-                ) as resp:
-                    _user = await resp.json()
-                    logger.debug(f'Get user <{user_id}>: <{_user}>')
-                async with session.post(
-                    f'{self.ugc_endpoint}{user_id}',
-                    headers=self._headers,
-                ) as resp:
-                    _subs = await resp.json()
-                    logger.debug(f'Get subs for user <{user_id}>: <{_subs}>')
-
-        except ClientError as ex:  # noqa: F841
-            logger.debug(f'Except <{ex}>')
-            return None
-        data = layer_models.UserToResponse(
-            user_id=str(user_id),
+    async def _fetch(self, user_id: str) -> dict:
+        _user, _subs = await asyncio.gather(
+            self.http.post(f'{self.auth_endpoint}{user_id}'),
+            self.http.post(f'{self.ugc_endpoint}{user_id}'),
+        )
+        logger.debug(f'Get user <{user_id}>: <{_user}>, subs: <{_subs}>')
+        return layer_models.UserToResponse(
+            user_id=user_id,
             user_name=f"{_user.get('name')} {_user.get('last_name')}",
             subs=_subs,
+        ).dict()
+
+    async def _fetch_many(self, user_ids: list[str]) -> dict[str, dict]:
+        _users, _subs = await asyncio.gather(
+            self.http.post(self.auth_batch_endpoint, json=user_ids),
+            self.http.post(self.ugc_batch_endpoint, json=user_ids),
         )
-        await self._set_to_cache(f'user:{user_id}', data.dict())
-        logger.info('UserToResponse set to cache')
-        return data
+        logger.debug(f'Get users <{len(_users)}>, subs <{len(_subs)}>')
+        return {
+            user_id: layer_models.UserToResponse(
+                user_id=user_id,
+                user_name=f"{_user.get('name')} {_user.get('last_name')}",
+                subs=_subs.get(user_id, []),
+            ).dict()
+            for user_id, _user in _users.items()
+        }
+
+    async def get_by_id(self, user_id: str | UUID, strict: bool = False) -> layer_models.UserToResponse | None:
+        data = await self.cache.get(str(user_id), self._fetch, strict=strict)
+        return layer_models.UserToResponse(**data) if data else None
+
+    async def get_many(self, user_ids: list[str | UUID]) -> dict[str, layer_models.UserToResponse]:
+        """
+        Получение пользователей пачкой: один MGET в Redis и по одному пакетному запросу к сервисам для промахов.
+
+        :param user_ids: список id пользователей
+        :return: словарь id -> пользователь, ненайденные пользователи отсутствуют
+        """
+        data = await self.cache.get_many([str(user_id) for user_id in user_ids], self._fetch_many)
+        return {user_id: layer_models.UserToResponse(**value) for user_id, value in data.items()}
 
 
-@lru_cache()
+@container.singleton
 def get_user_repo() -> _protocols.UserRepositoryProtocol:
-    cache: CacheProtocol = get_cache()
-    return UserMockRepository(cache)
+    cache = StaleWhileRevalidate(get_tiered_cache(), SingleFlight(get_cache(), 'user'), 'user')
+    return UserMockRepository(cache=cache, http=get_http_client())
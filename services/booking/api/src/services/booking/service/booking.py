@@ -1,6 +1,6 @@
+from collections import defaultdict
 from enum import Enum
-from functools import lru_cache
-from typing import Any
+from typing import Any, AsyncIterator
 from uuid import UUID
 
 from fastapi import Depends
@@ -9,9 +9,11 @@ import utils.exceptions as exc
 from core.config import settings
 from core.logger import get_logger
 from db.redis import CacheProtocol, get_cache
+from db.uow import UnitOfWork, get_uow
 from services.booking import layer_models, layer_payload
 from services.booking.repositories import (
     _protocols,
+    admission_repo,
     announce_repo,
     booking_repo,
     movie_repo,
@@ -19,6 +21,9 @@ from services.booking.repositories import (
     rating_repo,
     user_repo,
 )
+from utils.dataloader import DataLoader
+from utils.detail_cache import DetailCache, get_detail_cache
+from utils.enrichment import Enrichment
 
 logger = get_logger(__name__)
 
@@ -38,6 +43,9 @@ class BookingService:
         rating_repo: _protocols.RatingRepositoryProtocol,
         announce_repo: _protocols.AnnouncementRepositoryProtocol,
         notific_repo: _protocols.NotificRepositoryProtocol,
+        admission_repo: _protocols.AdmissionRepositoryProtocol,
+        uow: UnitOfWork,
+        detail_cache: DetailCache,
         cache: CacheProtocol,
     ) -> None:
         self.repo = repo
@@ -46,6 +54,9 @@ class BookingService:
         self.rating_repo = rating_repo
         self.announce_repo = announce_repo
         self.notific_repo = notific_repo
+        self.admission_repo = admission_repo
+        self.uow = uow
+        self.detail_cache = detail_cache
         self.redis = cache
         logger.info('BookingServic init ...')
 
@@ -55,15 +66,10 @@ class BookingService:
     async def _set_to_cache(self, key: str, data: Any) -> None:
         await self.redis.set(key, data)
 
-    async def _check_permissions(self, user: dict, booking_id: str | UUID) -> Permission:
-        try:
-            _data: layer_models.PGBooking = await self.repo.get_by_id(booking_id)
-        except exc.NotFoundError:
-            raise
-
-        if str(user.get('user_id')) == str(_data.author_id):
+    def _check_permissions(self, user: dict, booking: layer_models.PGBooking) -> Permission:
+        if str(user.get('user_id')) == str(booking.author_id):
             return Permission.author
-        elif str(user.get('user_id')) == str(_data.guest_id):
+        elif str(user.get('user_id')) == str(booking.guest_id):
             return Permission.guest
         elif user.get('claims').get('is_super'):
             return Permission.super
@@ -78,47 +84,88 @@ class BookingService:
         :return: layer_models.PGBooking
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises NoAccessError: Если у пользователя нет прав
+        :raises DeadlineExceededError: если не уложились в бюджет времени на обогащение
         """
         try:
-            prem: Permission = await self._check_permissions(user, booking_id)
-            if prem.value in [
-                Permission.super.value,
-                Permission.author.value,
-                Permission.guest.value,
-            ]:
-                _booking: layer_models.PGBooking = await self.repo.get_by_id(booking_id)
+            _booking: layer_models.PGBooking = await self.repo.get_by_id(booking_id)
+            self._check_permissions(user, _booking)
         except (exc.NotFoundError, exc.NoAccessError):
             raise
 
-        _author = await self.user_repo.get_by_id(_booking.author_id)
-        logger.info(f'Get user <{_booking.author_id}>: <{_author}>')
+        return await self._get_detail(_booking)
 
-        _guest = await self.user_repo.get_by_id(_booking.guest_id)
-        logger.info(f'Get user <{_booking.guest_id}>: <{_guest}>')
-
-        _announce = await self.announce_repo.get_by_id(_booking.announcement_id)
-        logger.info(f'Get announce <{_booking.announcement_id}>: <{_announce}>')
-
-        _movie = await self.movie_repo.get_by_id(_announce.movie_id)
-        logger.info(f'Get movie <{_announce.movie_id}>: <{_movie}>')
+    async def _get_announce(
+        self,
+        announce_id: str | UUID,
+        _announce: layer_models.AnnounceToResponse | None,
+    ) -> layer_models.AnnounceToResponse:
+        if _announce is not None:
+            return _announce
+        return await self.announce_repo.get_by_id(announce_id)
 
-        _author_rating = await self.rating_repo.get_by_id(_booking.author_id)
-        logger.info(f'Get rating <{_booking.author_id}>: <{_author_rating}>')
+    async def _get_detail(
+        self,
+        _booking: layer_models.PGBooking,
+        _announce: layer_models.AnnounceToResponse | None = None,
+    ) -> layer_models.DetailBookingResponse:
+        """
+        Служебный метод. Обогащение уже загруженной заявки.
 
-        _guest_rating = await self.rating_repo.get_by_id(_booking.guest_id)
-        logger.info(f'Get rating <{_booking.guest_id}>: <{_guest_rating}>')
+        :param _booking: заявка
+        :param _announce: объявление заявки, если уже загружено
+        :return: подробная информация о заявке
+        :raises DeadlineExceededError: если не уложились в бюджет времени на обогащение
+        """
+        # announcement -> movie образуют цепочку, остальные запросы независимы.
+        # Запрос в БД в графе один: AsyncSession не допускает конкурентных запросов.
+        # Автор и гость запрашиваются одной пачкой.
+        users = DataLoader(self.user_repo.get_many)
+        ratings = DataLoader(self.rating_repo.get_many)
+        enrichment = Enrichment()
+        author = enrichment.load(f'user:{_booking.author_id}', lambda: users.load(_booking.author_id))
+        guest = enrichment.load(f'user:{_booking.guest_id}', lambda: users.load(_booking.guest_id))
+        announce = enrichment.load(
+            f'announce:{_booking.announcement_id}',
+            lambda: self._get_announce(_booking.announcement_id, _announce),
+        )
+        movie = enrichment.then(
+            announce,
+            lambda _announce: enrichment.load(
+                f'movie:{_announce.movie_id}',
+                lambda: self.movie_repo.get_by_id(_announce.movie_id),
+            ),
+        )
+        author_rating = enrichment.load(
+            f'rating:{_booking.author_id}',
+            lambda: ratings.load(_booking.author_id),
+        )
+        guest_rating = enrichment.load(
+            f'rating:{_booking.guest_id}',
+            lambda: ratings.load(_booking.guest_id),
+        )
+        try:
+            _author, _guest, _movie, _author_rating, _guest_rating = await enrichment.gather(
+                author,
+                guest,
+                movie,
+                author_rating,
+                guest_rating,
+            )
+        except exc.DeadlineExceededError:
+            raise
+        logger.info(f'Get booking details <{_booking.id}>: <{_author}>, <{_guest}>, <{_movie}>')
 
         return layer_models.DetailBookingResponse(
             id=_booking.id,
             announcement_id=_booking.announcement_id,
-            movie_title=_movie.movie_title,
-            author_name=_author.user_name,
-            guest_name=_guest.user_name,
+            movie_title=_movie.movie_title if _movie else None,
+            author_name=_author.user_name if _author else None,
+            guest_name=_guest.user_name if _guest else None,
             author_status=_booking.author_status,
             guest_status=_booking.guest_status,
-            author_rating=_author_rating.user_rating,
+            author_rating=_author_rating.user_rating if _author_rating else None,
             event_time=_booking.event_time,
-            guest_rating=_guest_rating.user_rating,
+            guest_rating=_guest_rating.user_rating if _guest_rating else None,
         )
 
     async def create(
@@ -134,6 +181,7 @@ class BookingService:
         :raises UniqueConstraintError: если запист уже существует в базе
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises NoAccessError: если объявление не в статусе Alive
+        :raises CapacityExceededError: если токены на свободные места уже разобраны
         """
         try:
             _announce: layer_models.AnnounceToResponse = await self.announce_repo.get_by_id(announce_id)
@@ -148,22 +196,36 @@ class BookingService:
         # Автор объявления не может быть гостем
         if str(_announce.author_id) == str(user.get('user_id')):
             raise exc.NoAccessError
+        # заявки сверх числа свободных мест отсекаются до транзакции в БД
+        if not await self.admission_repo.acquire(
+            announce_id=announce_id,
+            user_id=user.get('user_id'),
+            capacity=_announce.tickets_count - _announce.seats_confirmed,
+        ):
+            raise exc.CapacityExceededError
         # создаем заявку
         try:
-            _id = await self.repo.create(announce=_announce, user_id=user.get('user_id'))
-            logger.info(f'[+] Create booking <{_id}>')
+            async with self.uow:
+                _booking: layer_models.PGBooking = await self.repo.create(
+                    announce=_announce,
+                    user_id=user.get('user_id'),
+                )
+                # оповещаем автора события, оповещение фиксируется тем же коммитом
+                payload = layer_payload.NewBooking(
+                    new_booking_id=str(_booking.id),
+                    announce_id=announce_id,
+                    user_id=str(_announce.author_id),
+                )
+                await self.notific_repo.send(event_type=layer_payload.EventType.booking_new, payload=payload)
+            logger.info(f'[+] Create booking <{_booking.id}>')
         except exc.UniqueConstraintError:
+            await self.admission_repo.release(announce_id=announce_id, user_id=user.get('user_id'))
             raise
-        # оповещаем автора события
-        payload = layer_payload.NewBooking(
-            new_booking_id=_id,
-            announce_id=announce_id,
-            user_id=str(_announce.author_id),
-        )
-        # TODO Развернуть сервис уведомлений
-        #await self.notific_repo.send(event_type=layer_payload.EventType.booking_new, payload=payload)
+        # список гостей объявления изменился
+        await self.detail_cache.invalidate(announce_id)
 
-        return await self.get_one(_id, user=user)
+        # заявка и объявление уже загружены, повторно их не читаем
+        return await self._get_detail(_booking, _announce)
 
     async def update(
         self,
@@ -180,82 +242,112 @@ class BookingService:
         :return подробная информация о заявке
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises UniqueConstraintError: если запист уже существует в базе
-        :raises NoAccessError: если у пользователя нет прав на изменение заявки
+        :raises NoAccessError: если у пользователя нет прав на изменение заявки или не осталось свободных мест
         """
-        if not settings.debug.DEBUG:  # noqa: SIM102
-            # проверяем, что объявление живое
-            try:
-                _booking: layer_models.PGBooking = await self.repo.get_by_id(booking_id)
-
-                _announce: layer_models.AnnounceToResponse = await self.announce_repo.get_by_id(
-                    _booking.announcement_id,
-                )
-                logger.info(f'Get announce <{_booking.announcement_id}>: <{_announce}>')
-
-                if _announce.status.value not in [
-                    layer_models.EventStatus.Alive.value,
-                    layer_models.EventStatus.Closed.value,
-                ]:
-                    raise exc.NoAccessError
-            except (exc.NoAccessError, exc.NotFoundError):
-                raise
-        else:
-            _booking: layer_models.PGBooking = await self.repo.get_by_id(booking_id)
-            _announce: layer_models.AnnounceToResponse = await self.announce_repo.get_by_id(
-                _booking.announcement_id,
-            )
+        # права и статус объявления проверяются в WHERE того же UPDATE
+        announce_statuses = None
+        if not settings.debug.DEBUG:
+            announce_statuses = [layer_models.EventStatus.Alive.value, layer_models.EventStatus.Closed.value]
         try:
-            perm: Permission = await self._check_permissions(user, booking_id)
-
-            # если статус не изменился - ничего не трогаем
-            if (
-                (perm == Permission.author)
-                and (_booking.author_status is new_status.my_status)  # noqa: W503
-                or (perm == Permission.guest)  # noqa: W503
-                and (_booking.guest_status is new_status.my_status)  # noqa: W503
-            ):  # noqa: W503
-                return
-            # sudo не может влиять на статус заявки
-            if perm.value not in [
-                Permission.author.value,
-                Permission.guest.value,
-            ]:
-                raise exc.NoAccessError
-            await self.repo.update(
-                user_id=user.get('user_id'),
-                booking_id=booking_id,
-                new_status=new_status,
-            )
+            # заявка, счетчик мест и статус объявления (Alive/Closed) фиксируются одним коммитом
+            async with self.uow:
+                _booking: layer_models.UpdatedBooking = await self.repo.update(
+                    user_id=user.get('user_id'),
+                    booking_id=booking_id,
+                    new_status=new_status,
+                    announce_statuses=announce_statuses,
+                )
+                if _booking.is_confirmed != _booking.was_confirmed:
+                    await self.announce_repo.move_seats(
+                        _booking.announcement_id,
+                        1 if _booking.is_confirmed else -1,
+                    )
+                # если статус не изменился - уведомление не отправляем
+                if _booking.is_changed:
+                    await self.notific_repo.send(
+                        event_type=layer_payload.EventType.booking_status,
+                        payload=self._status_payload(user, _booking),
+                    )
         except (exc.NoAccessError, exc.NotFoundError):
             raise
+        if _booking.is_changed:
+            await self.detail_cache.invalidate(_booking.announcement_id)
 
-        # проверяем кол-во свободных мест
-        confirmed_list = len(await self.repo.get_confirmed_list(_booking.announcement_id))
-        tickets_count = _announce.tickets_count
-        res = tickets_count - confirmed_list
-
-        # если появилось свободное место - объявление пререводим в статус Alive
-        if _announce.status == layer_models.EventStatus.Closed and res > 0:
-            await self.announce_repo.set_alive_status(_booking.announcement_id)
-
-        # если свободные места закончились - объявление пререводим в статус Closed
-        if _announce.status == layer_models.EventStatus.Alive and res == 0:
-            await self.announce_repo.set_closed_status(_booking.announcement_id)
-
+    @staticmethod
+    def _status_payload(user: dict, _booking: layer_models.PGBooking) -> layer_payload.StatusBooking:
         # определяем кому отправлять уведомление
         _user = _booking.guest_id
-        if perm == Permission.guest:
+        if str(user.get('user_id')) == str(_booking.guest_id):
             _user = _booking.author_id
 
-        # отправляем уведомление
-        payload = layer_payload.StatusBooking(
-            status_booking_id=booking_id,
-            announce_id=str(_announce.announce_id),
+        return layer_payload.StatusBooking(
+            status_booking_id=str(_booking.id),
+            announce_id=str(_booking.announcement_id),
             user_id=str(_user),
             another_id=user.get('user_id'),
         )
-        # TODO Развернуть сервис уведомлений
-        #await self.notific_repo.send(event_type=layer_payload.EventType.booking_status, payload=payload)
+
+    async def bulk_update(
+        self,
+        user: dict,
+        items: list[layer_payload.APIBulkUpdateItem],
+    ) -> list[layer_models.BulkUpdateResult]:
+        """
+        Изменить свой статус сразу в нескольких заявках.
+
+        Все изменения применяются одним UPDATE в одной транзакции, счетчик мест пересчитывается
+        один раз на объявление. Для повторяющихся id применяется последний статус.
+
+        :param user: информация о пользователе
+        :param items: id заявок и новые статусы
+        :return: результат по каждой заявке
+        :raises NoAccessError: если в объявлении не хватает свободных мест, пачка не применяется
+        """
+        statuses = {str(item.booking_id): item.my_status for item in items}
+        announce_statuses = None
+        if not settings.debug.DEBUG:
+            announce_statuses = [layer_models.EventStatus.Alive.value, layer_models.EventStatus.Closed.value]
+        try:
+            async with self.uow:
+                _bookings: list[layer_models.UpdatedBooking] = await self.repo.bulk_update(
+                    user_id=user.get('user_id'),
+                    statuses=statuses,
+                    announce_statuses=announce_statuses,
+                )
+                deltas: dict[str, int] = defaultdict(int)
+                for _booking in _bookings:
+                    if _booking.is_confirmed != _booking.was_confirmed:
+                        deltas[str(_booking.announcement_id)] += 1 if _booking.is_confirmed else -1
+                # объявления блокируются в порядке id
+                for announce_id, delta in sorted(deltas.items()):
+                    if delta:
+                        await self.announce_repo.move_seats(announce_id, delta)
+                # отличаем отсутствующие заявки от чужих одним запросом и только для не измененных
+                updated_ids = {str(_booking.id) for _booking in _bookings}
+                missing = [booking_id for booking_id in statuses if booking_id not in updated_ids]
+                existing = await self.repo.existing_ids(missing) if missing else set()
+                await self.notific_repo.send_many(
+                    layer_payload.EventType.booking_status,
+                    [self._status_payload(user, _booking) for _booking in _bookings if _booking.is_changed],
+                )
+        except exc.NoAccessError:
+            raise
+
+        await self.detail_cache.invalidate(*{_booking.announcement_id for _booking in _bookings if _booking.is_changed})
+        results = {booking_id: layer_models.BulkStatus.not_found for booking_id in statuses}
+        for booking_id in existing:
+            results[booking_id] = layer_models.BulkStatus.forbidden
+        for _booking in _bookings:
+            if not _booking.is_changed:
+                results[str(_booking.id)] = layer_models.BulkStatus.unchanged
+                continue
+            results[str(_booking.id)] = layer_models.BulkStatus.updated
+        logger.info(f'Bulk update bookings <{user.get("user_id")}>: <{len(_bookings)}> of <{len(statuses)}>')
+
+        return [
+            layer_models.BulkUpdateResult(booking_id=booking_id, result=result)
+            for booking_id, result in results.items()
+        ]
 
     async def delete(
         self,
@@ -270,71 +362,83 @@ class BookingService:
         :raises NotFoundError: если указаная запись не была найдена в базе
         :raises NoAccessError: если у пользователя нет прав на изменение заявки
         """
-        # проверяем что запись есть
+        # имя автора для оповещения запрашиваем до транзакции, чтобы не держать блокировку на время запроса в auth;
+        # если auth недоступен, заявка удаляется, а оповещение уходит без имени
         try:
-            _booking: layer_models.PGBooking = await self.repo.get_by_id(booking_id)
+            _current: layer_models.PGBooking = await self.repo.get_by_id(booking_id)
         except exc.NotFoundError:
             raise
+        _author: layer_models.UserToResponse | None = await self.user_repo.get_by_id(_current.author_id)
+        # только sudo и гость могут удалить заявку, права проверяются в WHERE того же DELETE
         try:
-            prem: Permission = await self._check_permissions(user, booking_id)
-            # только sudo и гость могут удалить заявку
-            if prem.value not in [
-                Permission.super.value,
-                Permission.guest.value,
-            ]:
-                raise exc.NoAccessError
-            await self.repo.delete(booking_id=booking_id)
+            async with self.uow:
+                _booking: layer_models.PGBooking = await self.repo.delete(
+                    booking_id=booking_id,
+                    user_id=user.get('user_id'),
+                    is_super=bool(user.get('claims').get('is_super')),
+                )
+                # подтвержденное место возвращается в объявление в той же транзакции
+                if _booking.author_status and _booking.guest_status:
+                    await self.announce_repo.move_seats(_booking.announcement_id, -1)
+                # оповещаем автора объявления
+                payload = layer_payload.DeleteBooking(
+                    del_booking_announce_id=str(_booking.announcement_id),
+                    guest_name=_author.user_name if _author else None,
+                    user_id=str(_booking.author_id),
+                )
+                await self.notific_repo.send(event_type=layer_payload.EventType.booking_delete, payload=payload)
         except (exc.NoAccessError, exc.NotFoundError):
             raise
-
-        # проверяем кол-во свободных мест
-        _announce: layer_models.AnnounceToResponse = await self.announce_repo.get_by_id(
-            _booking.announcement_id,
-        )
-        confirmed_list = len(await self.repo.get_confirmed_list(_booking.announcement_id))
-        tickets_count = _announce.tickets_count
-        res = tickets_count - confirmed_list
-
-        # если появилось свободное место - объявление пререводим в статус Alive
-        if _announce.status == layer_models.EventStatus.Closed and res > 0:
-            await self.announce_repo.set_alive_status(_booking.announcement_id)
-
-        # отправляем уведомление автороу объявления
-        _author: layer_models.UserToResponse = await self.user_repo.get_by_id(_booking.author_id)
-
-        payload = layer_payload.DeleteBooking(
-            del_booking_announce_id=str(_booking.announcement_id),
-            guest_name=_author.user_name,
-            user_id=str(_booking.author_id),
-        )
-        # TODO Развернуть сервис уведомлений
-        #await self.notific_repo.send(event_type=layer_payload.EventType.booking_delete, payload=payload)
+        await self.detail_cache.invalidate(_booking.announcement_id)
 
     async def get_multy(
         self,
         user: dict,
         query: layer_payload.APIMultyPayload,
-    ) -> list[layer_models.BookingResponse]:
+    ) -> layer_models.BookingPage:
         """Получение заявок по условию.
 
         :param user: информация о пользователе
         :param query: данные для фильтрации запроса к БД
-        :return: список заявок
+        :return: страница заявок
+        :raises ValueMissingError: если не указана роль пользователя
+        :raises InvalidCursorError: если курсор поврежден
         """
         try:
             return await self.repo.get_multy(query=query, user_id=user.get('user_id'))
-        except exc.ValueMissingError:
+        except (exc.ValueMissingError, exc.InvalidCursorError):
             raise
 
+    def stream_multy(
+        self,
+        user: dict,
+        query: layer_payload.APIMultyPayload,
+    ) -> AsyncIterator[bytes]:
+        """Выгрузка заявок по условию в NDJSON.
+
+        :param user: информация о пользователе
+        :param query: данные для фильтрации запроса к БД
+        :return: пачки строк NDJSON
+        :raises ValueMissingError: если не указана роль пользователя
+        :raises InvalidCursorError: если курсор поврежден
+        """
+        return self.repo.stream_multy(query=query, user_id=user.get('user_id'))
+
     async def sudo_get_multy(
         self,
         user: dict,
         query: layer_payload.SudoAPIMultyPayload,
-    ) -> list[layer_models.BookingResponse]:
+    ) -> layer_models.BookingPage:
         return await self.repo.sudo_get_multy(query=query)
 
+    def sudo_stream_multy(
+        self,
+        user: dict,
+        query: layer_payload.SudoAPIMultyPayload,
+    ) -> AsyncIterator[bytes]:
+        return self.repo.sudo_stream_multy(query=query)
+
 
-@lru_cache()
 def get_booking_service(
     repo: _protocols.BookingRepositoryProtocol = Depends(booking_repo.get_booking_repo),
     user_repo: _protocols.UserRepositoryProtocol = Depends(user_repo.get_user_repo),
@@ -342,6 +446,20 @@ def get_booking_service(
     rating_repo: _protocols.RatingRepositoryProtocol = Depends(rating_repo.get_rating_repo),
     announce_repo: _protocols.AnnouncementRepositoryProtocol = Depends(announce_repo.get_announcement_repo),
     notific_repo: _protocols.NotificRepositoryProtocol = Depends(notific_repo.get_notific_repo),
+    admission_repo: _protocols.AdmissionRepositoryProtocol = Depends(admission_repo.get_admission_repo),
+    uow: UnitOfWork = Depends(get_uow),
+    detail_cache: DetailCache = Depends(get_detail_cache),
     cache: CacheProtocol = Depends(get_cache),
 ) -> BookingService:
-    return BookingService(repo, user_repo, movie_repo, rating_repo, announce_repo, notific_repo, cache)
+    return BookingService(
+        repo,
+        user_repo,
+        movie_repo,
+        rating_repo,
+        announce_repo,
+        notific_repo,
+        admission_repo,
+        uow,
+        detail_cache,
+        cache,
+    )
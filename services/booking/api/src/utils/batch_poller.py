@@ -0,0 +1,52 @@
+import asyncio
+import contextlib
+from typing import Awaitable, Callable
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BatchPoller:
+    """
+    Основа фоновых процессов, которые обрабатывают таблицу пачками до остановки.
+
+    Полная пачка означает, что в таблице, скорее всего, есть еще строки, и следующая берется сразу.
+    Неполная - процесс ждет poll_sec или остановки. Ошибка пачки логируется и не останавливает процесс.
+    """
+
+    name = 'Batch poller'
+
+    def __init__(self) -> None:
+        self._stopped = asyncio.Event()
+
+    def stop(self) -> None:
+        logger.info(f'{self.name} stopping ...')
+        self._stopped.set()
+
+    async def poll(
+        self,
+        batch: Callable[[], Awaitable[int]],
+        batch_size: int,
+        poll_sec: float,
+        once: bool = False,
+    ) -> None:
+        """
+        Обрабатывать пачки до остановки.
+
+        :param batch: обработка одной пачки, возвращает число обработанных строк
+        :param batch_size: размер полной пачки
+        :param poll_sec: пауза после неполной пачки
+        :param once: завершиться после первой неполной пачки
+        """
+        while not self._stopped.is_set():
+            try:
+                count = await batch()
+            except Exception as ex:  # noqa: PIE786
+                logger.error(f'{self.name} error <{ex!r}>')
+                count = 0
+            if count < batch_size:
+                if once:
+                    break
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stopped.wait(), timeout=poll_sec)
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DataLoader:
+    """
+    Пакетная загрузка по ключам в рамках одного запроса.
+
+    Ключи, запрошенные через load в одной итерации event loop, собираются в одну пачку
+    и передаются в batch_load одним вызовом. Повторные ключи не запрашиваются повторно.
+    """
+
+    def __init__(self, batch_load: Callable[[list[str]], Awaitable[dict[str, Any]]]) -> None:
+        self._batch_load = batch_load
+        self._futures: dict[str, asyncio.Future] = {}
+        self._queue: list[str] = []
+
+    def load(self, key: str | UUID) -> asyncio.Future:
+        """
+        Запросить значение по ключу.
+
+        :param key: ключ, например id пользователя
+        :return: future со значением или None, если значение не найдено
+        """
+        key = str(key)
+        if key not in self._futures:
+            loop = asyncio.get_running_loop()
+            self._futures[key] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+            self._queue.append(key)
+        return self._futures[key]
+
+    async def load_many(self, keys: list[str | UUID]) -> list[Any]:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    async def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        logger.info(f'DataLoader batch <{len(keys)}>')
+        try:
+            values = await self._batch_load(keys)
+        except Exception as ex:  # noqa: PIE786
+            for key in keys:
+                if not self._futures[key].done():
+                    self._futures[key].set_exception(ex)
+            return
+        for key in keys:
+            if not self._futures[key].done():
+                self._futures[key].set_result(values.get(key))
@@ -0,0 +1,99 @@
+from uuid import UUID
+
+from redis import asyncio as aioredis
+
+from core.config import settings
+from core.container import container
+from core.logger import get_logger
+from db.redis import get_redis
+
+logger = get_logger(__name__)
+
+# KEYS[1] - версия объявления, KEYS[2] - документ (hash: v - версия, doc - orjson).
+# ARGV[1] - версия, прочитанная до сборки документа, ARGV[2] - документ, ARGV[3] - TTL документа.
+# Документ записывается, только если за время сборки версия не изменилась.
+SET_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+if version ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[2], 'v', version, 'doc', ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if version ~= '0' then
+    redis.call('EXPIRE', KEYS[1], 2 * tonumber(ARGV[3]))
+end
+return 1
+"""
+
+
+class DetailCache:
+    """
+    Готовые (orjson) документы DetailAnnouncementResponse с версиями.
+
+    Любое изменение объявления или его заявок увеличивает версию объявления. Документ отдается,
+    только если записан для текущей версии, а записывается сравнением версии внутри Redis,
+    поэтому запрос, собравший документ до изменения, не может оставить в кэше устаревшие данные.
+    Инвалидация выполняется после коммита изменения.
+    """
+
+    def __init__(self, redis: aioredis.Redis) -> None:
+        self.redis = redis
+        self._set = redis.register_script(SET_SCRIPT)
+
+    @staticmethod
+    def _keys(announce_id: str | UUID) -> tuple[str, str]:
+        return f'announce:version:{announce_id}', f'announce:detail:{announce_id}'
+
+    async def get(self, announce_id: str | UUID) -> tuple[str, bytes | None]:
+        """
+        Получение документа одним запросом в Redis.
+
+        :param announce_id: id объявления
+        :return: текущая версия и документ, если он записан для этой версии
+        """
+        version_key, doc_key = self._keys(announce_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(version_key)
+            pipe.hmget(doc_key, 'v', 'doc')
+            version, (doc_version, doc) = await pipe.execute()
+        version = (version or b'0').decode()
+        if doc is None or doc_version.decode() != version:
+            return version, None
+        return version, doc
+
+    async def set(self, announce_id: str | UUID, version: str, doc: bytes) -> None:
+        """
+        Записать документ, если версия не изменилась с момента чтения.
+
+        :param announce_id: id объявления
+        :param version: версия из get
+        :param doc: документ
+        """
+        written = await self._set(
+            keys=list(self._keys(announce_id)),
+            args=[version, doc, settings.detail_cache.TTL_SEC],
+        )
+        if not written:
+            logger.info(f'[-] Detail document is outdated <{announce_id}>: <{version}>')
+
+    async def invalidate(self, *announce_ids: str | UUID) -> None:
+        """
+        Увеличить версию объявлений и удалить их документы.
+
+        :param announce_ids: id объявлений
+        """
+        if not announce_ids:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for announce_id in set(map(str, announce_ids)):
+                version_key, doc_key = self._keys(announce_id)
+                pipe.incr(version_key)
+                pipe.expire(version_key, 2 * settings.detail_cache.TTL_SEC)
+                pipe.delete(doc_key)
+            await pipe.execute()
+        logger.info(f'Invalidate announcement details <{announce_ids}>')
+
+
+@container.singleton
+def get_detail_cache() -> DetailCache:
+    return DetailCache(get_redis())
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+import utils.exceptions as exc
+from core.config import settings
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Enrichment:
+    """
+    Граф запросов для обогащения ответа данными из Redis и внешних сервисов.
+
+    Независимые запросы выполняются конкурентно, запросы с одинаковым ключом выполняются один раз,
+    а на весь граф действует общий бюджет времени, который отсчитывается от создания объекта.
+    """
+
+    def __init__(self, budget: float = settings.enrichment.BUDGET_SEC) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._deadline = self._loop.time() + budget
+        self._tasks: dict[Hashable, asyncio.Future] = {}
+        self._chains: list[asyncio.Future] = []
+
+    def load(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Запланировать запрос.
+
+        :param key: ключ запроса, например 'user:<id>'
+        :param factory: функция, которая возвращает корутину запроса
+        :return: задача, повторный вызов с тем же ключом вернет уже запущенную задачу
+        """
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.ensure_future(factory())
+        return self._tasks[key]
+
+    def then(self, parent: Awaitable[Any], factory: Callable[[Any], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Запланировать запрос, который зависит от результата другого запроса.
+
+        :param parent: задача, результат которой нужен запросу
+        :param factory: функция, которая по результату parent возвращает корутину запроса
+        :return: задача
+        """
+
+        async def _chain() -> Any:
+            return await factory(await parent)
+
+        task = asyncio.ensure_future(_chain())
+        self._chains.append(task)
+        return task
+
+    async def gather(self, *tasks: Awaitable[Any]) -> list[Any]:
+        """
+        Дождаться результатов запросов в рамках бюджета времени.
+
+        :param tasks: задачи, полученные из load или then
+        :return: результаты в порядке задач
+        :raises DeadlineExceededError: если бюджет времени исчерпан
+        """
+        timeout = max(self._deadline - self._loop.time(), 0)
+        try:
+            return await asyncio.wait_for(asyncio.gather(*tasks), timeout=timeout)
+        except asyncio.TimeoutError as ex:
+            logger.info(f'[-] Enrichment deadline exceeded <{list(self._tasks)}>')
+            raise exc.DeadlineExceededError from ex
+        finally:
+            for task in [*self._tasks.values(), *self._chains]:
+                if not task.done():
+                    task.cancel()
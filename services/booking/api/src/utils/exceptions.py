@@ -12,3 +12,27 @@ class UniqueConstraintError(Exception):
 
 class ValueMissingError(Exception):
     ...
+
+
+class DeadlineExceededError(Exception):
+    ...
+
+
+class InvalidCursorError(Exception):
+    ...
+
+
+class CapacityExceededError(Exception):
+    ...
+
+
+class IdempotencyConflictError(Exception):
+    ...
+
+
+class IdempotencyKeyReuseError(Exception):
+    ...
+
+
+class UpstreamUnavailableError(Exception):
+    ...
@@ -0,0 +1,135 @@
+import asyncio
+from http import HTTPStatus
+from typing import Any
+
+import aiohttp
+from aiohttp.client_exceptions import ClientError, ClientResponseError
+
+from core.config import settings
+from core.container import container
+from core.logger import get_logger
+from utils.auth import _headers
+
+logger = get_logger(__name__)
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для обращений к другим сервисам.
+
+    Одна сессия aiohttp на процесс: соединения переиспользуются (keep-alive), число соединений
+    ограничено всего и на хост, DNS кэшируется. Ошибки соединения, таймауты и ответы 5xx
+    повторяются с экспоненциальной задержкой, ответы 4xx - нет.
+    """
+
+    def __init__(self) -> None:
+        self._session: aiohttp.ClientSession | None = None
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+        self._in_flight = 0
+
+    def _connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=settings.http_client.LIMIT,
+            limit_per_host=settings.http_client.LIMIT_PER_HOST,
+            keepalive_timeout=settings.http_client.KEEPALIVE_SEC,
+            ttl_dns_cache=settings.http_client.DNS_TTL_SEC,
+        )
+
+    async def start(self) -> None:
+        """Создание сессии, вызывается при старте приложения."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=self._connector(),
+                headers=_headers(),
+                timeout=aiohttp.ClientTimeout(
+                    total=settings.http_client.TOTAL_TIMEOUT_SEC,
+                    connect=settings.http_client.CONNECT_TIMEOUT_SEC,
+                ),
+            )
+            logger.info('HttpClient started')
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError('HttpClient is not started')
+        return self._session
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> Any:
+        async with self.session.request(method, url, **kwargs) as resp:
+            resp.raise_for_status()
+            if resp.content_type == 'application/json':
+                return await resp.json()
+            return await resp.read()
+
+    async def request(self, method: str, url: str, retries: int | None = None, **kwargs: Any) -> Any:
+        """
+        Запрос с повторами.
+
+        :param method: HTTP-метод
+        :param url: адрес
+        :param retries: число повторов, по умолчанию settings.http_client.RETRIES
+        :param kwargs: параметры aiohttp (json, params, timeout ...)
+        :return: тело ответа (json или bytes)
+        :raises ClientError: если запрос не удался после всех повторов
+        """
+        retries = settings.http_client.RETRIES if retries is None else retries
+        self._requests += 1
+        self._in_flight += 1
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    return await self._request(method, url, **kwargs)
+                except ClientResponseError as ex:
+                    if ex.status < HTTPStatus.INTERNAL_SERVER_ERROR or attempt == retries:
+                        self._errors += 1
+                        raise
+                    logger.info(f'[-] Retry <{method} {url}>: <{ex.status}>')
+                except (ClientError, asyncio.TimeoutError) as ex:
+                    if attempt == retries:
+                        self._errors += 1
+                        raise ClientError(str(ex)) from ex
+                    logger.info(f'[-] Retry <{method} {url}>: <{ex!r}>')
+                self._retries += 1
+                await asyncio.sleep(settings.http_client.RETRY_BACKOFF_SEC * 2**attempt)
+        finally:
+            self._in_flight -= 1
+
+    async def get(self, url: str, **kwargs: Any) -> Any:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> Any:
+        return await self.request('POST', url, **kwargs)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Статистика пула соединений и запросов.
+
+        :return: лимиты, занятые и свободные соединения, счетчики запросов
+        """
+        data = {
+            'requests': self._requests,
+            'retries': self._retries,
+            'errors': self._errors,
+            'in_flight': self._in_flight,
+            'limit': settings.http_client.LIMIT,
+            'limit_per_host': settings.http_client.LIMIT_PER_HOST,
+            'acquired': 0,
+            'idle': 0,
+        }
+        if self._session is not None and not self._session.closed:
+            connector = self._session.connector
+            data['acquired'] = len(connector._acquired)
+            data['idle'] = sum(len(conns) for conns in connector._conns.values())
+        return data
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            logger.info(f'HttpClient closed: <{self.stats()}>')
+
+
+@container.singleton
+def get_http_client() -> HttpClient:
+    return HttpClient()
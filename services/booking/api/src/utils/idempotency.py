@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable
+
+import orjson
+from pydantic import BaseModel
+
+import utils.exceptions as exc
+from core.config import settings
+from core.container import container
+from core.logger import get_logger
+from db.redis import CacheProtocol, get_cache
+
+logger = get_logger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Отпечаток запроса: одинаковые параметры дают одинаковую строку.
+
+    :param parts: параметры запроса, сериализуемые orjson
+    :return: sha256 от параметров
+    """
+    return hashlib.sha256(orjson.dumps(parts, default=str, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class Idempotency:
+    """
+    Обработка заголовка Idempotency-Key.
+
+    Первый запрос с ключом занимает его в Redis (SET NX) и выполняется, ответ сохраняется
+    на settings.idempotency.TTL_SEC. Повторы получают сохраненный ответ одним чтением из кэша.
+    Конкурентные повторы в том же процессе ждут выполнения первого запроса, в других процессах -
+    опрашивают кэш до settings.idempotency.WAIT_SEC.
+    """
+
+    def __init__(self, cache: CacheProtocol) -> None:
+        self.cache = cache
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def _wait_for_other(self, key: str, _fingerprint: str) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.idempotency.WAIT_SEC
+        while loop.time() < deadline:
+            await asyncio.sleep(settings.idempotency.POLL_SEC)
+            record = await self.cache.get(key)
+            if record is None:
+                break
+            if record.get('state') == DONE:
+                return self._replay(key, record, _fingerprint)
+        logger.info(f'[-] Idempotency key is still in progress <{key}>')
+        raise exc.IdempotencyConflictError
+
+    @staticmethod
+    def _replay(key: str, record: dict, _fingerprint: str) -> dict:
+        if record.get('fingerprint') != _fingerprint:
+            logger.info(f'[-] Idempotency key reused with other parameters <{key}>')
+            raise exc.IdempotencyKeyReuseError
+        logger.info(f'Idempotency replay <{key}>')
+        return record.get('response')
+
+    async def _execute(
+        self,
+        key: str,
+        _fingerprint: str,
+        factory: Callable[[], Awaitable[BaseModel]],
+    ) -> BaseModel | dict:
+        record = await self.cache.get(key)
+        if record is not None and record.get('state') == DONE:
+            return self._replay(key, record, _fingerprint)
+        acquired = await self.cache.set_nx(
+            key,
+            {'state': PENDING, 'fingerprint': _fingerprint},
+            exp=settings.idempotency.LOCK_TTL_SEC,
+        )
+        if not acquired:
+            return await self._wait_for_other(key, _fingerprint)
+        try:
+            response = await factory()
+        except Exception:
+            # ключ освобождается, повтор выполнит запрос заново
+            await self.cache.delete(key)
+            raise
+        await self.cache.set(
+            key,
+            {'state': DONE, 'fingerprint': _fingerprint, 'response': response.dict()},
+            exp=settings.idempotency.TTL_SEC,
+        )
+        return response
+
+    async def run(
+        self,
+        key: str,
+        _fingerprint: str,
+        factory: Callable[[], Awaitable[BaseModel]],
+    ) -> BaseModel | dict:
+        """
+        Выполнить запрос не больше одного раза на ключ.
+
+        :param key: ключ идемпотентности с областью действия (эндпоинт, пользователь)
+        :param _fingerprint: отпечаток параметров запроса
+        :param factory: выполнение запроса
+        :return: ответ запроса или сохраненный ответ первого запроса
+        :raises IdempotencyConflictError: если запрос с тем же ключом еще выполняется
+        :raises IdempotencyKeyReuseError: если ключ уже использован с другими параметрами
+        """
+        key = f'idempotency:{key}'
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            response, owner_fingerprint = await asyncio.shield(inflight)
+            if owner_fingerprint != _fingerprint:
+                raise exc.IdempotencyKeyReuseError
+            return response
+
+        # будущее регистрируется до первого await, чтобы конкурентные повторы в процессе ждали его
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._execute(key, _fingerprint, factory)
+        except Exception as ex:
+            future.set_exception(ex)
+            # ожидающих может не быть, помечаем исключение как полученное
+            future.exception()
+            raise
+        else:
+            future.set_result((response, _fingerprint))
+            return response
+        finally:
+            if not future.done():
+                # запрос отменен (CancelledError не наследует Exception): результат неизвестен,
+                # ожидающие повторы получают конфликт вместо бесконечного ожидания
+                future.set_exception(exc.IdempotencyConflictError())
+                future.exception()
+            self._inflight.pop(key, None)
+
+
+@container.singleton
+def get_idempotency() -> Idempotency:
+    return Idempotency(get_cache())
@@ -0,0 +1,44 @@
+import base64
+from datetime import datetime
+from typing import Any, Callable
+from uuid import UUID
+
+import orjson
+
+import utils.exceptions as exc
+
+_PARSERS: dict[type, Callable[[Any], Any]] = {
+    datetime: datetime.fromisoformat,
+    UUID: UUID,
+    float: float,
+    int: int,
+    str: str,
+}
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Курсор keyset-пагинации: значения ключа сортировки последней записи страницы.
+
+    :param values: значения ключа сортировки, например (created, id)
+    :return: непрозрачная строка для клиента
+    """
+    return base64.urlsafe_b64encode(orjson.dumps(values, default=str)).decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    """
+    Разбор курсора keyset-пагинации.
+
+    :param cursor: строка, полученная из encode_cursor
+    :param types: типы значений ключа сортировки, например (datetime, UUID)
+    :return: значения ключа сортировки
+    :raises InvalidCursorError: если курсор поврежден или не соответствует ключу сортировки
+    """
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            raise exc.InvalidCursorError
+        return tuple(_PARSERS[_type](value) for _type, value in zip(types, values))
+    except (orjson.JSONDecodeError, TypeError, ValueError) as ex:
+        raise exc.InvalidCursorError from ex
@@ -0,0 +1,130 @@
+import asyncio
+import math
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from core.config import settings
+from core.logger import get_logger
+from db.redis import CacheProtocol
+
+logger = get_logger(__name__)
+
+
+class SingleFlight:
+    """
+    Объединение одновременных промахов кэша по одному ключу в один запрос к сервису.
+
+    В процессе конкурентные вызовы с тем же ключом ждут уже запущенную загрузку. Запрос выполняется
+    отдельной задачей, поэтому отмена запроса, который ее запустил, не отменяет загрузку для остальных.
+    С settings.single_flight.LOCK загрузку между процессами сериализует короткая блокировка в Redis:
+    остальные процессы опрашивают кэш, пока владелец блокировки его не заполнит. Ключ блокировки
+    включает namespace (префикс кэша), снимает ее только владелец.
+    """
+
+    def __init__(self, lock_cache: CacheProtocol | None = None, namespace: str = '') -> None:
+        self.lock_cache = lock_cache
+        self.namespace = namespace
+        self._owner = uuid4().hex
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _done(self, key: str, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            self._inflight.pop(key)
+        # ожидающих может не быть, помечаем исключение как полученное
+        if not future.cancelled():
+            future.exception()
+
+    @staticmethod
+    def _lock_ttl() -> int:
+        # блокировка не должна истечь раньше, чем завершится загрузка со всеми повторами
+        return max(settings.single_flight.LOCK_TTL_SEC, math.ceil(settings.http_client.worst_case_sec) + 1)
+
+    async def _load(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        recheck: Callable[[], Awaitable[Any]] | None,
+    ) -> Any:
+        if not settings.single_flight.LOCK or self.lock_cache is None or recheck is None:
+            return await fetch()
+        lock = f'lock:{self.namespace}:{key}'
+        if await self.lock_cache.set_nx(lock, self._owner, exp=self._lock_ttl()):
+            try:
+                return await fetch()
+            finally:
+                # после истечения блокировку мог занять другой процесс, ее нельзя удалять
+                await self.lock_cache.delete_if(lock, self._owner)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.single_flight.WAIT_SEC
+        while loop.time() < deadline:
+            await asyncio.sleep(settings.single_flight.POLL_SEC)
+            value = await recheck()
+            if value is not None:
+                return value
+        logger.info(f'[-] SingleFlight lock wait expired <{lock}>')
+        return await fetch()
+
+    async def do(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        recheck: Callable[[], Awaitable[Any]] | None = None,
+    ) -> Any:
+        """
+        Загрузить значение не больше одного раза на ключ среди одновременных вызовов.
+
+        :param key: ключ, например id пользователя
+        :param fetch: загрузка из сервиса с записью в кэш
+        :param recheck: чтение из кэша, нужно для ожидания загрузки в другом процессе
+        :return: результат fetch или значение, записанное в кэш другим процессом
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, fetch, recheck))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _future: self._done(key, _future))
+        return await asyncio.shield(future)
+
+    async def do_many(
+        self,
+        keys: list[str],
+        fetch_many: Callable[[list[str]], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        """
+        Загрузить значения пачкой: ключи, которые уже загружаются, не запрашиваются повторно.
+
+        :param keys: ключи
+        :param fetch_many: загрузка пачки из сервиса с записью в кэш
+        :return: словарь ключ -> значение, ненайденные ключи отсутствуют
+        """
+        loop = asyncio.get_running_loop()
+        keys = list(dict.fromkeys(keys))
+        own = [key for key in keys if key not in self._inflight]
+        if own:
+            batch = asyncio.ensure_future(fetch_many(own))
+            for key in own:
+                future = loop.create_future()
+                self._inflight[key] = future
+                future.add_done_callback(lambda _future, key=key: self._done(key, _future))
+            batch.add_done_callback(lambda _batch: self._resolve(own, _batch))
+
+        # до первого await все ключи остаются в _inflight: колбэки завершения выполняются через call_soon
+        futures = [self._inflight[key] for key in keys]
+        values = await asyncio.shield(asyncio.gather(*futures, return_exceptions=True))
+        for value in values:
+            if isinstance(value, BaseException):
+                raise value
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def _resolve(self, keys: list[str], batch: asyncio.Future) -> None:
+        for key in keys:
+            future = self._inflight.get(key)
+            if future is None or future.done():
+                continue
+            if batch.cancelled():
+                future.cancel()
+            elif batch.exception() is not None:
+                future.set_exception(batch.exception())
+            else:
+                future.set_result(batch.result().get(key))
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable
+
+from aiohttp.client_exceptions import ClientError, ClientResponseError
+
+import utils.exceptions as exc
+from core.config import settings
+from core.logger import get_logger
+from db.redis import CacheProtocol
+from utils.single_flight import SingleFlight
+
+logger = get_logger(__name__)
+
+
+class StaleWhileRevalidate:
+    """
+    Кэш ответов других сервисов с мягким и жестким TTL.
+
+    Запись хранит значение и время, до которого оно свежее (мягкий TTL), а в Redis живет до жесткого TTL.
+    Свежая запись отдается как есть, устаревшая - тоже отдается сразу, а обновление идет в фоне.
+    Запрос в сервис выполняется только при отсутствии записи.
+
+    Отсутствие значения ("не найдено") кэшируется на settings.stale_cache.NEGATIVE_TTL_SEC, ошибка сервиса -
+    на ERROR_TTL_SEC. Если при ошибке есть устаревшее значение, оно остается в кэше и отдается дальше,
+    следующая попытка обновления - не раньше чем через ERROR_TTL_SEC. Запись об ошибке без значения
+    помечается, чтобы отличать недоступность сервиса от отсутствия объекта. Загрузки по одному ключу
+    объединяются через SingleFlight.
+    """
+
+    def __init__(self, cache: CacheProtocol, single_flight: SingleFlight, prefix: str) -> None:
+        self.cache = cache
+        self.single_flight = single_flight
+        self.prefix = prefix
+        self._refreshing: set[asyncio.Future] = set()
+
+    def _key(self, _id: str) -> str:
+        return f'{self.prefix}:{_id}'
+
+    @staticmethod
+    def _entry(value: dict | None, ttl: float, unavailable: bool = False) -> dict:
+        entry = {'v': value, 'fresh_until': time.time() + ttl}
+        if unavailable:
+            entry['unavailable'] = True
+        return entry
+
+    @staticmethod
+    def _valid(entry: Any) -> bool:
+        # записи старого формата (без мягкого TTL) считаются промахом
+        return isinstance(entry, dict) and 'fresh_until' in entry
+
+    def _on_value(self, value: dict | None) -> tuple[dict, int]:
+        if value is None:
+            ttl = settings.stale_cache.NEGATIVE_TTL_SEC
+            return self._entry(None, ttl), ttl
+        return self._entry(value, settings.stale_cache.SOFT_TTL_SEC), settings.stale_cache.HARD_TTL_SEC
+
+    def _on_error(self, ex: Exception, stale: dict | None) -> tuple[dict, int]:
+        if isinstance(ex, ClientResponseError) and ex.status == HTTPStatus.NOT_FOUND:
+            return self._on_value(None)
+        if stale is not None:
+            return self._entry(stale['v'], settings.stale_cache.ERROR_TTL_SEC), settings.stale_cache.HARD_TTL_SEC
+        ttl = settings.stale_cache.ERROR_TTL_SEC
+        return self._entry(None, ttl, unavailable=True), ttl
+
+    def _background(self, coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._refreshing.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Future) -> None:
+        self._refreshing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f'[-] Background refresh failed <{self.prefix}>: <{task.exception()!r}>')
+
+    async def _recheck(self, _id: str) -> dict | None:
+        entry = await self.cache.get(self._key(_id))
+        return entry if self._valid(entry) else None
+
+    async def _load(self, _id: str, fetch: Callable[[str], Awaitable[dict | None]], stale: dict | None) -> dict:
+        try:
+            entry, exp = self._on_value(await fetch(_id))
+        except (ClientError, asyncio.TimeoutError) as ex:
+            logger.info(f'[-] Fetch failed <{self._key(_id)}>: <{ex!r}>, stale <{stale is not None}>')
+            entry, exp = self._on_error(ex, stale)
+        await self.cache.set(self._key(_id), entry, exp=exp)
+        return entry
+
+    async def _load_many(
+        self,
+        ids: list[str],
+        fetch_many: Callable[[list[str]], Awaitable[dict[str, dict]]],
+        stale: dict[str, dict],
+    ) -> dict[str, dict]:
+        try:
+            values = await fetch_many(ids)
+            loaded = {_id: self._on_value(values.get(_id)) for _id in ids}
+        except (ClientError, asyncio.TimeoutError) as ex:
+            logger.info(f'[-] Fetch failed <{self.prefix}> <{len(ids)}>: <{ex!r}>, stale <{len(stale)}>')
+            loaded = {_id: self._on_error(ex, stale.get(_id)) for _id in ids}
+        by_exp: dict[int, dict[str, dict]] = {}
+        for _id, (entry, exp) in loaded.items():
+            by_exp.setdefault(exp, {})[self._key(_id)] = entry
+        for exp, entries in by_exp.items():
+            await self.cache.set_many(entries, exp=exp)
+        return {_id: entry for _id, (entry, _) in loaded.items()}
+
+    async def get(
+        self,
+        _id: str,
+        fetch: Callable[[str], Awaitable[dict | None]],
+        strict: bool = False,
+    ) -> dict | None:
+        """
+        Получение значения по id.
+
+        :param _id: id объекта
+        :param fetch: запрос в сервис, None - объект не найден
+        :param strict: не скрывать недоступность сервиса, нужно путям записи
+        :return: значение или None, если объект не найден (или, без strict, сервис недоступен и значения в кэше нет)
+        :raises UpstreamUnavailableError: если strict, сервис недоступен и значения в кэше нет
+        """
+        entry = await self._recheck(_id)
+        if entry is None:
+            entry = await self.single_flight.do(
+                _id,
+                lambda: self._load(_id, fetch, None),
+                recheck=lambda: self._recheck(_id),
+            )
+        elif entry['fresh_until'] < time.time():
+            self._background(self.single_flight.do(_id, lambda: self._load(_id, fetch, entry)))
+        if strict and entry.get('unavailable'):
+            raise exc.UpstreamUnavailableError
+        return entry['v']
+
+    async def get_many(
+        self,
+        ids: list[str],
+        fetch_many: Callable[[list[str]], Awaitable[dict[str, dict]]],
+    ) -> dict[str, dict]:
+        """
+        Получение значений пачкой: один MGET и не больше одного запроса в сервис на промахи.
+
+        :param ids: id объектов
+        :param fetch_many: пакетный запрос в сервис, ненайденные объекты отсутствуют в ответе
+        :return: словарь id -> значение, ненайденные и недоступные объекты отсутствуют
+        """
+        ids = list(dict.fromkeys(ids))
+        entries = await self.cache.get_many([self._key(_id) for _id in ids])
+        now = time.time()
+        found, stale, misses = {}, {}, []
+        for _id, entry in zip(ids, entries):
+            if not self._valid(entry):
+                misses.append(_id)
+                continue
+            found[_id] = entry
+            if entry['fresh_until'] < now:
+                stale[_id] = entry
+        logger.info(f'Get <{self.prefix}> from cache <{len(found)}>, stale <{len(stale)}>, misses <{len(misses)}>')
+
+        if stale:
+            self._background(
+                self.single_flight.do_many(list(stale), lambda _ids: self._load_many(_ids, fetch_many, stale)),
+            )
+        if misses:
+            found |= await self.single_flight.do_many(misses, lambda _ids: self._load_many(_ids, fetch_many, {}))
+        return {_id: entry['v'] for _id, entry in found.items() if entry['v'] is not None}
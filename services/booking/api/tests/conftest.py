@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from core.config import settings  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def pg_engine():
+    """
+    Синхронный движок к Postgres из settings.postgres.
+
+    Тесты, которым нужна БД, пропускаются, если Postgres недоступен.
+    """
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+    pytest.importorskip('psycopg2')
+    engine = sqlalchemy.create_engine(settings.postgres.uri, connect_args={'connect_timeout': 2})
+    try:
+        with engine.connect():
+            pass
+    except sqlalchemy.exc.OperationalError as ex:
+        pytest.skip(f'Postgres is not available: {ex.orig}')
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def scratch_engine(pg_engine):
+    """
+    Движок к отдельной временной БД со схемой моделей объявлений и расширениями cube/earthdistance.
+
+    БД создается рядом с settings.postgres.DB и удаляется после тестов.
+    """
+    import sqlalchemy
+
+    from db.models.announcement import Base
+
+    name = f'{settings.postgres.DB}_scratch_test'
+    admin = pg_engine.execution_options(isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
+        try:
+            conn.exec_driver_sql(f'CREATE DATABASE "{name}"')
+        except sqlalchemy.exc.ProgrammingError as ex:
+            pytest.skip(f'Cannot create scratch database: {ex.orig}')
+    engine = sqlalchemy.create_engine(pg_engine.url.set(database=name))
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS cube')
+        conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS earthdistance')
+        Base.metadata.create_all(conn)
+    yield engine
+    engine.dispose()
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import pytest
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from core.config import settings
+from db.uow import UnitOfWork
+from services.announcement import layer_payload
+from services.announcement.repositories.announce_repo import AnnounceSqlachemyRepository
+from utils.pagination import encode_cursor
+
+ROWS = 200_000
+PAGE = 20
+ALIVE_INDEX = 'ix_announcements_alive_event_time_id'
+AUTHOR_INDEX = 'ix_announcements_author_id_event_time_id'
+
+# большая часть таблицы - завершенные события, как в растущей базе
+SEED = f"""
+INSERT INTO announcements (
+    id, status, title, description, movie_id, author_id, sub_only, is_free, tickets_count,
+    seats_confirmed, event_time, event_location, created, modified, duration, lat, lon
+)
+SELECT
+    md5('announce' || i)::uuid,
+    (CASE WHEN i % 10 = 0 THEN 'Alive' WHEN i % 20 = 1 THEN 'Closed' WHEN i % 20 = 2 THEN 'Created' ELSE 'Done' END)
+        ::eventstatus,
+    'title ' || i,
+    'description ' || i,
+    md5('movie' || (i % 500))::uuid,
+    md5('author' || (i % 2000))::uuid,
+    i % 3 = 0,
+    i % 2 = 0,
+    1 + i % 10,
+    0,
+    now() - interval '100 days' + i * interval '1 minute',
+    'location ' || (i % 100),
+    now(),
+    now(),
+    60,
+    55 + random() * 5,
+    35 + random() * 5
+FROM generate_series(1, {ROWS}) AS i
+"""
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: ClauseElement) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _explain(element: Explain, compiler, **kw) -> str:
+    return f'EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}'
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _nodes(child)
+
+
+@pytest.fixture(scope='module')
+def explain(scratch_engine, monkeypatch_module):
+    monkeypatch_module.setattr(settings.debug, 'DEBUG', False)
+    with scratch_engine.begin() as conn:
+        conn.exec_driver_sql('TRUNCATE announcements CASCADE')
+        conn.exec_driver_sql(SEED)
+    with scratch_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('VACUUM ANALYZE announcements')
+    repo = AnnounceSqlachemyRepository(UnitOfWork(None), cache=None)
+
+    def _explain_query(**filters) -> list[dict]:
+        query = layer_payload.APIMultyPayload(radius_km=10, size=PAGE, **filters)
+        statement = repo._multy_query(query, None).limit(PAGE + 1)
+        with scratch_engine.connect() as conn:
+            plan = conn.execute(Explain(statement)).scalar()[0]['Plan']
+        return list(_nodes(plan))
+
+    return _explain_query
+
+
+@pytest.fixture(scope='module')
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as patch:
+        yield patch
+
+
+def _announcement_scans(nodes: list[dict]) -> list[dict]:
+    return [node for node in nodes if node.get('Relation Name') == 'announcements']
+
+
+def _assert_index(nodes: list[dict], index: str) -> None:
+    scans = _announcement_scans(nodes)
+    assert scans, nodes
+    assert all(node['Node Type'] != 'Seq Scan' for node in scans), scans
+    assert any(node.get('Index Name') == index for node in scans), scans
+
+
+def test_first_page_uses_alive_index(explain):
+    _assert_index(explain(), ALIVE_INDEX)
+
+
+def test_keyset_page_uses_alive_index(explain):
+    cursor = encode_cursor(datetime.now(timezone.utc) - timedelta(days=30), UUID(int=0))
+    _assert_index(explain(cursor=cursor), ALIVE_INDEX)
+
+
+def test_date_range_uses_alive_index(explain):
+    date_from = datetime.now(timezone.utc) - timedelta(days=20)
+    _assert_index(explain(date_from=date_from, date_to=date_from + timedelta(days=2)), ALIVE_INDEX)
+
+
+def test_boolean_filter_reaches_sql(explain):
+    nodes = explain(free=True)
+    _assert_index(nodes, ALIVE_INDEX)
+    assert any('is_free' in node.get('Filter', '') for node in _announcement_scans(nodes)), nodes
+
+
+def test_author_filter_has_no_seq_scan(explain):
+    author = str(UUID(bytes=bytes.fromhex('00' * 16)))
+    scans = _announcement_scans(explain(author=author))
+    assert scans and all(node['Node Type'] != 'Seq Scan' for node in scans), scans
@@ -0,0 +1,160 @@
+import asyncio
+import gc
+import logging
+import tracemalloc
+import weakref
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from core.container import Container, container
+from db.pg_db import get_session
+from services.announcement.service.announcement import AnnouncementService, get_announcement_service
+from services.booking.service.booking import BookingService, get_booking_service
+
+REQUESTS = 3000
+MEASURED = 1000
+
+
+class FakeSession:
+    """Сессия без БД: считает открытые экземпляры, чтобы поймать удержание сессий между запросами."""
+
+    alive: 'weakref.WeakSet[FakeSession]' = weakref.WeakSet()
+    opened = 0
+    closed = 0
+
+    def __init__(self) -> None:
+        FakeSession.alive.add(self)
+        FakeSession.opened += 1
+
+    async def close(self) -> None:
+        FakeSession.closed += 1
+
+
+async def fake_session():
+    session = FakeSession()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+@pytest.fixture
+def quiet_logs():
+    # записи логов, перехваченные pytest, растут с числом запросов и искажают замер памяти
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def app():
+    _app = FastAPI()
+    seen = {'booking': [], 'announcement': []}
+
+    @_app.get('/probe')
+    async def probe(
+        booking_service: BookingService = Depends(get_booking_service),
+        announcement_service: AnnouncementService = Depends(get_announcement_service),
+    ) -> dict:
+        seen['booking'].append(booking_service)
+        seen['announcement'].append(announcement_service)
+        # внутри запроса сервисы и репозитории делят одну единицу работы
+        assert booking_service.repo.uow is booking_service.uow
+        assert announcement_service.repo.uow is announcement_service.uow
+        return {}
+
+    _app.dependency_overrides[get_session] = fake_session
+    _app.state.seen = seen
+    return _app
+
+
+def test_singleton_identity_and_shutdown_order():
+    _container = Container()
+    closed = []
+
+    class Client:
+        def __init__(self, name: str) -> None:
+            self.name = name
+
+        async def close(self) -> None:
+            closed.append(self.name)
+
+    @_container.singleton
+    def get_first() -> Client:
+        return Client('first')
+
+    @_container.singleton
+    def get_second() -> Client:
+        get_first()
+        return Client('second')
+
+    assert get_second() is get_second()
+    assert get_first() is get_first()
+
+    asyncio.run(_container.shutdown())
+    assert closed == ['second', 'first']
+    assert get_first() is not None and len(_container._instances) == 1
+
+
+def test_request_scope_releases_sessions(app, quiet_logs):
+    FakeSession.alive = weakref.WeakSet()
+    FakeSession.opened = FakeSession.closed = 0
+    with TestClient(app) as client:
+        # прогрев: создаются singleton-провайдеры и кэши импорта
+        for _ in range(100):
+            assert client.get('/probe').status_code == 200
+        singletons = set(container._instances)
+        app.state.seen['booking'].clear()
+        app.state.seen['announcement'].clear()
+        gc.collect()
+
+        for _ in range(REQUESTS - MEASURED):
+            assert client.get('/probe').status_code == 200
+        # tracemalloc замедляет запросы на порядок, память меряем на последних MEASURED запросах
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(MEASURED):
+            assert client.get('/probe').status_code == 200
+        seen = app.state.seen
+        # сервисы уровня запроса новые на каждый запрос, singleton-зависимости общие
+        assert len({id(service) for service in seen['booking']}) == REQUESTS
+        assert len({id(service.user_repo) for service in seen['booking']}) == 1
+        assert len({id(service.redis) for service in seen['announcement']}) == 1
+        seen['booking'].clear()
+        seen['announcement'].clear()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    assert set(container._instances) == singletons
+    assert FakeSession.opened == FakeSession.closed == REQUESTS + 100
+    # ни одна сессия не удерживается после запроса (lru_cache по сессии держал до 128 на воркер)
+    assert len(FakeSession.alive) == 0
+    assert after - before < 1024 * 1024
+
+
+def test_pool_released_after_requests(pg_engine, quiet_logs):
+    from sqlalchemy import text
+
+    from db.pg_db import engine
+    from db.uow import UnitOfWork, get_uow
+
+    _app = FastAPI()
+
+    @_app.get('/probe')
+    async def probe(uow: UnitOfWork = Depends(get_uow)) -> dict:
+        await uow.session.execute(text('SELECT 1'))
+        return {'checkedout': engine.pool.checkedout()}
+
+    with TestClient(_app) as client:
+        peak = 0
+        for _ in range(REQUESTS):
+            response = client.get('/probe')
+            assert response.status_code == 200
+            peak = max(peak, response.json()['checkedout'])
+        assert peak <= 1
+        assert engine.pool.checkedout() == 0
+        # соединения возвращаются в пул, а не копятся
+        assert engine.pool.checkedin() <= engine.pool.size()
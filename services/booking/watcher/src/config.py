@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from pydantic import BaseSettings
+
+
+class BaseConfig(BaseSettings):
+    class Config:
+        env_file = Path(Path(__file__).parent.parent.parent.parent.parent, 'env')
+        env_file_encoding = 'utf-8'
+
+
+class PostgresSettings(BaseConfig):
+    DB: str = 'db_name'
+    USER: str = 'guest'
+    PASSWORD: str = 'guest'
+    HOST: str = 'localhost'
+    PORT: int = 5432
+
+    @property
+    def a_uri(self):
+        return f'postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.DB}'
+
+    class Config:
+        env_prefix = 'POSTGRES_'
+
+
+class RedisSettings(BaseConfig):
+    HOST: str = 'localhost'
+    PORT: int = 6379
+    INDEX: int = 0
+
+    @property
+    def uri(self):
+        return f'redis://{self.HOST}:{self.PORT}/{self.INDEX}'
+
+    class Config:
+        env_prefix = 'REDIS_'
+
+
+class WatcherSettings(BaseConfig):
+    # объявления с event_time в пределах окна держатся в куче, окно сдвигается по мере хода времени
+    LOOKAHEAD_SEC: int = 3600
+    # как часто подхватываются новые и измененные объявления
+    PICKUP_SEC: float = 5.0
+    # перекрытие водяного знака modified на случай расхождения часов и долгих транзакций
+    PICKUP_OVERLAP_SEC: float = 30.0
+    BATCH_SIZE: int = 500
+    # повтор закрытия, если UPDATE не прошел или часы БД еще не дошли до окончания события
+    RETRY_SEC: float = 5.0
+    # TTL документа кэша деталей объявления в API (DETAIL_CACHE_TTL_SEC)
+    DETAIL_CACHE_TTL_SEC: int = 300
+    LOG_LEVEL: str = 'INFO'
+
+    class Config:
+        env_prefix = 'WATCHER_'
+
+
+class Settings(BaseConfig):
+    postgres: PostgresSettings = PostgresSettings()
+    redis: RedisSettings = RedisSettings()
+    watcher: WatcherSettings = WatcherSettings()
+
+
+settings = Settings()
@@ -1,9 +1,32 @@
 import asyncio
+import logging
+import signal
 
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import create_async_engine
 
-async def run_watcher_service():
-    return 'Watcher started...'
+from config import settings
+from watcher import Watcher
+
+
+async def run_watcher_service() -> None:
+    engine = create_async_engine(settings.postgres.a_uri, pool_size=2)
+    redis = aioredis.from_url(settings.redis.uri)
+    watcher = Watcher(engine, redis)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, watcher.stop)
+    try:
+        await watcher.run()
+    finally:
+        await redis.close()
+        await engine.dispose()
 
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=settings.watcher.LOG_LEVEL,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
     asyncio.run(run_watcher_service())
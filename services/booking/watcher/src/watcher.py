@@ -0,0 +1,235 @@
+import asyncio
+import contextlib
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import sqlalchemy as sa
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('Alive', 'Closed')
+DONE = 'Done'
+
+status_type = sa.Enum('Created', 'Alive', 'Closed', 'Done', name='eventstatus')
+announcements = sa.table(
+    'announcements',
+    sa.column('id'),
+    sa.column('status', status_type),
+    sa.column('event_time', sa.TIMESTAMP(timezone=True)),
+    sa.column('duration', sa.Integer),
+    sa.column('modified', sa.TIMESTAMP(timezone=True)),
+)
+# окончание события, duration хранится в минутах
+MINUTE = sa.literal_column("interval '1 minute'")
+ends_at = announcements.c.event_time + sa.func.coalesce(announcements.c.duration, 0) * MINUTE
+
+
+class Watcher:
+    """
+    Перевод объявлений в статус Done по окончании события (event_time + duration).
+
+    Ближайшие окончания Alive/Closed объявлений лежат в min-куче (due, id). Актуальный срок
+    каждого объявления хранится в словаре, устаревшие элементы кучи пропускаются при извлечении.
+    Куча заполняется диапазонными чтениями по индексу (status, event_time): при старте - все до
+    конца окна LOOKAHEAD_SEC, дальше - только сдвиг окна. Новые и измененные объявления
+    подхватываются по индексу modified. Наступившие сроки закрываются пачками одним UPDATE,
+    после чего инвалидируется кэш деталей объявлений API. Объявления пачки, которые UPDATE не закрыл
+    (ошибка БД, часы БД отстают), возвращаются в кучу не раньше чем через RETRY_SEC; неудавшаяся
+    инвалидация повторяется на следующем такте.
+    """
+
+    def __init__(self, engine: AsyncEngine, redis: aioredis.Redis) -> None:
+        self.engine = engine
+        self.redis = redis
+        self._heap: list[tuple[datetime, str]] = []
+        self._due: dict[str, datetime] = {}
+        self._loaded_until: datetime | None = None
+        self._modified_since: datetime | None = None
+        # закрытые объявления, кэш которых еще не инвалидирован
+        self._stale: set[str] = set()
+        self._stopped = asyncio.Event()
+
+    def stop(self) -> None:
+        logger.info('Watcher stopping ...')
+        self._stopped.set()
+
+    def _schedule(
+        self,
+        announce_id: str,
+        status: str,
+        event_time: datetime,
+        duration: int | None,
+        not_before: datetime | None = None,
+    ) -> None:
+        if status not in ACTIVE or self._loaded_until is None or event_time > self._loaded_until:
+            # за пределами окна объявление будет загружено при сдвиге окна
+            self._due.pop(announce_id, None)
+            return
+        due = event_time + timedelta(minutes=duration or 0)
+        if not_before is not None:
+            due = max(due, not_before)
+        if self._due.get(announce_id) == due:
+            return
+        self._due[announce_id] = due
+        heapq.heappush(self._heap, (due, announce_id))
+
+    async def _load_window(self, now: datetime) -> None:
+        """Дочитать объявления, чье event_time попало в окно после его сдвига."""
+        until = now + timedelta(seconds=settings.watcher.LOOKAHEAD_SEC)
+        query = sa.select(
+            announcements.c.id,
+            announcements.c.status,
+            announcements.c.event_time,
+            announcements.c.duration,
+        ).where(announcements.c.status.in_(ACTIVE), announcements.c.event_time <= until)
+        if self._loaded_until is not None:
+            query = query.where(announcements.c.event_time > self._loaded_until)
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+        self._loaded_until = until
+        for row in rows:
+            self._schedule(str(row.id), row.status, row.event_time, row.duration)
+        if rows:
+            logger.info(f'Load window until <{until}>: <{len(rows)}>, scheduled <{len(self._due)}>')
+
+    async def _pickup(self, now: datetime) -> None:
+        """Подхватить объявления, созданные или измененные после прошлого подхвата."""
+        query = sa.select(
+            announcements.c.id,
+            announcements.c.status,
+            announcements.c.event_time,
+            announcements.c.duration,
+            announcements.c.modified,
+        )
+        if self._modified_since is not None:
+            overlap = timedelta(seconds=settings.watcher.PICKUP_OVERLAP_SEC)
+            query = query.where(announcements.c.modified > self._modified_since - overlap)
+        else:
+            query = query.where(announcements.c.modified > now)
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+        for row in rows:
+            self._schedule(str(row.id), row.status, row.event_time, row.duration)
+            if row.modified and (self._modified_since is None or row.modified > self._modified_since):
+                self._modified_since = row.modified
+        if self._modified_since is None:
+            self._modified_since = now
+
+    def _retry(self, ids: list[str]) -> None:
+        """Вернуть в кучу пачку, закрытие которой не удалось, если подхват не запланировал ее заново."""
+        due = datetime.now(timezone.utc) + timedelta(seconds=settings.watcher.RETRY_SEC)
+        for announce_id in ids:
+            if announce_id not in self._due:
+                self._due[announce_id] = due
+                heapq.heappush(self._heap, (due, announce_id))
+
+    def _pop_due(self, now: datetime) -> list[str]:
+        ids = []
+        while self._heap and self._heap[0][0] <= now and len(ids) < settings.watcher.BATCH_SIZE:
+            due, announce_id = heapq.heappop(self._heap)
+            # элемент устарел: срок изменился или объявление ушло из Alive/Closed
+            if self._due.get(announce_id) != due:
+                continue
+            del self._due[announce_id]
+            ids.append(announce_id)
+        return ids
+
+    async def _close(self, ids: list[str]) -> None:
+        """
+        Перевести пачку объявлений в Done, условие окончания перепроверяется в БД.
+
+        Не закрытые UPDATE объявления перечитываются: ушедшие из Alive/Closed и удаленные снимаются
+        с учета, остальные планируются заново. При ошибке в кучу возвращается вся пачка.
+        """
+        query = (
+            sa.update(announcements)
+            .where(
+                announcements.c.id.in_([UUID(announce_id) for announce_id in ids]),
+                announcements.c.status.in_(ACTIVE),
+                ends_at <= sa.func.now(),
+            )
+            .values(status=DONE, modified=sa.func.now())
+            .returning(announcements.c.id)
+        )
+        try:
+            async with self.engine.begin() as conn:
+                done = [str(row.id) for row in (await conn.execute(query)).all()]
+                skipped = [UUID(announce_id) for announce_id in set(ids) - set(done)]
+                rows = []
+                if skipped:
+                    rows = (
+                        await conn.execute(
+                            sa.select(
+                                announcements.c.id,
+                                announcements.c.status,
+                                announcements.c.event_time,
+                                announcements.c.duration,
+                            ).where(announcements.c.id.in_(skipped)),
+                        )
+                    ).all()
+        except Exception:
+            self._retry(ids)
+            raise
+        logger.info(f'Done announcements: <{len(done)}> of <{len(ids)}>')
+        not_before = datetime.now(timezone.utc) + timedelta(seconds=settings.watcher.RETRY_SEC)
+        for row in rows:
+            # срок по часам watcher наступил, а по часам БД - нет: повторяем позже
+            self._schedule(str(row.id), row.status, row.event_time, row.duration, not_before=not_before)
+        self._stale.update(done)
+        await self._invalidate()
+
+    async def _invalidate(self) -> None:
+        # ключи и порядок операций совпадают с DetailCache.invalidate в API
+        if not self._stale:
+            return
+        ids = list(self._stale)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for announce_id in ids:
+                version_key = f'announce:version:{announce_id}'
+                pipe.incr(version_key)
+                pipe.expire(version_key, 2 * settings.watcher.DETAIL_CACHE_TTL_SEC)
+                pipe.delete(f'announce:detail:{announce_id}')
+            await pipe.execute()
+        self._stale.difference_update(ids)
+
+    async def _tick(self) -> None:
+        now = datetime.now(timezone.utc)
+        await self._invalidate()
+        await self._load_window(now)
+        await self._pickup(now)
+        while ids := self._pop_due(datetime.now(timezone.utc)):
+            await self._close(ids)
+
+    def _sleep_for(self, next_pickup: float, loop: asyncio.AbstractEventLoop) -> float:
+        timeout = next_pickup - loop.time()
+        if self._heap:
+            until_due = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+            timeout = min(timeout, until_due)
+        return max(timeout, 0)
+
+    async def run(self) -> None:
+        logger.info('Watcher started ...')
+        loop = asyncio.get_running_loop()
+        next_pickup = loop.time()
+        while not self._stopped.is_set():
+            if loop.time() >= next_pickup:
+                try:
+                    await self._tick()
+                except Exception as ex:  # noqa: PIE786
+                    logger.error(f'Watcher error <{ex!r}>')
+                next_pickup = loop.time() + settings.watcher.PICKUP_SEC
+            else:
+                # сработал срок из кучи раньше очередного подхвата
+                try:
+                    while ids := self._pop_due(datetime.now(timezone.utc)):
+                        await self._close(ids)
+                except Exception as ex:  # noqa: PIE786
+                    logger.error(f'Watcher error <{ex!r}>')
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopped.wait(), timeout=self._sleep_for(next_pickup, loop))
@@ -1,5 +1,5 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Body, FastAPI
 from fastapi.responses import ORJSONResponse
 
 from config import settings
@@ -18,5 +18,10 @@ async def user_info(uuid: str):
     return get_fake_movie(uuid)
 
 
+@app.post('/movie/v1/movie:batch')
+async def movie_info_batch(uuids: list[str] = Body(...)):
+    return {uuid: get_fake_movie(uuid) for uuid in dict.fromkeys(uuids)}
+
+
 if __name__ == '__main__':
     uvicorn.run('main:app', host='0.0.0.0', port=8083)
@@ -1,7 +1,7 @@
 from random import randint
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Body, FastAPI
 from fastapi.responses import ORJSONResponse
 
 from config import settings
@@ -25,6 +25,11 @@ async def subscribers_group(movie_id: str):
     return get_fake_group()
 
 
+@app.post('/ugc/v1/subscribers:batch')
+async def subscribers_group_batch(ids: list[str] = Body(...)):
+    return {_id: get_fake_group() for _id in dict.fromkeys(ids)}
+
+
 @app.post('/ugc/v1/likes_count/{review_id}')
 async def likes_count_info(review_id: str):
     return {'likes_count': randint(1, 20)}